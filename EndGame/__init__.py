@@ -1,5 +1,8 @@
 
 from otree.api import *
+
+from common.profiling import instrument
+from common.status import FAILED, get_status, is_inactive
 c = cu
 
 doc = ''
@@ -19,6 +22,8 @@ class EndGame(Page):
     def vars_for_template(player: Player):
         group = player.group
         participant = player.participant
-        return dict(dropout = participant.has_dropped_out, group_fail = participant.too_many_inactive_in_group)
+        return dict(dropout = is_inactive(participant), group_fail = get_status(participant) == FAILED)
     
-page_sequence = [EndGame]
\ No newline at end of file
+page_sequence = [EndGame]
+# Opt-in timing of the page callbacks, see common.profiling
+instrument(__name__, page_sequence)
\ No newline at end of file
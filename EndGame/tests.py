@@ -0,0 +1,18 @@
+from otree.api import Currency as c, currency_range, expect, Bot, Submission, SubmissionMustFail
+
+from common.status import FAILED, get_status, is_inactive, is_playing
+from . import *
+
+
+class PlayerBot(Bot):
+    def play_round(self):
+        participant = self.participant
+        # The public goods apps end on FinalGameResults, which has no next button; only dropouts and members of a
+        # failed group are sent on to this app
+        if self.session.config['app_sequence'][0] != 'Game' and is_playing(participant):
+            return
+        if is_inactive(participant):
+            expect('Je bent een drop-out.', 'in', self.html)
+        elif get_status(participant) == FAILED:
+            expect('Er zijn niet meer voldoende spelers.', 'in', self.html)
+        yield EndGame
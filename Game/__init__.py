@@ -1,5 +1,15 @@
 
 from otree.api import *
+
+from common.export import export_rows, session_rows
+from common.ledger import open_ledger, read_ledger, record_earnings
+from common.lobby import LobbyIndex, form_group
+from common.membership import GroupRoster, RosterCache
+from common.points import SCALE, div_round, from_milli, ratio, scale
+from common.profiling import instrument
+from common.roster import build_group_matrix, load_roster
+from common.status import FAILED, INACTIVE, get_status, is_inactive, reset_status, set_status
+
 c = cu
 
 doc = ''
@@ -11,70 +21,157 @@ class C(BaseConstants):
     NUM_ROUNDS = 2
     MIN_PLAYERS_PER_GROUP = 2
     ENDOWMENT = 100
+    MULTIPLIER = 1.1
+    MIN_BUDGET_TOP_UP = 10
 
 class Subsession(BaseSubsession):
     pass
 
+def creating_session(subsession: Subsession):
+    # Participants listed in the session's lobby roster (session config 'lobby_roster', a CSV/JSON file of
+    # participant labels to lobby IDs) get their label and lobby here, and complete lobby groups are formed
+    # up front so they don't have to be matched on arrival. Roster entries beyond the number of participants are ignored.
+    if subsession.round_number != 1:
+        return
+    players = subsession.get_players()
+    for p in players:
+        p.participant.pre_grouped = False
+
+    roster_path = subsession.session.config.get('lobby_roster')
+    if not roster_path:
+        return
+    roster = load_roster(roster_path)
+    lobbies = [None] * len(players)
+    for position, (p, (label, lobby)) in enumerate(zip(players, roster)):
+        p.participant.label = label
+        p.participant.lobby_id = lobby
+        lobbies[position] = lobby
+
+    matrix, pre_grouped = build_group_matrix(lobbies, C.PLAYERS_PER_GROUP)
+    subsession.set_group_matrix([[players[position] for position in group] for group in matrix])
+    rosters.forget(subsession.session)
+    for position in pre_grouped:
+        players[position].participant.pre_grouped = True
+
+# Lobby indexes by subsession id, see common.lobby
+lobby_indexes = {}
+
+def lobby_index(subsession):
+    index = lobby_indexes.get(subsession.id)
+    if index is None:
+        # Groups formed on arrival are complete, like the groups formed from the lobby roster
+        index = lobby_indexes[subsession.id] = LobbyIndex(C.PLAYERS_PER_GROUP)
+    return index
+
+def lobby_id(player):
+    try:
+        return player.participant.lobby_id
+    except KeyError:
+        # Without a lobby, players are matched on the group they were created in.
+        return f"group-{player.group.id_in_subsession}"
+
 def group_by_arrival_time_method(subsession, waiting_players):
-    players_by_group = {}
-    for p in waiting_players:
-        try:
-            group_id = p.participant.lobby_id
-        except KeyError:
-            group_id = p.group.id_in_subsession
-        if group_id not in players_by_group:
-            players_by_group[group_id] = []
-        players_by_group[group_id].append(p)
-    
-    group_size = C.MIN_PLAYERS_PER_GROUP
-    print(players_by_group)
-    for group_id, players in players_by_group.items():
-        if len(players) >= group_size:
-            print("Formed group, pushing now!")
-            
-            return players[:group_size]
-    print('no group formed, waiting for new player')
-    return None
+    # New arrivals are added to their lobby's queue once; a group is formed as soon as a lobby has enough players.
+    group = form_group(lobby_index(subsession), waiting_players, lambda p: p.id_in_subsession, lobby_id)
+    if group:
+        # oTree regroups the players in this and all later rounds
+        rosters.forget(subsession.session)
+    return group
+
+def vars_for_admin_report(subsession):
+    # Queue depth, wait time and matchmaking statistics of the waiting room
+    return dict(lobby_stats=lobby_index(subsession).stats())
 
 
 class Group(BaseGroup):
     aantal_inactief = models.IntegerField(initial=0)
 
+def load_group_roster(group: Group):
+    # Members who dropped out in this or an earlier round are inactive: their participant status stays inactive,
+    # so the count is derived from the members instead of being incremented by every timeout (see common.status).
+    members = group.get_players()
+    return GroupRoster([p.id for p in members], [p.id_in_group for p in members if is_inactive(p.participant)])
+
+# Group rosters by session, round and group, see common.membership
+rosters = RosterCache(load_group_roster)
+
+def inactive_count(group: Group):
+    return rosters.get(group).inactive_count
+
+def active_players(group: Group):
+    roster = rosters.get(group)
+    return [p for p in group.get_players() if roster.is_active(p.id_in_group)]
+
 def end_round(group: Group):
     # I run this function at the end of each round after all the players arrived on the DecisionWait page.
-    
     # Retrieve all active contributions & players
-    contributions = [p.contribution for p in group.get_players() if not p.participant.has_dropped_out]
-    active_players = [p for p in group.get_players() if not p.participant.has_dropped_out]
+    players = active_players(group)
+    group.aantal_inactief = inactive_count(group)
+    contributions = [p.contribution for p in players]
     
-    # Calculate total contribution for the group
-    total_contribution = round(sum(contributions) * 1.1, 2)
+    # Calculate total contribution for the group. Amounts are exact milli-points (see common.points),
+    # budgets are only rounded when they are written to participant.payoff.
+    total_contribution = scale(sum(contributions) * SCALE, ratio(C.MULTIPLIER))
     
     # Set the payoff for each participant
-    for p in active_players:
-        payoff = (total_contribution / len(active_players)) - p.contribution
+    share = div_round(total_contribution, len(players)) if players else 0
+    for p in players:
+        payoff = share - p.contribution * SCALE
+        budget = read_ledger(p.participant, C.NAME_IN_URL)["accumulated"]
         if payoff > 0:
             # This way of assigning payoffs is redundant, as player.payoff is automatically summed each round.
-            p.participant.payoff += payoff
+            budget += payoff
     
         # I wanted players to be able to keep on playing, even when their budget = 0. So i give them 10. 
-        if p.participant.payoff <= 0:
-            p.participant.payoff += 10
+        if budget <= 0:
+            budget += C.MIN_BUDGET_TOP_UP * SCALE
+
+        record_earnings(p.participant, C.NAME_IN_URL, gross=payoff, accumulated=budget)
+        p.participant.payoff = from_milli(budget)
     
       
 class Player(BasePlayer):
     contribution = models.IntegerField()
+    # Timed out on Decision in this round
+    inactief = models.BooleanField(initial=False)
 
+def custom_export(players):
+    # Long format, one row per player field and round (see common.export). There is no punishment in this game.
+    # After the players follows the matchmaking summary of every exported subsession whose waiting room ran
+    # in this server process, one 'matchmaking.<statistic>' row per statistic (see common.lobby).
+    subsessions = {}
+    def remember(players):
+        for p in players:
+            subsessions.setdefault(p.subsession_id, (p.session.code, p.round_number))
+            yield p
+    yield from export_rows(
+        remember(players), ['contribution', 'inactief'], lambda p: (), group_fields=['aantal_inactief']
+    )
+    for subsession_id, (session_code, round_number) in subsessions.items():
+        index = lobby_indexes.get(subsession_id)
+        if index is not None:
+            yield from session_rows(session_code, round_number, 'matchmaking', index.stats())
 
 
 def contribution_error_message(player: Player, value):
     participant = player.participant
     # You can ignore this, just some playing around with error messages.
-    if value > participant.payoff:
+    if value * SCALE > read_ledger(participant, C.NAME_IN_URL)["accumulated"]:
         return f"Budget insufficient, your budget is {participant.payoff}"
     elif value < 0:
         return "Not allowed to enter less then 0"
 
+def leave_game(player: Player, upcoming_apps):
+    participant = player.participant
+    # Important function: sends participants that have dropped out to the last app in the sequence.
+    if is_inactive(participant):
+        return upcoming_apps[-1]
+
+    # Sends participants that have a group below minimum group size to last app.
+    elif inactive_count(player.group) > (C.PLAYERS_PER_GROUP - C.MIN_PLAYERS_PER_GROUP):
+        set_status(participant, FAILED)
+        return upcoming_apps[-1]
+
 class StartRound(Page):
     form_model = 'player'
     @staticmethod
@@ -101,12 +198,13 @@ class StartRound(Page):
         subsession = player.subsession
         group = player.group
         participant = player.participant
-        # Set the initial values for has_dropped_out and too_many_inactive_in_group
-        participant.has_dropped_out = False
-        participant.too_many_inactive_in_group = False
+        # Everyone starts the game active
+        reset_status(participant)
         
         # Give initial endowment
         if subsession.round_number == 1:
+            open_ledger(participant, C.NAME_IN_URL)
+            record_earnings(participant, C.NAME_IN_URL, accumulated=C.ENDOWMENT * SCALE)
             participant.payoff = C.ENDOWMENT
 
         
@@ -120,36 +218,24 @@ class Decision(Page):
         subsession = player.subsession
         group = player.group
         participant = player.participant
-        # Not sure if this piece of code is required, but i was worried the group value for aantal_inactief was reset after starting a new round.
-        if subsession.round_number > 1:
-            prev_group = group.in_round(subsession.round_number - 1)
-            group.aantal_inactief  = prev_group.aantal_inactief
-        
-        # Set has_dropped_out value if someone times out, and add one to aantal_inactief
+        # A timeout makes the participant inactive; aantal_inactief is counted from the members' statuses at DecisionWait.
         if timeout_happened:
-            participant.has_dropped_out = True
-            group.aantal_inactief += 1
+            player.inactief = True
+            set_status(participant, INACTIVE)
+            rosters.get(group).mark_inactive(player.id_in_group)
         
   
         
     @staticmethod
     def app_after_this_page(player: Player, upcoming_apps):
-        group = player.group
-        participant = player.participant
-        # Important function: sends participants that have dropped out to the last app in the sequence.
-        if participant.has_dropped_out:
-            return upcoming_apps[-1] 
-        
-        # Sends participants that have a group below minimum group size to last app.
-        elif group.aantal_inactief > (C.PLAYERS_PER_GROUP - C.MIN_PLAYERS_PER_GROUP):
-            participant.too_many_inactive_in_group = True
-            return upcoming_apps[-1] 
+        return leave_game(player, upcoming_apps)
         
 class GroupWait(WaitPage):
     def is_displayed(player: Player):
         session = player.session
         subsession = player.subsession
-        if subsession.round_number == 1:
+        # Participants whose lobby was grouped from the roster at session creation skip the arrival queue.
+        if subsession.round_number == 1 and not player.participant.pre_grouped:
             return True
         
     group_by_arrival_time = True
@@ -165,25 +251,23 @@ class ResultsPage(Page):
     def is_displayed(player: Player):
         group = player.group
         participant = player.participant
-        # Don't think this actually does something, as participant.too_many_inactive_in_group is set after this page.
-        if not participant.too_many_inactive_in_group:
+        # Don't think this actually does something, as the status is only set to failed after this page.
+        if get_status(participant) != FAILED:
             return True
     @staticmethod
 
     def vars_for_template(player: Player):
         group = player.group
         participant = player.participant
+        contributions = [p.contribution for p in active_players(group)]
         return dict(contribution = cu(player.contribution), 
-                    total_contributions = cu(sum([p.contribution for p in group.get_players() if not p.participant.has_dropped_out]) * 1.1),
+                    total_contributions = cu(from_milli(scale(sum(contributions) * SCALE, ratio(C.MULTIPLIER)))),
                     total_payoff = participant.payoff)
     @staticmethod
     def app_after_this_page(player: Player, upcoming_apps):
-        group = player.group
-        participant = player.participant
         # I repeated this function here for some reason, not sure if it's required.
-        if participant.has_dropped_out:
-            return upcoming_apps[-1] 
-        elif group.aantal_inactief > (C.PLAYERS_PER_GROUP - C.MIN_PLAYERS_PER_GROUP):
-            participant.too_many_inactive_in_group = True
-            return upcoming_apps[-1] 
-page_sequence = [StartRound, Decision, DecisionWait, ResultsPage]
\ No newline at end of file
+        return leave_game(player, upcoming_apps)
+# oTree requires the group_by_arrival_time wait page to be the first page
+page_sequence = [GroupWait, StartRound, Decision, DecisionWait, ResultsPage]
+# Opt-in timing of the page callbacks, see common.profiling
+instrument(__name__, page_sequence)
\ No newline at end of file
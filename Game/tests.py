@@ -0,0 +1,90 @@
+import csv
+import os
+import tempfile
+
+from otree.api import Currency as c, currency_range, expect, Bot, Submission, SubmissionMustFail
+
+from common.columnar import convert
+from common.status import ACTIVE, FAILED, INACTIVE, get_status
+from . import *
+
+
+class PlayerBot(Bot):
+    # all_active: everyone contributes 10 in every round
+    # one_dropout: player 1 times out on Decision in round 1 and is sent to the last app
+    # group_fails: players 1 and 2 time out, which leaves too few players for player 3 as well
+    cases = ['all_active', 'one_dropout', 'group_fails']
+
+    def play_round(self):
+        times_out = self.round_number == 1 and (
+            (self.case == 'one_dropout' and self.player.id_in_group == 1)
+            or (self.case == 'group_fails' and self.player.id_in_group <= 2)
+        )
+
+        # Participants sent to the last app skip the remaining rounds
+        if self.round_number > 1 and get_status(self.participant) != ACTIVE:
+            return
+
+        if self.round_number == 1:
+            # GroupWait comes before StartRound
+            yield StartRound
+            expect(self.participant.payoff, C.ENDOWMENT)
+            self.check_arrival_grouping()
+
+        if times_out:
+            yield Submission(Decision, timeout_happened=True)
+            expect(get_status(self.participant), INACTIVE)
+            return
+
+        yield SubmissionMustFail(Decision, dict(contribution=-1))
+        yield SubmissionMustFail(Decision, dict(contribution=C.ENDOWMENT * 10))
+        yield Decision, dict(contribution=10)
+        if self.case == 'group_fails':
+            expect(get_status(self.participant), FAILED)
+            return
+
+        yield ResultsPage
+        if self.case == 'all_active':
+            # Everyone gets back 1.1 x 10, so the budget grows by 1 each round
+            expect(self.participant.payoff, C.ENDOWMENT + self.round_number)
+            if self.round_number == C.NUM_ROUNDS and self.player.id_in_group == 1:
+                self.check_export_round_trip()
+
+    def check_arrival_grouping(self):
+        # Everyone was released from GroupWait in a complete group
+        expect(len(self.group.get_players()), C.PLAYERS_PER_GROUP)
+        stats = lobby_index(self.subsession).stats()
+        queued_lobbies = {event[2] for event in lobby_index(self.subsession).telemetry.events if event[0] == 'arrival'}
+        if not self.session.config.get('lobby_roster'):
+            # All participants waited on GroupWait and were grouped there
+            expect(stats['arrivals'], C.PLAYERS_PER_GROUP)
+            expect(stats['groups_formed'], 1)
+            expect(stats['waiting_players'], 0)
+        elif self.player.id_in_subsession <= C.PLAYERS_PER_GROUP:
+            # Game/example_roster.csv puts the first three participants in one lobby, which is grouped up front,
+            # so they skip GroupWait and never queue
+            expect(self.participant.lobby_id, 'lobby-1')
+            expect(self.participant.pre_grouped, True)
+            expect(len(rosters.get(self.group).player_ids), C.PLAYERS_PER_GROUP)
+            expect('lobby-1', 'not in', queued_lobbies)
+        else:
+            # The participants without a lobby still wait on GroupWait until a full group of them arrived
+            expect(self.participant.pre_grouped, False)
+            expect(stats['arrivals'], C.PLAYERS_PER_GROUP)
+            expect(stats['groups_formed'], 1)
+            expect(stats['waiting_players'], 0)
+            expect(len(queued_lobbies), 1)
+
+    def check_export_round_trip(self):
+        # The custom export, with the matchmaking summary of the group formed on GroupWait, converts into column
+        # files (see common.columnar)
+        players = [p for r in range(1, C.NUM_ROUNDS + 1) for p in self.subsession.in_round(r).get_players()]
+        with tempfile.TemporaryDirectory() as out_dir:
+            path = os.path.join(out_dir, 'export.csv')
+            with open(path, 'w', newline='') as f:
+                csv.writer(f).writerows(custom_export(players))
+            manifest = convert(path, out_dir)
+        expect(manifest['tables']['decisions']['rows'], len(players))
+        records = {record: value for _, record, value in manifest['session_records'][self.session.code]}
+        expect(records['matchmaking.arrivals'], C.PLAYERS_PER_GROUP)
+        expect(records['matchmaking.groups_formed'], 1)
@@ -0,0 +1,265 @@
+// Shared by the observation and punishment pages: the history table renderer, sortable history tables,
+// collapsible cards and the punishment cost preview.
+
+// The server sends the history as a compact payload (see history_payload in public_goods_game_new): the
+// displayed rounds, and flat lists ordered by round and id_in_group with three amounts in milli-points per
+// member (public investment, private investment, payoff) and one dropout flag per member. The page comes with
+// the most recent rounds; older ones are fetched in payloads of the same form (see showHistory).
+
+// Writes an amount of milli-points the way oTree writes an amount of points: rounded half up to
+// format.places decimals, followed by the text for one or several points.
+function formatPoints(milli, format) {
+    const places = Math.min(format.places, 3);
+    const divisor = Math.pow(10, 3 - places);
+    const number = Math.floor((milli + divisor / 2) / divisor) / Math.pow(10, places);
+    return (number === 1 ? format.one : format.many).replace('{}', number.toFixed(places));
+}
+
+// Returns the indexes of the rounds in the payload, most recent round first.
+function newestFirst(history) {
+    return history.rounds.map((round, index) => index).reverse();
+}
+
+function punishmentOptions(maxPoints) {
+    let options = '';
+    for (let points = 0; points <= maxPoints; points++) {
+        options += `<option value="${points}">${points} ${points === 1 ? 'strafpunt' : 'strafpunten'}</option>`;
+    }
+    return options;
+}
+
+// Rows of the tables that have not been near the viewport yet, by tbody. A history of many rounds of a large
+// group has thousands of rows; only the ones the player scrolls to are created.
+const pendingRows = new Map();
+let rowObserver = null;
+// Height of a placeholder row per table row, so the page does not jump when rows are filled in
+const ROW_HEIGHT = 49;
+
+function fillRows(tbody) {
+    const rows = pendingRows.get(tbody);
+    if (rows) {
+        pendingRows.delete(tbody);
+        tbody.innerHTML = rows();
+    }
+}
+
+function fillRowsWhenVisible(tbody, rows) {
+    if (!('IntersectionObserver' in window)) {
+        tbody.innerHTML = rows();
+        return;
+    }
+    if (!rowObserver) {
+        rowObserver = new IntersectionObserver(entries => {
+            entries.forEach(entry => {
+                if (entry.isIntersecting) {
+                    rowObserver.unobserve(entry.target);
+                    fillRows(entry.target);
+                }
+            });
+        }, {rootMargin: '600px 0px'});
+    }
+    pendingRows.set(tbody, rows);
+    rowObserver.observe(tbody);
+}
+
+// Appends one card with a table per round to container. With punish, the table gets a column in which the
+// player chooses punishment points for each active group member; its rows are created right away, because the
+// form fields have to exist when the page is submitted. The rows of the other tables are created when they
+// come near the viewport.
+function renderHistory(container, vars, history, roundIndexes, punish) {
+    const values = Int32Array.from(history.values);
+    const size = history.group_size;
+    const options = punish ? punishmentOptions(vars.max_punishment_points) : '';
+
+    function tableRows(index) {
+        const rows = [];
+        for (let member = 0; member < size; member++) {
+            const id = member + 1;
+            const at = index * size + member;
+            const dropout = history.dropouts[at] === 1;
+            let row = '<tr>' + (id === vars.player_id ? '<td><strong>JIJ</strong></td>' : `<td>Speler #${id}</td>`);
+            row += '<td data-key="dropout">' + (dropout
+                ? '<span style="color:red;"><i class="fas fa-times-circle"></i> Afwezig</span>'
+                : '<span style="color:green;"><i class="fas fa-check-circle"></i> Actief</span>') + '</td>';
+            ['public_investment', 'private_investment', 'payoff'].forEach((key, column) => {
+                row += `<td data-key="${key}">${formatPoints(values[at * 3 + column], vars.points_format)}</td>`;
+            });
+            if (punish) {
+                row += '<td>';
+                if (dropout) {
+                    row += '<select class="disabled-select"><option value="0" selected>0 strafpunten</option></select>'
+                        + `<input type="hidden" name="punishment_sent_to_player_${id}" value="0">`;
+                } else if (id !== vars.player_id) {
+                    row += `<select name="punishment_sent_to_player_${id}">${options}</select>`;
+                } else {
+                    row += 'N.v.t.';
+                }
+                row += '</td>';
+            }
+            rows.push(row + '</tr>');
+        }
+        return rows.join('');
+    }
+
+    roundIndexes.forEach(index => {
+        const round = history.rounds[index];
+        const columns = punish ? 6 : 5;
+        container.insertAdjacentHTML('beforeend', `<div class="card mt-4 shadow">
+    <h2 class="card-header">
+        Keuzes en uitbetalingen - Ronde ${round}
+        <button class="btn btn-sm btn-secondary float-right" type="button" data-toggle="collapse" data-target="#table-${round}" aria-expanded="true" aria-controls="table-${round}">
+            <i class="fas fa-chevron-up"></i>
+        </button>
+    </h2>
+    <div id="table-${round}" class="collapse show">
+        <div class="card-body">
+            <div class="table-responsive">
+                <table class="table table-hover table-striped table-bordered">
+                    <thead>
+                        <tr>
+                            <th><i class="fa fa-user fa-icon"></i> Speler</th>
+                            <th><i class="fa fa-check-circle fa-icon"></i> Status<button class="sort-btn" data-sort="dropout" type="button"><i class="fa fa-sort"></i></button></th>
+                            <th><i class="fa fa-hand-holding-usd fa-icon"></i> Inbreng fonds<button class="sort-btn" data-sort="public_investment" type="button"><i class="fa fa-sort"></i></button></th>
+                            <th><i class="fa fa-piggy-bank"></i> In eigen zak<button class="sort-btn" data-sort="private_investment" type="button"><i class="fa fa-sort"></i></button></th>
+                            <th><i class="fa fa-dollar-sign fa-icon"></i> Uitbetaling<button class="sort-btn" data-sort="payoff" type="button"><i class="fa fa-sort"></i></button></th>
+                            ${punish ? '<th><i class="fa fa-gavel"></i> Straffen</th>' : ''}
+                        </tr>
+                    </thead>
+                    <tbody>${punish ? tableRows(index) : `<tr><td colspan="${columns}" style="height: ${size * ROW_HEIGHT}px;"></td></tr>`}</tbody>
+                </table>
+            </div>
+        </div>
+    </div>
+</div>`);
+        if (!punish) {
+            const tbodies = container.querySelectorAll('tbody');
+            fillRowsWhenVisible(tbodies[tbodies.length - 1], () => tableRows(index));
+        }
+    });
+}
+
+// Shows the rounds of vars.history before the most recent skip ones in container, newest first, and lets the
+// player fetch earlier rounds (back to vars.first_round) with button, a batch at a time, through the page's
+// live_method.
+function showHistory(container, button, vars, skip) {
+    let firstShown = vars.history.rounds.length ? vars.history.rounds[0] : vars.first_round;
+
+    function update() {
+        button.style.display = firstShown > vars.first_round ? '' : 'none';
+        button.disabled = false;
+    }
+
+    window.liveRecv = function (data) {
+        if (data.history.rounds.length) {
+            renderHistory(container, vars, data.history, newestFirst(data.history), false);
+            firstShown = data.history.rounds[0];
+        }
+        update();
+    };
+
+    button.addEventListener('click', function () {
+        button.disabled = true;
+        liveSend({before: firstShown});
+    });
+
+    renderHistory(container, vars, vars.history, newestFirst(vars.history).slice(skip), false);
+    update();
+}
+
+// The handlers below are attached to the document, so they also work for the cards of rounds fetched later.
+
+// Function to handle table sorting
+function sortTable(table, columnIndex, order) {
+    const tbody = table.querySelector('tbody');
+    fillRows(tbody);
+    const rowsArray = Array.from(tbody.querySelectorAll('tr'));
+    const isNumeric = !isNaN(parseFloat(rowsArray[0].children[columnIndex].textContent.trim()));
+
+    rowsArray.sort((rowA, rowB) => {
+        const cellA = rowA.children[columnIndex].textContent.trim();
+        const cellB = rowB.children[columnIndex].textContent.trim();
+        const valueA = isNumeric ? parseFloat(cellA) : cellA;
+        const valueB = isNumeric ? parseFloat(cellB) : cellB;
+
+        if (valueA < valueB) return order === 'asc' ? -1 : 1;
+        if (valueA > valueB) return order === 'asc' ? 1 : -1;
+        return 0;
+    });
+
+    rowsArray.forEach(row => tbody.appendChild(row));
+}
+
+document.addEventListener('click', function (event) {
+    const button = event.target.closest('.sort-btn');
+    if (!button) return;
+    const table = button.closest('.card').querySelector('table');
+    const columnIndex = Array.from(button.closest('tr').children).indexOf(button.closest('th'));
+    const currentOrder = button.getAttribute('data-order') || 'desc';
+    const newOrder = currentOrder === 'asc' ? 'desc' : 'asc';
+
+    // Sort the table
+    sortTable(table, columnIndex, newOrder);
+
+    // Update sort order attribute
+    button.setAttribute('data-order', newOrder);
+
+    // Update icons to reflect sorting state
+    document.querySelectorAll('.sort-btn').forEach(btn => {
+        btn.innerHTML = '<i class="fa fa-sort"></i>';
+    });
+    button.innerHTML = newOrder === 'asc' ? '<i class="fa fa-sort-asc"></i>' : '<i class="fa fa-sort-desc"></i>';
+});
+
+// Handle collapse toggling
+document.addEventListener('click', function (event) {
+    const button = event.target.closest('.card-header .btn[data-toggle="collapse"]');
+    if (!button) return;
+    const targetElement = document.querySelector(button.getAttribute('data-target'));
+    const icon = button.querySelector('i');
+
+    if (targetElement.classList.contains('show')) {
+        targetElement.classList.remove('show');
+        icon.classList.remove('fa-chevron-up');
+        icon.classList.add('fa-chevron-down');
+    } else {
+        targetElement.classList.add('show');
+        icon.classList.remove('fa-chevron-down');
+        icon.classList.add('fa-chevron-up');
+    }
+});
+
+document.addEventListener('DOMContentLoaded', function () {
+    // Function to handle the calculation of punishment costs (only the punishment page has the button)
+    const costButton = document.getElementById('calculate-cost-btn');
+    if (costButton) {
+        costButton.addEventListener('click', function (e) {
+            e.preventDefault(); // Prevent form from submitting
+
+            let sum = 0;
+
+            const selects = document.querySelectorAll('select[name^="punishment_sent_to_player_"]');
+
+            const punishmentCosts = {
+                '0': 0,
+                '1': 1,
+                '2': 2,
+                '3': 4,
+                '4': 6,
+                '5': 9,
+                '6': 12,
+                '7': 16,
+                '8': 20,
+                '9': 25,
+                '10': 30
+            };
+
+            selects.forEach(select => {
+                const selectedValue = select.value;
+                sum += punishmentCosts[selectedValue];
+            });
+
+            document.getElementById('punishment-cost').textContent = sum;
+            document.getElementById('sum-display').style.display = 'block';
+        });
+    }
+});
@@ -0,0 +1,5 @@
+"""
+Stand-alone benchmarks for the game logic.
+
+Run a benchmark from the project root, e.g. ``python -m benchmarks.bench_settlement``.
+"""
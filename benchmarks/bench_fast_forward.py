@@ -0,0 +1,71 @@
+"""
+Measures the page requests dropouts and members of a failed group make after
+the event, with and without an app after the public goods app.
+
+Dropouts and members of a failed group are sent on to the last app of the
+session from app_after_this_page (leave_game in public_goods_game_new,
+TimeoutPlayerPage and the routed pages in public_goods_game). That only changes
+anything when the session has such an app, so every public goods config is run
+next to its "_end" counterpart, which has EndGame after the game, with the
+same sessions, seed and dropouts (benchmarks/load_test.py plays them). The
+dropouts time out from the contribution page of round 1 on and do not come
+back.
+
+Routing saves next to nothing. A dropout of public_goods_game_new already
+skips every later page until FailedGamePage, which has no next button, so with
+or without EndGame they make the same requests; in public_goods_game they skip
+the TimeoutPlayerPage of the later rounds. Almost all requests are the wait
+page polls of the other members while the dropouts' timers run out. Measured
+with prodserver on SQLite, 4 sessions of 4 participants, dropout rate 0.5,
+seed 0, wait pages polled every 0.5 s:
+
+    session config               requests  by dropouts
+    public_goods_game_new_1          1335            5
+    public_goods_game_new_1_end      1318            5
+    public_goods_game_1              1818            9
+    public_goods_game_1_end          1815            7
+
+Start the server first, for example:
+
+    OTREE_REST_KEY=secret OTREE_PRODUCTION=1 otree prodserver 8000
+
+Usage:
+    OTREE_REST_KEY=secret python -m benchmarks.bench_fast_forward --sessions 4 --dropout-rate 0.5
+"""
+import argparse
+import os
+
+from benchmarks.load_test import Client, add_options, run
+
+CONFIGS = [
+    ("public_goods_game_new_1", "public_goods_game_new_1_end"),
+    ("public_goods_game_1", "public_goods_game_1_end"),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--configs", nargs="*", help="Session configs without the _end suffix, all by default")
+    add_options(parser)
+    parser.set_defaults(sessions=4, dropout_rate=0.5)
+    args = parser.parse_args()
+
+    client = Client(args.server, os.environ.get("OTREE_REST_KEY"), args.request_timeout)
+    print(
+        f"{args.sessions} sessions of {args.participants} participants, dropout rate {args.dropout_rate},"
+        f" seed {args.seed}"
+    )
+    print(f"{'session config':>28} {'requests':>9} {'by dropouts':>12} {'finished':>9} {'dropped out':>12} {'aborted':>8}")
+    for pair in CONFIGS:
+        if args.configs and pair[0] not in args.configs:
+            continue
+        for session_config in pair:
+            metrics, _ = run(client, session_config, args)
+            print(
+                f"{session_config:>28} {sum(metrics.requests.values()):>9} {metrics.dropout_requests:>12}"
+                f" {metrics.finished:>9} {metrics.dropped_out:>12} {metrics.aborted:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
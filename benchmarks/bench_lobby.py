@@ -0,0 +1,111 @@
+"""
+Simulates 1,000 arrivals in the Game waiting room and compares the original
+group_by_arrival_time_method (rebuilding a dict of all waiting players on every
+call) with the incremental lobby index.
+
+Usage:
+    python -m benchmarks.bench_lobby
+"""
+import random
+import time
+from types import SimpleNamespace
+
+from common.lobby import LobbyIndex, form_group
+
+ARRIVALS = 1000
+LOBBIES = 300
+GROUP_SIZE = 3
+NO_LOBBY_SHARE = 0.1
+
+
+class Participant:
+    def __init__(self, lobby_id):
+        self._lobby_id = lobby_id
+
+    @property
+    def lobby_id(self):
+        # Unset participant fields raise KeyError in oTree
+        if self._lobby_id is None:
+            raise KeyError("lobby_id")
+        return self._lobby_id
+
+
+def make_arrivals(rng):
+    players = []
+    for i in range(1, ARRIVALS + 1):
+        lobby = None if rng.random() < NO_LOBBY_SHARE else rng.randrange(LOBBIES)
+        players.append(
+            SimpleNamespace(
+                id_in_subsession=i,
+                participant=Participant(lobby),
+                group=SimpleNamespace(id_in_subsession=rng.randrange(LOBBIES)),
+            )
+        )
+    return players
+
+
+def original_method(subsession, waiting_players):
+    # The original method, without the print() calls. Players without a lobby get the same key as in
+    # the indexed method, so that they are not matched with a lobby whose id equals their group's.
+    players_by_group = {}
+    for p in waiting_players:
+        group_id = lobby_id(p)
+        if group_id not in players_by_group:
+            players_by_group[group_id] = []
+        players_by_group[group_id].append(p)
+    for group_id, players in players_by_group.items():
+        if len(players) >= GROUP_SIZE:
+            return players[:GROUP_SIZE]
+    return None
+
+
+def lobby_id(player):
+    try:
+        return player.participant.lobby_id
+    except KeyError:
+        return f"group-{player.group.id_in_subsession}"
+
+
+def simulate(method, arrivals):
+    # Every arrival triggers a call with the current waiting list; grouped players leave it.
+    # Only the time spent in the method is counted.
+    waiting = []
+    groups = []
+    elapsed = 0.0
+    for player in arrivals:
+        waiting.append(player)
+        start = time.perf_counter()
+        group = method(waiting)
+        elapsed += time.perf_counter() - start
+        if group:
+            grouped = {p.id_in_subsession for p in group}
+            groups.append(grouped)
+            waiting = [p for p in waiting if p.id_in_subsession not in grouped]
+    return elapsed, groups, len(waiting)
+
+
+def indexed_method(index):
+    return lambda waiting: form_group(index, waiting, lambda p: p.id_in_subsession, lobby_id)
+
+
+def main():
+    arrivals = make_arrivals(random.Random(0))
+    # Both methods have to form the same groups, in the same order, for the timings to be comparable
+    original_groups = simulate(lambda waiting: original_method(None, waiting), arrivals)[1]
+    indexed_groups = simulate(indexed_method(LobbyIndex(GROUP_SIZE)), arrivals)[1]
+    assert original_groups == indexed_groups, "the methods formed different groups"
+
+    index = LobbyIndex(GROUP_SIZE)
+    results = [
+        ("original", simulate(lambda waiting: original_method(None, waiting), arrivals)),
+        ("indexed", simulate(indexed_method(index), arrivals)),
+    ]
+    print(f"{ARRIVALS} arrivals, {LOBBIES} lobbies, groups of {GROUP_SIZE}")
+    print(f"{'method':>9} {'total (ms)':>11} {'per arrival (us)':>17} {'groups':>7} {'left waiting':>13}")
+    for name, (elapsed, groups, left) in results:
+        print(f"{name:>9} {elapsed * 1000:>11.2f} {elapsed / ARRIVALS * 1e6:>17.1f} {len(groups):>7} {left:>13}")
+    print("index stats:", index.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Compares payoff arithmetic on Decimal values (with the str parsing of the old
+punishment code) against integer milli-points.
+
+Usage:
+    python -m benchmarks.bench_points
+"""
+import random
+import time
+from decimal import Decimal
+
+from common.points import SCALE, div_round, ratio, scale
+
+EFFICIENCY_FACTOR = 0.375
+NUM_PLAYERS = 100_000
+REPEATS = 5
+
+
+class Points(Decimal):
+    # Stand-in for a Currency amount, which prints with its unit.
+    def __str__(self):
+        return f"{Decimal.__str__(self)} points"
+
+
+def decimal_path(rows):
+    factor = Decimal(str(EFFICIENCY_FACTOR))
+    payoffs = []
+    for contribution, total, received in rows:
+        gross = Points(20) - Points(contribution) + Points(factor * total)
+        received = Points(received)
+        reduction = min(1, int(str(received).split()[0]) / 10)
+        payoffs.append(max(0, gross * Decimal(1 - reduction)))
+    return payoffs
+
+
+def milli_path(rows):
+    factor = ratio(EFFICIENCY_FACTOR)
+    payoffs = []
+    for contribution, total, received in rows:
+        gross = 20 * SCALE - contribution * SCALE + scale(total * SCALE, factor)
+        payoffs.append(max(0, div_round(gross * (10 - min(received, 10)), 10)))
+    return payoffs
+
+
+def best_of(func, rows):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func(rows)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    rng = random.Random(0)
+    rows = [(rng.randint(0, 20), rng.randint(0, 80), rng.randint(0, 12)) for _ in range(NUM_PLAYERS)]
+    decimal = best_of(decimal_path, rows)
+    milli = best_of(milli_path, rows)
+    print(f"{NUM_PLAYERS} payoffs")
+    print(f"{'Decimal/str (ms)':>17} {'milli-points (ms)':>18} {'speed-up':>9}")
+    print(f"{decimal * 1000:>17.1f} {milli * 1000:>18.1f} {decimal / milli:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
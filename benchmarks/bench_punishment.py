@@ -0,0 +1,83 @@
+"""
+Compares the per-player punishment settlement with the punishment matrix pass.
+
+Usage:
+    python -m benchmarks.bench_punishment
+"""
+import random
+import time
+from types import SimpleNamespace
+
+from common.points import SCALE, from_milli
+from common.settlement import punishment_matrix, settle_punishment
+
+PUNISHMENT_COSTS = [0, 1, 2, 4, 6, 9, 12, 16, 20, 25, 30]
+GROUP_SIZES = [4, 30, 100]
+REPEATS = 5
+
+
+def make_group(group_size, rng):
+    players = [SimpleNamespace(id_in_group=i, gross_profit=float(rng.randint(0, 60))) for i in range(1, group_size + 1)]
+    for sender in players:
+        for receiver in players:
+            if receiver is not sender:
+                setattr(sender, f"punishment_sent_to_player_{receiver.id_in_group}", rng.choice([0, 0, 0, 1, 2, 5]))
+    return players
+
+
+def others(players, player):
+    return [p for p in players if p is not player]
+
+
+def settle_per_player(players):
+    # The original Player.set_punishment_and_final_payoffs, called once per player.
+    for p in players:
+        p.total_punishment_cost = 0
+    for p in players:
+        p.received_punishment = sum(
+            getattr(other, f"punishment_sent_to_player_{p.id_in_group}", 0) for other in others(players, p)
+        )
+        for other in others(players, p):
+            points = getattr(p, f"punishment_sent_to_player_{other.id_in_group}")
+            p.total_punishment_cost += PUNISHMENT_COSTS[int(points)]
+        reduction = min(1, int(str(p.received_punishment).split()[0]) / 10)
+        p.payoff = max(0, p.gross_profit * (1 - reduction))
+
+
+def settle_matrix(players):
+    matrix = punishment_matrix(
+        players,
+        lambda sender, receiver: getattr(sender, f"punishment_sent_to_player_{receiver.id_in_group}"),
+    )
+    result = settle_punishment(matrix, [round(p.gross_profit * SCALE) for p in players], PUNISHMENT_COSTS)
+    for p, received, cost, payoff in zip(
+        players, result.received_punishment, result.total_punishment_cost, result.payoff
+    ):
+        p.received_punishment = received
+        p.total_punishment_cost = from_milli(cost)
+        p.payoff = from_milli(payoff)
+
+
+def best_of(func, players):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func(players)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    rng = random.Random(0)
+    print(f"{'size':>5} {'per-player (ms)':>16} {'matrix (ms)':>12}")
+    for group_size in GROUP_SIZES:
+        players = make_group(group_size, rng)
+        per_player = best_of(settle_per_player, players)
+        expected = [(p.received_punishment, p.total_punishment_cost, round(p.payoff, 3)) for p in players]
+        matrix = best_of(settle_matrix, players)
+        assert expected == [(p.received_punishment, p.total_punishment_cost, p.payoff) for p in players]
+        print(f"{group_size:>5} {per_player * 1000:>16.3f} {matrix * 1000:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
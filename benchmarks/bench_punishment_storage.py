@@ -0,0 +1,115 @@
+"""
+Compares the size and load time of Player rows with 30 punishment columns and with a
+packed punishment vector.
+
+The tables mirror the Player columns of public_goods_game_new before and after the
+punishment fields were packed, stored in SQLite. Row sizes in PostgreSQL differ, but
+the ratio between the two layouts is what matters here.
+
+Usage:
+    python -m benchmarks.bench_punishment_storage
+"""
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from common.punishment import pack_points
+
+MAX_GROUP_SIZE = 30
+NUM_ROUNDS = 20
+PLAYERS = 600
+GROUP_SIZES = [4, 30]
+REPEATS = 5
+
+COMMON_COLUMNS = [
+    "id INTEGER PRIMARY KEY",
+    "participant_id INTEGER",
+    "round_number INTEGER",
+    "id_in_group INTEGER",
+    "group_id INTEGER",
+    "payoff NUMERIC",
+    "accumulated_earnings NUMERIC",
+    "payoff_from_private NUMERIC",
+    "payoff_from_public NUMERIC",
+    "gross_profit NUMERIC",
+    "public_investment NUMERIC",
+    "received_punishment NUMERIC",
+    "total_punishment_cost NUMERIC",
+    "inactive BOOLEAN",
+]
+WIDE_COLUMNS = COMMON_COLUMNS + ["endowment NUMERIC"] + [
+    f"punishment_sent_to_player_{i} NUMERIC" for i in range(1, MAX_GROUP_SIZE + 1)
+]
+PACKED_COLUMNS = COMMON_COLUMNS + ["punishment_sent TEXT"]
+
+
+def common_values(row_id, participant_id, round_number, id_in_group, rng):
+    return [
+        row_id, participant_id, round_number, id_in_group, participant_id // 30,
+        rng.randint(0, 50), rng.randint(0, 500), rng.randint(0, 20), rng.randint(0, 40),
+        rng.randint(0, 60), rng.randint(0, 20), rng.randint(0, 10), rng.randint(0, 30), False,
+    ]
+
+
+def sent_points(group_size, id_in_group, rng):
+    return [0 if i == id_in_group else rng.choice([0, 0, 0, 1, 2, 5]) for i in range(1, group_size + 1)]
+
+
+def build(path, columns, group_size, packed):
+    rng = random.Random(0)
+    connection = sqlite3.connect(path)
+    connection.execute(f"CREATE TABLE player ({', '.join(columns)})")
+    connection.execute("CREATE INDEX player_participant ON player (participant_id)")
+    rows = []
+    row_id = 0
+    for participant_id in range(PLAYERS):
+        id_in_group = participant_id % group_size + 1
+        for round_number in range(1, NUM_ROUNDS + 1):
+            row_id += 1
+            values = common_values(row_id, participant_id, round_number, id_in_group, rng)
+            points = sent_points(group_size, id_in_group, rng)
+            if packed:
+                values.append(pack_points(points))
+            else:
+                values.append(20)
+                values.extend(points + [0] * (MAX_GROUP_SIZE - group_size))
+            rows.append(values)
+    placeholders = ", ".join("?" * len(columns))
+    connection.executemany(f"INSERT INTO player VALUES ({placeholders})", rows)
+    connection.commit()
+    connection.execute("VACUUM")
+    return connection, len(rows)
+
+
+def load_all_rounds(connection):
+    # One in_all_rounds() load per participant
+    for participant_id in range(PLAYERS):
+        connection.execute("SELECT * FROM player WHERE participant_id = ?", (participant_id,)).fetchall()
+
+
+def best_of(func, connection):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func(connection)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    print(f"{'size':>5} {'layout':>7} {'columns':>8} {'bytes/row':>10} {'in_all_rounds load (ms)':>24}")
+    for group_size in GROUP_SIZES:
+        for layout, columns, packed in [("wide", WIDE_COLUMNS, False), ("packed", PACKED_COLUMNS, True)]:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "bench.sqlite3")
+                connection, num_rows = build(path, columns, group_size, packed)
+                load = best_of(load_all_rounds, connection)
+                connection.close()
+                bytes_per_row = os.path.getsize(path) / num_rows
+            print(f"{group_size:>5} {layout:>7} {len(columns):>8} {bytes_per_row:>10.1f} {load * 1000:>24.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Compares the per-player settlement loop with the batched settlement pass.
+
+Usage:
+    python -m benchmarks.bench_settlement
+"""
+import random
+import time
+from types import SimpleNamespace
+
+from common.points import SCALE, ratio
+from common.settlement import SettlementBatch, settle_first_stage
+
+ENDOWMENT = 20
+EFFICIENCY_FACTOR = 0.375
+GROUP_COUNTS = [1, 10, 100]
+GROUP_SIZES = [4, 30, 100]
+REPEATS = 5
+
+
+def make_groups(num_groups, group_size, rng):
+    groups = []
+    for _ in range(num_groups):
+        players = [
+            SimpleNamespace(
+                public_investment=rng.randint(0, ENDOWMENT),
+                endowment=ENDOWMENT,
+                previous_accumulated=rng.randint(0, 200),
+            )
+            for _ in range(group_size)
+        ]
+        groups.append(SimpleNamespace(players=players, total_group_investment=0))
+    return groups
+
+
+def settle_per_player(groups):
+    # The original Group.set_first_stage_earnings + update_accumulated_earnings, one group at a time.
+    for group in groups:
+        players = group.players
+        group.total_group_investment = sum([p.public_investment for p in players])
+        for p in players:
+            p.payoff_from_private = p.endowment - p.public_investment
+            p.payoff_from_public = EFFICIENCY_FACTOR * group.total_group_investment
+            p.gross_profit = p.payoff_from_private + p.payoff_from_public
+        for p in players:
+            p.accumulated_earnings = p.previous_accumulated + p.gross_profit
+
+
+def settle_batched(groups):
+    batch = SettlementBatch()
+    players = []
+    for group in groups:
+        players.extend(group.players)
+        batch.add_group(
+            [p.public_investment * SCALE for p in group.players],
+            [p.endowment * SCALE for p in group.players],
+            [p.previous_accumulated * SCALE for p in group.players],
+        )
+    result = settle_first_stage(batch, ratio(EFFICIENCY_FACTOR))
+    for group, total in zip(groups, result.group_totals):
+        group.total_group_investment = total
+    for p, private, public, gross, accumulated in zip(
+        players,
+        result.payoff_from_private,
+        result.payoff_from_public,
+        result.gross_profit,
+        result.accumulated_earnings,
+    ):
+        p.payoff_from_private = private
+        p.payoff_from_public = public
+        p.gross_profit = gross
+        p.accumulated_earnings = accumulated
+
+
+def build_batch(groups):
+    batch = SettlementBatch()
+    for group in groups:
+        batch.add_group(
+            [p.public_investment * SCALE for p in group.players],
+            [p.endowment * SCALE for p in group.players],
+            [p.previous_accumulated * SCALE for p in group.players],
+        )
+    return batch
+
+
+def best_of(func, groups):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func(groups)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    rng = random.Random(0)
+    # "batched" includes loading the batch and writing the results back to the player objects,
+    # "core" is the array pass alone.
+    print(f"{'groups':>7} {'size':>5} {'players':>8} {'per-player (ms)':>16} {'batched (ms)':>13} {'core (ms)':>10}")
+    for num_groups in GROUP_COUNTS:
+        for group_size in GROUP_SIZES:
+            groups = make_groups(num_groups, group_size, rng)
+            per_player = best_of(settle_per_player, groups)
+            batched = best_of(settle_batched, groups)
+            core = best_of(lambda batch: settle_first_stage(batch, ratio(EFFICIENCY_FACTOR)), build_batch(groups))
+            print(
+                f"{num_groups:>7} {group_size:>5} {num_groups * group_size:>8} "
+                f"{per_player * 1000:>16.3f} {batched * 1000:>13.3f} {core * 1000:>10.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
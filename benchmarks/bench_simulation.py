@@ -0,0 +1,41 @@
+"""
+Measures the throughput of the Monte Carlo simulation core on a mixed cohort.
+
+Usage:
+    python -m benchmarks.bench_simulation
+"""
+import random
+import time
+
+from common.simulation import ConditionalCooperator, FreeRider, Punisher, Rules, simulate_cohort
+
+NUM_GROUPS = 2000
+GROUP_SIZES = [4, 30]
+NUM_ROUNDS = 10
+
+
+def make_cohort(group_size, rng):
+    strategies = [FreeRider(), ConditionalCooperator(), Punisher()]
+    return [[rng.choice(strategies) for _ in range(group_size)] for _ in range(NUM_GROUPS)]
+
+
+def main():
+    print(f"{NUM_GROUPS} groups, {NUM_ROUNDS} rounds")
+    print(f"{'size':>5} {'punishment':>11} {'seconds':>8} {'group rounds/s':>15} {'player rounds/s':>16} {'failed':>7}")
+    for group_size in GROUP_SIZES:
+        for punishment_condition in (False, True):
+            rules = Rules(num_rounds=NUM_ROUNDS, punishment_condition=punishment_condition, dropout_hazard=0.02)
+            cohort = make_cohort(group_size, random.Random(0))
+            start = time.perf_counter()
+            result = simulate_cohort(rules, cohort, random.Random(1))
+            elapsed = time.perf_counter() - start
+            group_rounds = NUM_GROUPS * NUM_ROUNDS
+            failed = sum(1 for round_number in result.failed_round if round_number)
+            print(
+                f"{group_size:>5} {str(punishment_condition):>11} {elapsed:>8.2f} {group_rounds / elapsed:>15.0f}"
+                f" {group_rounds * group_size / elapsed:>16.0f} {failed:>7}"
+            )
+
+
+if __name__ == "__main__":
+    main()
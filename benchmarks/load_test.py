@@ -0,0 +1,359 @@
+"""
+Load driver for a running oTree server.
+
+Creates sessions through the REST API and plays every participant over plain
+HTTP, each in its own thread, the way a browser without JavaScript would:
+regular pages are loaded and submitted with generated form values, wait pages
+are polled until they release. Per page class it reports the p50/p95/p99
+latency of page requests, the release latency of wait pages (from the first
+load of the wait page until the server sends the participant on) and the error
+rate (HTTP errors, connection errors and forms the server kept rejecting).
+
+A share of the participants can be made to drop out: from the first timed page
+of a given page class on (--dropout-page, Contribution by default; Decision for
+DropOutTest) they leave their browser open without answering. Every timed page
+is then submitted as a timeout once its time is up, the same way the page's
+countdown script does, and they stop at the first page without a timer. The
+server only accepts a timeout after the page's time has passed, so a run with
+dropouts takes at least the timeout of that page (90 seconds for the
+Contribution page of public_goods_game_new).
+
+Start the server first, for example:
+
+    OTREE_REST_KEY=secret OTREE_PRODUCTION=1 otree prodserver 8000
+
+Usage:
+    OTREE_REST_KEY=secret python -m benchmarks.load_test public_goods_game_new_1 \\
+        --sessions 50 --participants 4 --dropout-rate 0.1
+"""
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode, urlsplit
+from urllib.request import Request, urlopen
+
+from common.punishment import pack_points
+
+# Name of the field the countdown script adds to the form when a page times out
+TIMEOUT_FIELD = "timeout_happened"
+# Pages are under /p/<participant code>/<app>/<page class>/<index>
+PAGE_PATH = re.compile(r"^/p/[^/]+/([^/]+)/([^/]+)/\d+")
+JS_VARS = re.compile(r"js_vars\s*=\s*(\{.*?\});", re.S)
+# Seconds until the page's timer runs out, as the countdown script gets them
+REMAINING_SECONDS = re.compile(r"remainingTimeoutSeconds\s*=\s*(-?[\d.]+)")
+# Fields that have no input in the HTML, because _static/mgslider.js builds the slider and its input
+SLIDER = re.compile(r"new mgslider\(\s*[\"'](\w+)[\"']\s*,\s*(-?[\d.]+)\s*,\s*(-?[\d.]+)")
+MAX_REJECTIONS = 3
+
+
+def percentile(values, fraction):
+    """
+    Returns the nearest-rank percentile of a list of numbers (0 for an empty list).
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered) + 0.5) - 1))]
+
+
+class FormParser(HTMLParser):
+    """
+    Collects the form fields of a page: hidden and text inputs, radio choices and select options.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.has_form = False
+        self.has_submit = False
+        self.has_timer = False
+        self.values = {}
+        self.choices = defaultdict(list)
+        self.bounds = {}
+        self.select = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        name = attrs.get("name")
+        if tag == "form":
+            self.has_form = True
+        elif tag == "button" and attrs.get("type", "submit") == "submit":
+            self.has_submit = True
+        elif tag == "input":
+            kind = attrs.get("type", "text")
+            if kind == "submit":
+                self.has_submit = True
+            elif name and kind in ("radio", "checkbox"):
+                self.choices[name].append(attrs.get("value", "on"))
+            elif name:
+                self.values[name] = attrs.get("value") or ""
+                if kind == "number":
+                    self.bounds[name] = (attrs.get("min"), attrs.get("max"))
+        elif tag == "select" and name:
+            self.select = name
+        elif tag == "option" and self.select and attrs.get("value"):
+            self.choices[self.select].append(attrs["value"])
+        if "otree-timer" in (attrs.get("class") or "") or "otree-timer" in (attrs.get("id") or ""):
+            self.has_timer = True
+
+    def handle_endtag(self, tag):
+        if tag == "select":
+            self.select = None
+
+
+def fill_form(form, html, rng):
+    """
+    Generates values for every field of a page.
+
+    Radio buttons and selects get a random choice, number inputs and sliders a random value within
+    their bounds. The packed punishment vector of public_goods_game_new is filled with zeros. Sliders
+    and the punishment vector are built in JavaScript, so they are read from the page's scripts.
+    """
+    data = dict(form.values)
+    for name, low, high in SLIDER.findall(html):
+        data[name] = str(rng.randint(int(float(low)), int(float(high))))
+    for name, choices in form.choices.items():
+        data[name] = choices[0] if name.startswith("punishment_sent") else rng.choice(choices)
+    for name, (low, high) in form.bounds.items():
+        low = int(float(low)) if low else 0
+        high = int(float(high)) if high else low
+        data[name] = str(rng.randint(low, max(low, high)))
+    if "punishment_sent" in data:
+        match = JS_VARS.search(html)
+        group_size = json.loads(match.group(1)).get("group_size", 0) if match else 0
+        data["punishment_sent"] = pack_points([0] * group_size)
+    return data
+
+
+class Metrics:
+    """
+    Thread-safe collection of request latencies, wait page releases and errors per page class.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = defaultdict(list)
+        self.release = defaultdict(list)
+        self.requests = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.finished = 0
+        self.aborted = 0
+        self.dropped_out = 0
+        # Requests made by participants after they dropped out
+        self.dropout_requests = 0
+
+    def request(self, page, seconds, error=False, dropped_out=False):
+        with self.lock:
+            self.requests[page] += 1
+            if dropped_out:
+                self.dropout_requests += 1
+            self.latency[page].append(seconds)
+            if error:
+                self.errors[page] += 1
+
+    def released(self, page, seconds):
+        with self.lock:
+            self.release[page].append(seconds)
+
+    def participant_done(self, aborted, dropped_out=False):
+        with self.lock:
+            if aborted:
+                self.aborted += 1
+            elif dropped_out:
+                self.dropped_out += 1
+            else:
+                self.finished += 1
+
+
+class Client:
+    def __init__(self, server, rest_key, timeout):
+        self.server = server.rstrip("/")
+        self.rest_key = rest_key
+        self.timeout = timeout
+
+    def api(self, method, path, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else None
+        request = Request(f"{self.server}/api/{path}", data=body, method=method)
+        request.add_header("Content-Type", "application/json")
+        if self.rest_key:
+            request.add_header("otree-rest-key", self.rest_key)
+        with urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read().decode())
+
+    def create_session(self, config_name, num_participants):
+        session = self.api("POST", "sessions", dict(session_config_name=config_name, num_participants=num_participants))
+        details = self.api("GET", f"sessions/{session['code']}")
+        return [participant["code"] for participant in details["participants"]]
+
+    def fetch(self, url, data=None):
+        """
+        Loads a page, following redirects.
+
+        Returns:
+            tuple: The final URL, the HTML, and the seconds the request took.
+        """
+        body = urlencode(data).encode() if data is not None else None
+        start = time.perf_counter()
+        with urlopen(Request(url, data=body), timeout=self.timeout) as response:
+            html = response.read().decode("utf-8", "replace")
+            return response.geturl(), html, time.perf_counter() - start
+
+
+def page_class(url):
+    match = PAGE_PATH.match(urlsplit(url).path)
+    return f"{match.group(1)}.{match.group(2)}" if match else None
+
+
+def play_participant(client, code, metrics, rng, dropout_page, poll_interval, deadline):
+    """
+    Plays one participant from the start link until they reach a page without a next button,
+    leave the pages of the session, or the deadline passes. Participants with a dropout_page
+    let their pages time out from the first timed page of that class on.
+    """
+    url = f"{client.server}/InitializeParticipant/{code}"
+    page = "InitializeParticipant"
+    data = None
+    dropped_out = False
+    waiting_since = None
+    rejections = 0
+    try:
+        while time.monotonic() < deadline:
+            next_url, html, seconds = client.fetch(url, data)
+            metrics.request(page, seconds, dropped_out=dropped_out)
+
+            next_page = page_class(next_url)
+            if next_page is None:
+                # Out of the page sequence (OutOfRangeNotification)
+                return metrics.participant_done(aborted=False, dropped_out=dropped_out)
+            if waiting_since is not None and next_page != page:
+                metrics.released(page, time.monotonic() - waiting_since)
+                waiting_since = None
+            if data is not None and next_page == page and next_url == url:
+                # The server rendered the page again with form errors
+                rejections += 1
+                if rejections >= MAX_REJECTIONS:
+                    metrics.request(page, 0.0, error=True)
+                    return metrics.participant_done(aborted=True)
+            else:
+                rejections = 0
+            url, page = next_url, next_page
+
+            form = FormParser()
+            form.feed(html)
+            if not form.has_form:
+                # A wait page: poll until the group is released
+                if waiting_since is None:
+                    waiting_since = time.monotonic()
+                data = None
+                time.sleep(poll_interval)
+                continue
+            if not form.has_submit and not form.has_timer:
+                # The last page of the game, e.g. FailedGamePage or FinalGameResults
+                return metrics.participant_done(aborted=False, dropped_out=dropped_out)
+            data = fill_form(form, html, rng)
+            dropped_out = dropped_out or (form.has_timer and page.split(".")[-1] == dropout_page)
+            if dropped_out:
+                if not form.has_timer:
+                    # Nothing submits this page for an idle participant
+                    return metrics.participant_done(aborted=False, dropped_out=True)
+                match = REMAINING_SECONDS.search(html)
+                time.sleep(max(0.0, float(match.group(1)) if match else 0.0))
+                data[TIMEOUT_FIELD] = "1"
+        metrics.participant_done(aborted=True)
+    except (HTTPError, URLError, OSError):
+        metrics.request(page, 0.0, error=True)
+        metrics.participant_done(aborted=True)
+
+
+def report(metrics, elapsed):
+    print(
+        f"{metrics.finished} participants finished, {metrics.dropped_out} dropped out,"
+        f" {metrics.aborted} aborted in {elapsed:.1f} s"
+    )
+    print(f"{sum(metrics.requests.values())} requests, {metrics.dropout_requests} of them by dropouts after dropping out")
+    print(f"{'page':>40} {'requests':>9} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'errors':>7} {'error %':>8}")
+    for page in sorted(metrics.requests):
+        latency = metrics.latency[page]
+        print(
+            f"{page:>40} {metrics.requests[page]:>9}"
+            f" {percentile(latency, 0.50) * 1000:>9.1f} {percentile(latency, 0.95) * 1000:>9.1f}"
+            f" {percentile(latency, 0.99) * 1000:>9.1f} {metrics.errors[page]:>7}"
+            f" {metrics.errors[page] / metrics.requests[page] * 100:>8.2f}"
+        )
+    if metrics.release:
+        print(f"{'wait page':>40} {'releases':>9} {'p50 (s)':>9} {'p95 (s)':>9} {'p99 (s)':>9}")
+        for page in sorted(metrics.release):
+            release = metrics.release[page]
+            print(
+                f"{page:>40} {len(release):>9} {percentile(release, 0.50):>9.2f}"
+                f" {percentile(release, 0.95):>9.2f} {percentile(release, 0.99):>9.2f}"
+            )
+
+
+def run(client, session_config, args):
+    """
+    Creates the sessions and plays all their participants at once.
+
+    Args:
+        client (Client): The server.
+        session_config (str): Name of the session config.
+        args (Namespace): The sessions, participants, dropout-rate, dropout-page, poll-interval, duration
+            and seed options. The same seed makes the same participants (by position) drop out.
+
+    Returns:
+        tuple: The Metrics and the seconds the run took.
+    """
+    codes = []
+    for _ in range(args.sessions):
+        codes.extend(client.create_session(session_config, args.participants))
+
+    rng = random.Random(args.seed)
+    metrics = Metrics()
+    start = time.monotonic()
+    deadline = start + args.duration
+    with ThreadPoolExecutor(max_workers=len(codes)) as pool:
+        for code in codes:
+            pool.submit(
+                play_participant,
+                client,
+                code,
+                metrics,
+                random.Random(rng.random()),
+                args.dropout_page if rng.random() < args.dropout_rate else None,
+                args.poll_interval,
+                deadline,
+            )
+    return metrics, time.monotonic() - start
+
+
+def add_options(parser):
+    parser.add_argument("--server", default="http://localhost:8000")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--participants", type=int, default=4, help="Participants per session")
+    parser.add_argument("--dropout-rate", type=float, default=0.0, help="Share of participants that drop out")
+    parser.add_argument("--dropout-page", default="Contribution", help="Page class on which participants drop out")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="Seconds between wait page loads")
+    parser.add_argument("--duration", type=float, default=600, help="Seconds after which participants give up")
+    parser.add_argument("--request-timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("session_config", help="Name of the session config to run")
+    add_options(parser)
+    args = parser.parse_args()
+
+    client = Client(args.server, os.environ.get("OTREE_REST_KEY"), args.request_timeout)
+    report(*run(client, args.session_config, args))
+
+
+if __name__ == "__main__":
+    main()
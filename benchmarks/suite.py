@@ -0,0 +1,302 @@
+"""
+Micro-benchmark suite for the settlement and page context functions.
+
+Runs the functions of the public goods apps and Game on in-memory stand-ins for
+the session, participants, players and groups, so no server, database or
+browser is involved. Every function is timed at each combination of group size
+and number of played rounds (the rounds decide how much history the pages read).
+
+Results are written as JSON. Compare mode reads two result files and exits with
+status 1 if any benchmark got slower than the threshold allows, so a hot path
+regression shows up before a lab day.
+
+The apps import oTree, so run the suite from the project root with oTree
+installed:
+
+    python -m benchmarks.suite --output before.json
+    python -m benchmarks.suite --output after.json
+    python -m benchmarks.suite --compare before.json after.json
+"""
+import argparse
+import importlib
+import itertools
+import json
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from common.history import append_round, history_key
+from common.ledger import open_ledger, record_earnings
+from common.points import SCALE
+from common.punishment import pack_points
+from common.status import reset_status
+
+GROUP_SIZES = [4, 30, 100]
+ROUND_COUNTS = [3, 20, 100]
+# Seconds to spend on each repeat of a benchmark
+MIN_TIME = 0.1
+REPEATS = 7
+DEFAULT_THRESHOLD = 0.10
+
+
+class Participant:
+    """
+    Participant stand-in: participant fields are stored in ``vars``, like in oTree.
+    """
+
+    def __init__(self):
+        object.__setattr__(self, "vars", {})
+
+    def __getattr__(self, name):
+        try:
+            return self.vars[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        self.vars[name] = value
+
+
+class Group(SimpleNamespace):
+    def get_players(self):
+        return self.players
+
+
+class Player(SimpleNamespace):
+    def get_others_in_group(self):
+        return [p for p in self.group.players if p is not self]
+
+
+session_codes = itertools.count(1)
+
+
+def make_group(app_name, group_size, num_rounds, rng, **player_fields):
+    """
+    Builds a group in the last of ``num_rounds`` rounds, with an open ledger for every participant
+    and the history of the earlier rounds in the session vars. Every group gets a session code of its own,
+    so the apps' group rosters (see common.membership) are not shared between fixtures.
+    """
+    session = SimpleNamespace(
+        code=f"bench{next(session_codes)}",
+        vars={},
+        config=dict(punishment_condition=True, num_demo_participants=group_size),
+    )
+    group = Group(
+        session=session,
+        round_number=num_rounds,
+        id_in_subsession=1,
+        inactive_players=0,
+        failed=False,
+        total_group_investment=0,
+        players=[],
+    )
+    for id_in_group in range(1, group_size + 1):
+        participant = Participant()
+        reset_status(participant)
+        open_ledger(participant, app_name)
+        record_earnings(participant, app_name, gross=rng.randint(0, 40) * SCALE, accumulated=rng.randint(0, 200) * SCALE)
+        group.players.append(
+            Player(
+                id=id_in_group,
+                participant=participant,
+                group=group,
+                session=session,
+                round_number=num_rounds,
+                id_in_group=id_in_group,
+                **{name: make_value(rng) for name, make_value in player_fields.items()},
+            )
+        )
+    key = history_key(app_name, group)
+    for round_number in range(1, num_rounds):
+        rows = [[rng.randint(0, 20) * SCALE, rng.randint(0, 20) * SCALE, rng.randint(0, 40) * SCALE, False] for _ in group.players]
+        append_round(session, key, round_number, rows)
+    return group
+
+
+def public_goods_group(app, group_size, num_rounds, rng):
+    constants = app.Constants
+    group = make_group(
+        constants.name_in_url,
+        group_size,
+        num_rounds,
+        rng,
+        public_investment=lambda rng: rng.randint(0, constants.endowment),
+        punishment_sent=lambda rng: pack_points([rng.choice([0, 0, 0, 1, 2]) for _ in range(group_size)]),
+        received_punishment=lambda rng: rng.randint(0, 10),
+        accumulated_earnings=lambda rng: rng.randint(0, 200),
+        inactive=lambda rng: False,
+    )
+    group.punishment_condition = group.session.config["punishment_condition"]
+    for p in group.players:
+        # Nobody punishes themselves
+        sent = list(p.punishment_sent)
+        sent[p.id_in_group - 1] = "0"
+        p.punishment_sent = "".join(sent)
+    return group
+
+
+def game_group(app, group_size, num_rounds, rng):
+    return make_group(app.C.NAME_IN_URL, group_size, num_rounds, rng, contribution=lambda rng: rng.randint(0, 20))
+
+
+def page_context(page_name, method="vars_for_template"):
+    return lambda app, group: getattr(getattr(app, page_name), method)(group.players[0])
+
+
+def timed_out(app, group):
+    # The timeout makes the player inactive, so the player is made active again first to time out on every call
+    player = group.players[0]
+    reset_status(player.participant)
+    player.inactive = False
+    app.rosters.get(group).inactive.discard(player.id_in_group)
+    app.timeout_check(player, True)
+
+
+def page_routing(app, group):
+    player = group.players[0]
+    return [page.is_displayed(player) for page in app.page_sequence]
+
+
+# name: (app module, fixture, function, whether the number of rounds matters)
+BENCHMARKS = {
+    "set_first_stage_earnings": (
+        "public_goods_game_new", public_goods_group, lambda app, group: app.Group.set_first_stage_earnings(group), True,
+    ),
+    "set_punishment_and_final_payoffs": (
+        "public_goods_game_new", public_goods_group, lambda app, group: app.Group.set_punishment_and_final_payoffs(group), False,
+    ),
+    "timeout_check": (
+        "public_goods_game_new", public_goods_group, lambda app, group: app.timeout_check(group.players[0], False), False,
+    ),
+    "timeout_check_timed_out": ("public_goods_game_new", public_goods_group, timed_out, False),
+    "update_group_status": (
+        "public_goods_game_new", public_goods_group, lambda app, group: app.update_group_status(group), False,
+    ),
+    "ObservationPage.vars_for_template": ("public_goods_game_new", public_goods_group, page_context("ObservationPage"), True),
+    "PunishmentPage.vars_for_template": ("public_goods_game_new", public_goods_group, page_context("PunishmentPage"), True),
+    "ObservationPage.js_vars": ("public_goods_game_new", public_goods_group, page_context("ObservationPage", "js_vars"), True),
+    "PunishmentPage.js_vars": ("public_goods_game_new", public_goods_group, page_context("PunishmentPage", "js_vars"), True),
+    "page_routing": ("public_goods_game_new", public_goods_group, page_routing, False),
+    "FinalRoundResults.vars_for_template": ("public_goods_game_new", public_goods_group, page_context("FinalRoundResults"), False),
+    "FinalGameResults.vars_for_template": ("public_goods_game_new", public_goods_group, page_context("FinalGameResults"), False),
+    "public_goods_game.FinalRoundResults.vars_for_template": (
+        "public_goods_game", public_goods_group, page_context("FinalRoundResults"), False,
+    ),
+    "public_goods_game.FinalGameResults.vars_for_template": (
+        "public_goods_game", public_goods_group, page_context("FinalGameResults"), False,
+    ),
+    "Game.end_round": ("Game", game_group, lambda app, group: app.end_round(group), False),
+}
+
+
+def measure(function):
+    """
+    Times a function.
+
+    Returns:
+        dict: The best and median time per call over the repeats (microseconds) and the number of calls per repeat.
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        if time.perf_counter() - start >= MIN_TIME:
+            break
+        number *= 2
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((time.perf_counter() - start) / number * 1e6)
+    timings.sort()
+    return dict(best_us=timings[0], median_us=timings[len(timings) // 2], calls=number)
+
+
+def run(names, group_sizes, round_counts, seed):
+    results = {}
+    skipped = {}
+    for name in names:
+        module_name, fixture, function, uses_rounds = BENCHMARKS[name]
+        try:
+            app = importlib.import_module(module_name)
+        except ImportError as error:
+            skipped[name] = str(error)
+            continue
+        for group_size in group_sizes:
+            for num_rounds in round_counts if uses_rounds else round_counts[:1]:
+                group = fixture(app, group_size, num_rounds, random.Random(seed))
+                key = f"{name}[size={group_size},rounds={num_rounds}]" if uses_rounds else f"{name}[size={group_size}]"
+                results[key] = measure(lambda: function(app, group))
+                print(f"{key:>64} {results[key]['best_us']:>12.2f} us")
+    for name, reason in skipped.items():
+        print(f"{name:>64} skipped ({reason})")
+    return dict(
+        created=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        results=results,
+        skipped=skipped,
+    )
+
+
+def compare(before_path, after_path, threshold):
+    """
+    Prints the change of every benchmark found in both result files.
+
+    Returns:
+        int: The number of benchmarks whose best time grew by more than the threshold.
+    """
+    with open(before_path) as f:
+        before = json.load(f)["results"]
+    with open(after_path) as f:
+        after = json.load(f)["results"]
+    regressions = 0
+    print(f"{'benchmark':>64} {'before (us)':>12} {'after (us)':>12} {'change':>8}")
+    for key in sorted(before.keys() & after.keys()):
+        old, new = before[key]["best_us"], after[key]["best_us"]
+        change = new / old - 1 if old else 0.0
+        flag = ""
+        if change > threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{key:>64} {old:>12.2f} {new:>12.2f} {change * 100:>7.1f}%{flag}")
+    for key in sorted(before.keys() ^ after.keys()):
+        print(f"{key:>64} only in {'before' if key in before else 'after'}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two result files")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown, e.g. 0.1 for 10%%")
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this text")
+    parser.add_argument("--sizes", default=",".join(map(str, GROUP_SIZES)))
+    parser.add_argument("--rounds", default=",".join(map(str, ROUND_COUNTS)))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.compare:
+        regressions = compare(*args.compare, args.threshold)
+        print(f"{regressions} regression(s) above {args.threshold * 100:.0f}%")
+        sys.exit(1 if regressions else 0)
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+    report = run(
+        names,
+        [int(size) for size in args.sizes.split(",")],
+        [int(rounds) for rounds in args.rounds.split(",")],
+        args.seed,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
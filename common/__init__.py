@@ -0,0 +1,6 @@
+"""
+Helpers shared by the game apps.
+
+Nothing in this package imports oTree, so the payoff rules can be run and
+benchmarked without a database or a running server.
+"""
@@ -0,0 +1,145 @@
+"""
+Versioned static asset bundles for the game templates.
+
+The styles and scripts that several pages share live as sources in
+``_static/src`` (plus ``_static/mgslider.js``). This script concatenates them
+into bundles under ``_static/bundle`` whose file names contain a hash of the
+content, e.g. ``game.3f2a9c1d.css``. A changed source gives a new file name,
+so browsers and proxies can cache bundles indefinitely and still never serve
+a stale one. Next to every bundle a gzip (``.gz``) and, if the ``brotli``
+package is installed, a brotli (``.br``) variant are written, which a reverse
+proxy can serve without compressing on every request.
+
+For every bundle an include template is generated in
+``_templates/global/bundle``, holding the ``<link>`` or ``<script>`` tag with
+the current file name:
+
+* ``global/Page.html`` includes the ``game`` bundle on every page, which
+  starts with the self-hosted fonts (``src/fonts.css``, see common.fonts);
+* the observation and punishment pages include the ``history`` bundle.
+
+Run the script after changing a source, and commit the generated files:
+
+    python -m common.bundle
+
+oTree's own static file server does not set caching headers. In production,
+serve ``/static/bundle/`` from the proxy with
+``Cache-Control: public, max-age=31536000, immutable``, and let it pick the
+precompressed variants (nginx: ``gzip_static on;`` and ``brotli_static on;``).
+"""
+import argparse
+import glob
+import gzip
+import hashlib
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIR = os.path.join(ROOT, "_static")
+BUNDLE_DIR = os.path.join(STATIC_DIR, "bundle")
+TEMPLATE_DIR = os.path.join(ROOT, "_templates", "global", "bundle")
+
+# bundle name: sources (relative to _static) per file type
+BUNDLES = {
+    "game": {
+        "css": ["src/fonts.css", "src/game.css"],
+        "js": ["mgslider.js"],
+    },
+    "history": {
+        "css": ["src/history.css"],
+        "js": ["src/history.js"],
+    },
+}
+TAGS = {
+    "css": '<link rel="stylesheet" href="{{ static \'%s\' }}">',
+    "js": '<script src="{{ static \'%s\' }}"></script>',
+}
+# The include template name per file type
+TEMPLATE_NAMES = {"css": "%s_styles.html", "js": "%s_scripts.html"}
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def hashed_name(name, content, extension):
+    """
+    Returns the versioned file name for content, e.g. game.3f2a9c1d.css.
+    """
+    return f"{name}.{hashlib.sha256(content).hexdigest()[:8]}.{extension}"
+
+
+def remove_older_versions(name, extension, file_name):
+    """
+    Removes the files of earlier versions of a bundle or font, including their compressed variants.
+    """
+    for path in glob.glob(os.path.join(BUNDLE_DIR, f"{name}.*.{extension}*")):
+        if not os.path.basename(path).startswith(file_name):
+            os.remove(path)
+
+
+def write_include(template_name, tags):
+    """
+    Writes an include template in _templates/global/bundle holding the given tags.
+    """
+    with open(os.path.join(TEMPLATE_DIR, template_name), "w", encoding="utf-8") as f:
+        f.write("{% load otree static %}\n")
+        f.write("{# Generated by python -m common.bundle or common.fonts, do not edit #}\n")
+        for tag in tags:
+            f.write(tag + "\n")
+
+
+def build(name, kind, sources):
+    """
+    Writes one bundle, its compressed variants and its include template, and removes the files of older versions.
+
+    Returns:
+        dict: The bundle's file name and its size in bytes, raw and per compressed variant.
+    """
+    parts = []
+    for source in sources:
+        with open(os.path.join(STATIC_DIR, source), "rb") as f:
+            parts.append(f.read().rstrip() + b"\n")
+    content = b"\n".join(parts)
+    file_name = hashed_name(name, content, kind)
+
+    variants = {"": content, ".gz": gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = brotli.compress(content, quality=11)
+    remove_older_versions(name, kind, file_name)
+    for suffix, data in variants.items():
+        with open(os.path.join(BUNDLE_DIR, file_name + suffix), "wb") as f:
+            f.write(data)
+
+    write_include(TEMPLATE_NAMES[kind] % name, [TAGS[kind] % f"bundle/{file_name}"])
+    return dict(file=file_name, sizes={suffix or "raw": len(data) for suffix, data in variants.items()})
+
+
+def build_all():
+    """
+    Builds every bundle.
+
+    Returns:
+        dict: Per bundle file type (e.g. "game.css"), the result of build().
+    """
+    os.makedirs(BUNDLE_DIR, exist_ok=True)
+    os.makedirs(TEMPLATE_DIR, exist_ok=True)
+    return {
+        f"{name}.{kind}": build(name, kind, sources)
+        for name, kinds in BUNDLES.items()
+        for kind, sources in kinds.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the content-hashed static bundles of the game templates.")
+    parser.parse_args()
+    if brotli is None:
+        print("brotli is not installed, no .br variants written (pip install brotli)")
+    for bundle, result in build_all().items():
+        sizes = ", ".join(f"{variant} {size}" for variant, size in result["sizes"].items())
+        print(f"{bundle:>12} -> bundle/{result['file']} ({sizes} bytes)")
+
+
+if __name__ == "__main__":
+    main()
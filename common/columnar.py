@@ -0,0 +1,236 @@
+"""
+Columnar binary files from the long-format custom export.
+
+Converts the CSV download of an app's custom export (see common.export) into
+typed column files, so analysis tools can load a study without parsing text
+again. Four tables are written:
+
+* ``decisions``: one row per player and round, one column per exported player field;
+* ``groups``: one row per group and round, one column per exported group field;
+* ``punishment``: the punishment matrices as (sender, receiver, points) entries,
+  zero entries left out;
+* ``dropouts``: the round in which each participant timed out.
+
+Session and participant codes are stored as integer indexes into the
+``sessions`` and ``participants`` lists of ``manifest.json``. Missing values
+of float columns are NaN. Rows that belong to a session rather than a player
+(empty participant code, such as Game's ``matchmaking.*`` summary) are kept
+in the manifest under ``session_records``, as [round_number, record, value]
+entries per session code.
+
+By default every column is a ``.npy`` file: a short header followed by the raw
+little-endian values, which ``numpy.load(path, mmap_mode="r")`` maps without
+copying or parsing. Writing them does not need NumPy. With ``--format arrow``
+each table is written as one uncompressed Arrow IPC file instead, which
+``pyarrow.memory_map`` can map; this needs pyarrow.
+
+Usage:
+    python -m common.columnar export.csv out_dir [--format npy|arrow]
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import struct
+import sys
+from array import array
+
+# Player fields that mark a timeout in the round, per app
+DROPOUT_RECORDS = ("inactive", "inactief")
+KEY_COLUMNS = {
+    "decisions": ["session", "participant", "round_number", "group", "id_in_group"],
+    "groups": ["session", "round_number", "group"],
+    "punishment": ["session", "round_number", "group", "sender", "receiver", "points"],
+    "dropouts": ["session", "participant", "round_number"],
+}
+
+
+class Table:
+    """
+    Column arrays of one output table: integer key columns and float value columns added as they appear.
+    """
+
+    def __init__(self, key_columns):
+        self.columns = {name: array("q") for name in key_columns}
+        self.rows = 0
+
+    def append(self, keys, values=None):
+        for column, value in zip(self.columns.values(), keys):
+            column.append(value)
+        for name, value in (values or {}).items():
+            if name not in self.columns:
+                self.columns[name] = array("d", [math.nan]) * self.rows
+        for name, column in self.columns.items():
+            if column.typecode == "d":
+                column.append((values or {}).get(name, math.nan))
+        self.rows += 1
+
+
+def read_export(path):
+    """
+    Reads a long-format export CSV into the four tables.
+
+    The rows of one player and round follow each other in the export, so only the current
+    player's values are held while reading.
+
+    Returns:
+        tuple: The tables by name, the session and participant codes in index order, and the
+        session-level records by session code.
+    """
+    tables = {name: Table(columns) for name, columns in KEY_COLUMNS.items()}
+    sessions = {}
+    participants = {}
+    session_records = {}
+    current = None
+    player_values = {}
+    group_values = {}
+
+    def flush():
+        if current is None:
+            return
+        session, _, round_number, group, _ = current
+        tables["decisions"].append(current, player_values)
+        if group_values:
+            tables["groups"].append((session, round_number, group), group_values)
+
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            if not row["participant_code"]:
+                session_records.setdefault(row["session_code"], []).append(
+                    [int(row["round_number"]), row["record"], float(row["value"])]
+                )
+                continue
+            session = sessions.setdefault(row["session_code"], len(sessions))
+            participant = participants.setdefault(row["participant_code"], len(participants))
+            key = (session, participant, int(row["round_number"]), int(row["group"]), int(row["id_in_group"]))
+            if key != current:
+                flush()
+                current = key
+                player_values = {}
+                group_values = {}
+
+            record = row["record"]
+            if record == "punishment":
+                tables["punishment"].append(
+                    (session, key[2], key[3], key[4], int(row["receiver"]), int(float(row["value"])))
+                )
+            elif record.startswith("group."):
+                group_values[record[len("group."):]] = float(row["value"])
+            else:
+                value = float(row["value"])
+                player_values[record] = value
+                if record in DROPOUT_RECORDS and value:
+                    tables["dropouts"].append((session, participant, key[2]))
+        flush()
+    return tables, list(sessions), list(participants), session_records
+
+
+def npy_descr(column):
+    if column.typecode == "d":
+        return "<f8"
+    return f"<i{column.itemsize}"
+
+
+def write_npy(path, column):
+    """
+    Writes one column as a version 1.0 .npy file.
+    """
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': (%d,), }" % (npy_descr(column), len(column))
+    # The magic string, version and header length take 10 bytes; the data has to start at a multiple of 64.
+    header += " " * (63 - (10 + len(header)) % 64) + "\n"
+    if sys.byteorder == "big":
+        column = array(column.typecode, column)
+        column.byteswap()
+    with open(path, "wb") as f:
+        f.write(b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1"))
+        column.tofile(f)
+
+
+def write_arrow(path, table):
+    import pyarrow as pa
+
+    arrow_table = pa.table({name: pa.array(column) for name, column in table.columns.items()})
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, arrow_table.schema) as writer:
+        writer.write_table(arrow_table)
+
+
+def convert(csv_path, out_dir, file_format="npy"):
+    """
+    Converts a long-format export CSV into column files and a manifest.
+
+    Args:
+        csv_path (str): The custom export download.
+        out_dir (str): The directory to write to; created if needed.
+        file_format (str): "npy" for one .npy file per column, "arrow" for one Arrow IPC file per table.
+
+    Returns:
+        dict: The manifest that was written.
+    """
+    if file_format not in ("npy", "arrow"):
+        raise ValueError(f"Unknown format {file_format!r}")
+    tables, sessions, participants, session_records = read_export(csv_path)
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = dict(
+        format=file_format, sessions=sessions, participants=participants, session_records=session_records, tables={}
+    )
+    for name, table in tables.items():
+        entry = dict(rows=table.rows, columns={})
+        if file_format == "arrow":
+            entry["file"] = f"{name}.arrow"
+            write_arrow(os.path.join(out_dir, entry["file"]), table)
+        for column_name, column in table.columns.items():
+            entry["columns"][column_name] = dict(dtype=npy_descr(column))
+            if file_format == "npy":
+                entry["columns"][column_name]["file"] = f"{name}.{column_name}.npy"
+                write_npy(os.path.join(out_dir, entry["columns"][column_name]["file"]), column)
+        manifest["tables"][name] = entry
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_table(out_dir, name):
+    """
+    Loads one table of a .npy conversion, memory-mapped with NumPy if it is installed.
+
+    Returns:
+        dict: The columns by name, as NumPy memory maps or (without NumPy) arrays.
+    """
+    with open(os.path.join(out_dir, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+    columns = {}
+    for column_name, entry in manifest["tables"][name]["columns"].items():
+        path = os.path.join(out_dir, entry["file"])
+        if numpy is not None:
+            columns[column_name] = numpy.load(path, mmap_mode="r")
+            continue
+        with open(path, "rb") as f:
+            f.seek(8)
+            (header_length,) = struct.unpack("<H", f.read(2))
+            f.seek(10 + header_length)
+            column = array("d" if entry["dtype"] == "<f8" else "q")
+            column.frombytes(f.read())
+        if sys.byteorder == "big":
+            column.byteswap()
+        columns[column_name] = column
+    return columns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a long-format custom export into columnar files.")
+    parser.add_argument("export", help="CSV download of the app's custom export")
+    parser.add_argument("out_dir")
+    parser.add_argument("--format", default="npy", choices=["npy", "arrow"])
+    args = parser.parse_args()
+    manifest = convert(args.export, args.out_dir, args.format)
+    for name, entry in manifest["tables"].items():
+        print(f"{name:>12} {entry['rows']:>9} rows, {len(entry['columns'])} columns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Long-format data export for the public goods apps.
+
+The export yields one row per player field and round, plus one row per
+punishment edge (sender to receiver) with a non-zero number of points, so a
+session with hardly any punishment does not produce a column per group
+member. Rows are generated one player at a time, and nothing is collected in
+memory first.
+
+Columns:
+
+* ``session_code``, ``participant_code``, ``round_number``, ``group``
+  (id_in_subsession) and ``id_in_group`` identify the player;
+* ``record`` is the name of the exported field, ``group.<field>`` for a group
+  field (on the rows of the group's first member only), or ``punishment`` for
+  an edge;
+* ``receiver`` is the receiver's id_in_group for edges and empty otherwise;
+* ``value`` is the field value as a plain number (currency amounts as
+  floats, booleans as 0/1) or the number of punishment points.
+
+Values that belong to a session and round rather than to a player (such as
+Game's matchmaking summary) follow the player rows, with empty
+``participant_code``, ``group``, ``id_in_group`` and ``receiver`` columns;
+see session_rows.
+"""
+from decimal import Decimal
+
+EXPORT_HEADER = ["session_code", "participant_code", "round_number", "group", "id_in_group", "record", "receiver", "value"]
+
+
+def plain(value):
+    """
+    Returns a field value as a plain number, so the export does not contain currency units.
+    """
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (float, Decimal)):
+        # Currency values print with their unit
+        return float(value)
+    return value
+
+
+def export_rows(players, fields, sent_points, group_fields=()):
+    """
+    Yields the export header and rows for a sequence of players.
+
+    Args:
+        players (iterable): The players to export, as passed to custom_export.
+        fields (list): Names of the player fields to export; empty (None) fields are skipped.
+        sent_points (callable): ``sent_points(player)`` returns (receiver id_in_group, points) pairs.
+        group_fields (list): Names of the group fields to export once per group and round.
+    """
+    yield EXPORT_HEADER
+    for p in players:
+        key = [p.session.code, p.participant.code, p.round_number, p.group.id_in_subsession, p.id_in_group]
+        for field in fields:
+            value = p.field_maybe_none(field)
+            if value is not None:
+                yield key + [field, "", plain(value)]
+        if group_fields and p.id_in_group == 1:
+            for field in group_fields:
+                value = p.group.field_maybe_none(field)
+                if value is not None:
+                    yield key + [f"group.{field}", "", plain(value)]
+        for receiver, points in sent_points(p):
+            if points:
+                yield key + ["punishment", receiver, int(points)]
+
+
+def session_rows(session_code, round_number, prefix, values):
+    """
+    Yields the export rows of values that belong to a session and round, with the record ``<prefix>.<name>``.
+
+    Args:
+        session_code (str): The session.
+        round_number (int): The round.
+        prefix (str): Prefix of the record names.
+        values (dict): The values by name.
+    """
+    for name, value in values.items():
+        yield [session_code, "", round_number, "", "", f"{prefix}.{name}", "", plain(value)]
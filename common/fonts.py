@@ -0,0 +1,203 @@
+"""
+Self-hosted, subsetted web fonts for the game templates.
+
+The pages use Montserrat for text and Font Awesome 5 for icons. Instead of
+importing them from Google Fonts and cdnjs on every page, this script subsets
+the fonts to what the pages need and writes them as WOFF2 next to the bundles
+in ``_static/bundle``, with content-hashed names:
+
+* Montserrat regular (400) and bold (700), limited to Latin-1 and common
+  punctuation (pages asking for 500 or 600 get the nearest of the two, as
+  they did with the Google Fonts import);
+* the solid and regular Font Awesome fonts, limited to the icons that the
+  templates and scripts mention (``fa-<name>`` classes).
+
+It also writes ``_static/src/fonts.css`` (the font faces and the icon classes,
+part of the ``game`` bundle) and the include template
+``global/bundle/fonts_preload.html`` that ``global/Page.html`` uses to preload
+the fonts needed for the first paint, and then rebuilds the bundles.
+
+Run it again after using a new icon. It needs fontTools and brotli, and the
+source fonts: the static Montserrat TTFs from Google Fonts and a Font Awesome
+Free 5 package (``css/all.css`` and ``webfonts/``):
+
+    python -m common.fonts --montserrat path/to/Montserrat --fontawesome path/to/fontawesome-free-5.15.4-web
+"""
+import argparse
+import glob
+import io
+import os
+import re
+import shutil
+
+from common.bundle import (
+    BUNDLE_DIR,
+    ROOT,
+    STATIC_DIR,
+    build_all,
+    hashed_name,
+    remove_older_versions,
+    write_include,
+)
+
+# Files scanned for icon classes
+ICON_SOURCES = ["*/templates/*/*.html", "*/*.html", "_templates/global/*.html", "_static/src/*.js", "*/__init__.py"]
+# Font Awesome 4 names used by the table sort buttons, which Font Awesome 5 only knows by their new name
+ICON_ALIASES = {"sort-asc": "sort-up", "sort-desc": "sort-down"}
+# Basic Latin, Latin-1, Œœ, dashes, quotes, bullet, ellipsis and the euro sign
+TEXT_UNICODES = "U+0020-007E, U+00A0-00FF, U+0152-0153, U+2013-2014, U+2018-201E, U+2022, U+2026, U+20AC"
+# name: (source file, CSS font family, weight, preloaded)
+FONTS = {
+    "montserrat-400": ("Montserrat-Regular.ttf", "Montserrat", 400, True),
+    "montserrat-700": ("Montserrat-Bold.ttf", "Montserrat", 700, True),
+    "fa-solid-900": ("webfonts/fa-solid-900.woff2", "Font Awesome 5 Free", 900, True),
+    "fa-regular-400": ("webfonts/fa-regular-400.woff2", "Font Awesome 5 Free", 400, False),
+}
+LICENSES = {
+    "montserrat": ("OFL.txt", "LICENSE-Montserrat.txt"),
+    "fontawesome": ("LICENSE.txt", "LICENSE-FontAwesome.txt"),
+}
+ICON_BASE_CSS = """\
+.fa,
+.fas,
+.far {
+    -moz-osx-font-smoothing: grayscale;
+    -webkit-font-smoothing: antialiased;
+    display: inline-block;
+    font-style: normal;
+    font-variant: normal;
+    text-rendering: auto;
+    line-height: 1;
+}
+
+.far {
+    font-family: 'Font Awesome 5 Free';
+    font-weight: 400;
+}
+
+.fa,
+.fas {
+    font-family: 'Font Awesome 5 Free';
+    font-weight: 900;
+}
+"""
+
+
+def used_icons():
+    """
+    Finds the Font Awesome icons the pages use.
+
+    Returns:
+        tuple: All icon names, and the names used with the regular style (``far``).
+    """
+    icons = set()
+    regular = set()
+    for pattern in ICON_SOURCES:
+        for path in glob.glob(os.path.join(ROOT, pattern)):
+            with open(path, encoding="utf-8") as f:
+                text = f.read()
+            icons.update(re.findall(r"\bfa-([a-z0-9-]+)", text))
+            regular.update(re.findall(r"\bfar fa-([a-z0-9-]+)", text))
+    return icons, regular
+
+
+def icon_codepoints(all_css):
+    """
+    Reads the icon names and their code points from Font Awesome's all.css.
+    """
+    return {name: int(code, 16) for name, code in re.findall(r'\.fa-([a-z0-9-]+):before \{\s*content: "\\(f[0-9a-f]+)"', all_css)}
+
+
+def subset(path, unicodes):
+    """
+    Returns the font at path as WOFF2 with only the given code points.
+    """
+    from fontTools import subset as ft_subset
+
+    options = ft_subset.Options()
+    options.flavor = "woff2"
+    options.layout_features = ["kern", "liga", "calt", "ccmp", "locl", "mark", "mkmk"]
+    font = ft_subset.load_font(path, options)
+    subsetter = ft_subset.Subsetter(options)
+    subsetter.populate(unicodes=unicodes)
+    subsetter.subset(font)
+    out = io.BytesIO()
+    ft_subset.save_font(font, out, options)
+    return out.getvalue()
+
+
+def build_fonts(montserrat_dir, fontawesome_dir):
+    """
+    Writes the subsetted fonts, fonts.css and the preload template.
+
+    Returns:
+        dict: Per font, its file name and size in bytes.
+    """
+    from fontTools.subset import parse_unicodes
+
+    with open(os.path.join(fontawesome_dir, "css", "all.css"), encoding="utf-8") as f:
+        codepoints = icon_codepoints(f.read())
+    icons, regular = used_icons()
+    icons = sorted(name for name in icons if ICON_ALIASES.get(name, name) in codepoints)
+    unicodes = {
+        "montserrat-400": parse_unicodes(TEXT_UNICODES),
+        "montserrat-700": parse_unicodes(TEXT_UNICODES),
+        "fa-solid-900": sorted({codepoints[ICON_ALIASES.get(name, name)] for name in icons}),
+        "fa-regular-400": [codepoints[name] for name in sorted(regular & codepoints.keys())],
+    }
+
+    os.makedirs(BUNDLE_DIR, exist_ok=True)
+    results = {}
+    faces = []
+    preloads = []
+    for name, (source, family, weight, preloaded) in FONTS.items():
+        source_dir = montserrat_dir if family == "Montserrat" else fontawesome_dir
+        data = subset(os.path.join(source_dir, source), unicodes[name])
+        file_name = hashed_name(name, data, "woff2")
+        remove_older_versions(name, "woff2", file_name)
+        with open(os.path.join(BUNDLE_DIR, file_name), "wb") as f:
+            f.write(data)
+        results[name] = dict(file=file_name, size=len(data))
+
+        face = [
+            f"    font-family: '{family}';",
+            "    font-style: normal;",
+            f"    font-weight: {weight};",
+            # Text shows in a fallback font until Montserrat has loaded; icons stay invisible instead
+            f"    font-display: {'swap' if family == 'Montserrat' else 'block'};",
+            f'    src: url("{file_name}") format("woff2");',
+        ]
+        if family == "Montserrat":
+            face.append(f"    unicode-range: {TEXT_UNICODES};")
+        faces.append("@font-face {\n" + "\n".join(face) + "\n}\n")
+        if preloaded:
+            preloads.append(
+                f'<link rel="preload" href="{{{{ static \'bundle/{file_name}\' }}}}" as="font" type="font/woff2" crossorigin>'
+            )
+
+    for source_dir, (source, target) in zip((montserrat_dir, fontawesome_dir), LICENSES.values()):
+        shutil.copyfile(os.path.join(source_dir, source), os.path.join(BUNDLE_DIR, target))
+
+    icon_rules = [
+        f'.fa-{name}:before {{\n    content: "\\{codepoints[ICON_ALIASES.get(name, name)]:x}";\n}}\n' for name in icons
+    ]
+    with open(os.path.join(STATIC_DIR, "src", "fonts.css"), "w", encoding="utf-8") as f:
+        f.write("/* Generated by python -m common.fonts, do not edit. Fonts are in _static/bundle (SIL OFL 1.1). */\n\n")
+        f.write("\n".join(faces) + "\n" + ICON_BASE_CSS + "\n" + "\n".join(icon_rules))
+    write_include("fonts_preload.html", preloads)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Subset the web fonts of the game templates and rebuild the bundles.")
+    parser.add_argument("--montserrat", required=True, help="Directory with the static Montserrat TTFs and OFL.txt")
+    parser.add_argument("--fontawesome", required=True, help="Font Awesome Free 5 package directory (css/, webfonts/)")
+    args = parser.parse_args()
+    for name, result in build_fonts(args.montserrat, args.fontawesome).items():
+        print(f"{name:>16} -> bundle/{result['file']} ({result['size']} bytes)")
+    for bundle, result in build_all().items():
+        print(f"{bundle:>16} -> bundle/{result['file']} ({result['sizes']['raw']} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Per-group round history snapshot kept in the session vars.
+
+Past rounds do not change once a group has been settled, so every group's
+history is appended to once per round by the settling wait page. The history
+pages then render from this snapshot instead of loading every member's Player
+row of every round.
+
+Every group's history is a list of its own under a session vars key (see
+history_key), so settling a group only appends to that group's list. Each entry
+is ``[round_number, rows]`` where ``rows`` holds one list of plain values per
+group member, ordered by ``id_in_group``.
+"""
+
+# Prefix of the session vars keys of the group histories
+HISTORY_VAR = "group_history"
+
+
+def history_key(app_name, group):
+    """
+    Returns the session vars key under which the history of a group is stored.
+
+    Args:
+        app_name (str): The app's name_in_url.
+        group (Group): The group.
+    """
+    return f"{HISTORY_VAR}/{app_name}/{group.id_in_subsession}"
+
+
+def append_round(session, key, round_number, rows):
+    """
+    Appends the settled values of one round to a group's history.
+
+    Settling the most recent round again replaces its entry. The group's list is
+    appended to in place; oTree saves the session vars whenever they are accessed.
+
+    Args:
+        session (Session): The session holding the snapshot.
+        key (str): The group's history key, see history_key.
+        round_number (int): The settled round.
+        rows (list): One list of values per group member.
+    """
+    entries = session.vars.setdefault(key, [])
+    if entries and entries[-1][0] == round_number:
+        entries[-1] = [round_number, rows]
+    else:
+        entries.append([round_number, rows])
+
+
+def read_history(session, key, first_round=1, last_round=None):
+    """
+    Returns a group's history from ``first_round`` onwards, in ascending round order.
+
+    Args:
+        session (Session): The session holding the snapshot.
+        key (str): The group's history key, see history_key.
+        first_round (int): The first round to return.
+        last_round (int): The last round to return; None for the most recent one.
+
+    Returns:
+        list: ``[round_number, rows]`` entries.
+    """
+    entries = session.vars.get(key, [])
+    return [entry for entry in entries if entry[0] >= first_round and (last_round is None or entry[0] <= last_round)]
@@ -0,0 +1,75 @@
+"""
+Running earnings ledger kept on the participant.
+
+Each app keeps its own ledger under ``participant.earnings_ledger[key]`` with the
+totals of gross earnings, net earnings and punishment costs, the gross earnings
+of the latest round, and the current accumulated earnings. The wait pages update
+it once per round, so reading a participant's earnings never needs to look at
+earlier rounds.
+
+All amounts are exact integer milli-points (see common.points).
+"""
+
+LEDGER_FIELD = "earnings_ledger"
+
+
+def new_ledger():
+    """
+    Returns an empty ledger.
+    """
+    return dict(gross=0, net=0, punishment_cost=0, round_gross=0, accumulated=0)
+
+
+def open_ledger(participant, key):
+    """
+    Starts an empty ledger for one app, keeping the ledgers of other apps in the session.
+
+    Args:
+        participant (Participant): The participant to open the ledger for.
+        key (str): The ledger key, normally the app's name_in_url.
+    """
+    ledgers = dict(participant.vars.get(LEDGER_FIELD) or {})
+    ledgers[key] = new_ledger()
+    participant.earnings_ledger = ledgers
+
+
+def read_ledger(participant, key):
+    """
+    Returns the ledger of one app.
+
+    Args:
+        participant (Participant): The participant whose ledger to read.
+        key (str): The ledger key, normally the app's name_in_url.
+
+    Returns:
+        dict: The ledger totals.
+    """
+    return participant.earnings_ledger[key]
+
+
+def record_earnings(participant, key, gross=None, net=0, punishment_cost=0, accumulated=None):
+    """
+    Adds the earnings of a settlement step to the ledger.
+
+    The ledger is replaced rather than mutated in place, so the change to the
+    participant field is always saved.
+
+    Args:
+        participant (Participant): The participant whose ledger to update.
+        key (str): The ledger key, normally the app's name_in_url.
+        gross (int): Gross earnings of a new round, or None if this step does not settle gross earnings.
+        net (int): Net earnings to add.
+        punishment_cost (int): Punishment costs to add.
+        accumulated (int): The new accumulated earnings, or None to leave them unchanged.
+    """
+    ledgers = dict(participant.earnings_ledger)
+    ledger = dict(ledgers[key])
+    if gross is not None:
+        ledger["gross"] += gross
+        ledger["round_gross"] = gross
+    ledger["net"] += net
+    ledger["punishment_cost"] += punishment_cost
+    if accumulated is not None:
+        ledger["accumulated"] = accumulated
+    ledgers[key] = ledger
+    participant.earnings_ledger = ledgers
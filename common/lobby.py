@@ -0,0 +1,288 @@
+"""
+Incremental lobby index for group_by_arrival_time.
+
+oTree passes the full list of waiting players on every wait page request. The
+index remembers which players it has already seen and keeps a FIFO queue per
+lobby, plus a queue of lobbies that have enough players for a group. A player's
+lobby is only looked up once, when they first arrive. Checking the list for new
+arrivals is one lookup per waiting player; apart from that, a request only
+touches the players queued in complete lobbies, so forming a group does not
+depend on how many players are waiting.
+
+oTree leaves players out of the waiting list while their page is hidden or
+disconnected, so a player missing from one list keeps their place in the queue
+and is only skipped when a group is formed. Players who are missing from the
+list at two sweeps (see ``LobbyIndex.sweep``) have left the waiting room and are
+removed.
+
+Every index records what happens in its waiting room in a MatchmakingTelemetry
+ring buffer: arrivals with the length of their lobby's queue, groups formed
+with each member's time to group, players who left before being grouped, and
+lobbies that were abandoned before they had enough players.
+
+The index lives in memory. After a server restart it is rebuilt from the next
+list of waiting players, with arrival times counted from that moment.
+"""
+import time
+from collections import OrderedDict, deque
+
+# Number of matchmaking events kept per subsession
+EVENT_CAPACITY = 2000
+# Players missing from the waiting list in two checks this far apart have left the waiting room
+SWEEP_SECONDS = 60
+
+
+def percentile(values, fraction):
+    """
+    Returns the nearest-rank percentile of a list of numbers (0 for an empty list).
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered) + 0.5) - 1))]
+
+
+class MatchmakingTelemetry:
+    """
+    Matchmaking events of one waiting room, in a ring buffer, with running totals.
+
+    Recording an event is one tuple appended to a bounded deque, so it can stay on in production. The totals
+    cover the whole session; the percentiles of the time to group are taken over the groups still in the buffer.
+
+    Events:
+
+    * ``("arrival", time, lobby_id, queue length including the new player)``
+    * ``("group", time, lobby_id, times to group of the members)``
+    * ``("left", time, lobby_id, time waited)``: a player left before being grouped
+    * ``("abandoned", time, lobby_id, players that had queued)``: everyone in a lobby's incomplete queue left
+
+    Args:
+        capacity (int): Number of events kept.
+    """
+
+    def __init__(self, capacity=EVENT_CAPACITY):
+        self.events = deque(maxlen=capacity)
+        self.arrivals = 0
+        self.max_queue_length = 0
+        self.groups_formed = 0
+        self.players_grouped = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.players_left = 0
+        self.lobbies_abandoned = 0
+
+    def arrival(self, now, lobby_id, queue_length):
+        self.events.append(("arrival", now, lobby_id, queue_length))
+        self.arrivals += 1
+        self.max_queue_length = max(self.max_queue_length, queue_length)
+
+    def group(self, now, lobby_id, waits):
+        self.events.append(("group", now, lobby_id, waits))
+        self.groups_formed += 1
+        self.players_grouped += len(waits)
+        self.total_wait += sum(waits)
+        self.max_wait = max(self.max_wait, *waits)
+
+    def left(self, now, lobby_id, wait):
+        self.events.append(("left", now, lobby_id, wait))
+        self.players_left += 1
+
+    def abandoned(self, now, lobby_id, players):
+        self.events.append(("abandoned", now, lobby_id, players))
+        self.lobbies_abandoned += 1
+
+    def summary(self):
+        """
+        Returns the totals and the time to group statistics (seconds).
+        """
+        waits = [wait for event in self.events if event[0] == "group" for wait in event[3]]
+        return dict(
+            arrivals=self.arrivals,
+            max_queue_length=self.max_queue_length,
+            groups_formed=self.groups_formed,
+            mean_time_to_group=self.total_wait / self.players_grouped if self.players_grouped else 0.0,
+            max_time_to_group=self.max_wait,
+            p50_time_to_group=percentile(waits, 0.5),
+            p95_time_to_group=percentile(waits, 0.95),
+            players_left=self.players_left,
+            lobbies_abandoned=self.lobbies_abandoned,
+        )
+
+
+class LobbyIndex:
+    """
+    Per-lobby arrival queues of one subsession.
+
+    Args:
+        group_size (int): Number of players from the same lobby that form a group.
+        clock (callable): Returns the current time in seconds.
+        telemetry (MatchmakingTelemetry): Where the events are recorded; a new recorder by default.
+    """
+
+    def __init__(self, group_size, clock=time.monotonic, telemetry=None):
+        self.group_size = group_size
+        self.clock = clock
+        self.telemetry = telemetry if telemetry is not None else MatchmakingTelemetry()
+        self.queues = {}
+        self.lobby_of = {}
+        self.arrived_at = {}
+        # Lobbies with at least group_size queued players, in the order they became complete
+        self.ready = OrderedDict()
+        # Number of players that queued in each lobby since its queue was last empty
+        self.queued = {}
+        # Players who were missing from the waiting list at the last sweep
+        self.missing = set()
+        self.last_sweep = clock()
+
+    def knows(self, player_id):
+        return player_id in self.lobby_of
+
+    def add(self, player_id, lobby_id):
+        """
+        Queues a newly arrived player in their lobby.
+        """
+        queue = self.queues.get(lobby_id)
+        if queue is None:
+            queue = self.queues[lobby_id] = deque()
+            self.queued[lobby_id] = 0
+        queue.append(player_id)
+        self.queued[lobby_id] += 1
+        now = self.clock()
+        self.lobby_of[player_id] = lobby_id
+        self.arrived_at[player_id] = now
+        self.telemetry.arrival(now, lobby_id, len(queue))
+        if len(queue) >= self.group_size:
+            self.ready[lobby_id] = None
+
+    def discard(self, player_id):
+        """
+        Removes a player who is no longer waiting.
+        """
+        lobby_id = self.lobby_of.pop(player_id, None)
+        if lobby_id is None:
+            return
+        now = self.clock()
+        self.telemetry.left(now, lobby_id, now - self.arrived_at.pop(player_id))
+        queue = self.queues[lobby_id]
+        queue.remove(player_id)
+        if not queue:
+            del self.queues[lobby_id]
+            # Nobody who queued in the lobby since it was last grouped is left
+            self.telemetry.abandoned(now, lobby_id, self.queued.pop(lobby_id))
+        if len(queue) < self.group_size:
+            self.ready.pop(lobby_id, None)
+
+    def sweep_due(self):
+        return self.clock() - self.last_sweep >= SWEEP_SECONDS
+
+    def sweep(self, waiting_ids):
+        """
+        Removes the queued players who were missing from the waiting list at this sweep and the previous one.
+
+        oTree leaves players out of the waiting list while their page is hidden or disconnected, so one
+        absence does not mean a player left; two sweeps at least SWEEP_SECONDS apart do.
+
+        Args:
+            waiting_ids (set): The ids of the players in the current waiting list.
+        """
+        missing = {player_id for player_id in self.lobby_of if player_id not in waiting_ids}
+        for player_id in missing & self.missing:
+            self.discard(player_id)
+        self.missing = missing - self.missing
+        self.last_sweep = self.clock()
+
+    def has_ready(self):
+        return bool(self.ready)
+
+    def ready_players(self):
+        """
+        Returns the ids of the players queued in complete lobbies.
+        """
+        return {player_id for lobby_id in self.ready for player_id in self.queues[lobby_id]}
+
+    def pop_group(self, is_waiting):
+        """
+        Takes the first complete group out of the index.
+
+        Queued players for whom ``is_waiting(player_id)`` is false are not in the
+        current waiting list; they keep their place in the queue but are not grouped.
+
+        Returns:
+            list: The player ids of the group, in arrival order, or None if no lobby has enough waiting players.
+        """
+        for lobby_id in self.ready:
+            queue = self.queues[lobby_id]
+            group = []
+            for player_id in queue:
+                if is_waiting(player_id):
+                    group.append(player_id)
+                    if len(group) == self.group_size:
+                        break
+            if len(group) == self.group_size:
+                break
+        else:
+            return None
+
+        for player_id in group:
+            queue.remove(player_id)
+        if len(queue) < self.group_size:
+            del self.ready[lobby_id]
+        self.queued[lobby_id] = len(queue)
+        if not queue:
+            del self.queues[lobby_id]
+            del self.queued[lobby_id]
+        now = self.clock()
+        for player_id in group:
+            del self.lobby_of[player_id]
+            self.missing.discard(player_id)
+        self.telemetry.group(now, lobby_id, tuple(now - self.arrived_at.pop(player_id) for player_id in group))
+        return group
+
+    def stats(self):
+        """
+        Returns queue depth and wait time statistics.
+
+        Returns:
+            dict: Players and lobbies waiting, the deepest lobby queue and the longest current wait,
+            followed by the telemetry summary (see MatchmakingTelemetry.summary).
+        """
+        now = self.clock()
+        return dict(
+            waiting_players=len(self.lobby_of),
+            waiting_lobbies=len(self.queues),
+            max_queue_depth=max((len(queue) for queue in self.queues.values()), default=0),
+            longest_wait=max((now - arrived for arrived in self.arrived_at.values()), default=0.0),
+            **self.telemetry.summary(),
+        )
+
+
+def form_group(index, waiting_players, player_id, lobby_id):
+    """
+    Indexes new arrivals and returns the players of the next complete lobby group.
+
+    Args:
+        index (LobbyIndex): The subsession's lobby index.
+        waiting_players (list): The players oTree passes to group_by_arrival_time_method.
+        player_id (callable): Returns a player's id within the subsession.
+        lobby_id (callable): Returns a player's lobby; only called for players the index has not seen.
+
+    Returns:
+        list: The players to group, or None to keep waiting.
+    """
+    for player in waiting_players:
+        if not index.knows(player_id(player)):
+            index.add(player_id(player), lobby_id(player))
+    if index.sweep_due():
+        index.sweep({player_id(player) for player in waiting_players})
+    if not index.has_ready():
+        return None
+    # Only the players who can be grouped are looked up
+    candidates = index.ready_players()
+    waiting = {}
+    for player in waiting_players:
+        if player_id(player) in candidates:
+            waiting[player_id(player)] = player
+    group = index.pop_group(waiting.__contains__)
+    if group is None:
+        return None
+    return [waiting[member] for member in group]
@@ -0,0 +1,125 @@
+"""
+Group membership cached per group and round.
+
+``group.get_players()`` and ``player.get_others_in_group()`` query the database
+on every call, and several callbacks of a page only need to know who is in the
+group: its size, the other members' ids, or which members are still active. A
+group's roster holds exactly that. It is loaded once, the first time the group
+is looked up in a round, and then served from memory; oTree runs the apps in a
+single process, like the lobby indexes of common.lobby.
+
+Rosters are scoped to a session, round and group ``id_in_subsession``. Code
+that regroups players (``set_group_matrix`` or group_by_arrival_time) has to
+call ``RosterCache.forget`` for the session, since the group ids are reused for
+different members. Changes to a member's activity are recorded on the roster by
+the page that makes them (``GroupRoster.mark_inactive``); ``RosterCache.reload``
+rebuilds a roster from the members' rows.
+
+A session's last page has no next button, so nothing tells the cache that a
+session has ended. The cache keeps the rosters of at most ``MAX_ROUNDS``
+session rounds and drops the ones it cached first; a dropped roster that is
+looked up again is loaded again.
+
+(The lobby rosters of common.roster are unrelated: they assign participants to
+lobbies when a session is created.)
+"""
+from collections import OrderedDict
+
+# Number of (session, round) entries kept in a RosterCache
+MAX_ROUNDS = 500
+
+
+class GroupRoster:
+    """
+    Membership of one group in one round.
+
+    Args:
+        player_ids (list): The ids of the members' Player rows, ordered by id_in_group.
+        inactive (iterable): The id_in_group of the members who are inactive.
+    """
+
+    __slots__ = ("player_ids", "inactive")
+
+    def __init__(self, player_ids, inactive=()):
+        self.player_ids = tuple(player_ids)
+        self.inactive = set(inactive)
+
+    @property
+    def size(self):
+        return len(self.player_ids)
+
+    @property
+    def inactive_count(self):
+        return len(self.inactive)
+
+    def others(self, id_in_group):
+        """
+        Returns the id_in_group of the other members, in order.
+        """
+        return [other for other in range(1, self.size + 1) if other != id_in_group]
+
+    def is_active(self, id_in_group):
+        return id_in_group not in self.inactive
+
+    def mark_inactive(self, id_in_group):
+        """
+        Records that a member became inactive.
+
+        Returns:
+            bool: Whether the member was active until now.
+        """
+        if id_in_group in self.inactive:
+            return False
+        self.inactive.add(id_in_group)
+        return True
+
+
+class RosterCache:
+    """
+    The rosters of one app's groups.
+
+    Args:
+        load (callable): Called with a group, returns its GroupRoster. It loads the members from the
+            database, so it is only called when the group's roster is not cached yet.
+        max_rounds (int): Number of session rounds kept; the ones cached first are dropped.
+    """
+
+    def __init__(self, load, max_rounds=MAX_ROUNDS):
+        self.load = load
+        self.max_rounds = max_rounds
+        # (session code, round number): {group id_in_subsession: GroupRoster}, in the order they were cached
+        self.rounds = OrderedDict()
+
+    def get(self, group):
+        """
+        Returns the roster of a group, loading it on the first lookup in its round.
+        """
+        key = (group.session.code, group.round_number)
+        rosters = self.rounds.get(key)
+        if rosters is None:
+            rosters = self.rounds[key] = {}
+            # Members of a group can be a round apart, older rounds are no longer looked up.
+            self.rounds.pop((key[0], key[1] - 2), None)
+            # Rounds of sessions that have ended are never looked up again
+            while len(self.rounds) > self.max_rounds:
+                self.rounds.popitem(last=False)
+        roster = rosters.get(group.id_in_subsession)
+        if roster is None:
+            roster = rosters[group.id_in_subsession] = self.load(group)
+        return roster
+
+    def reload(self, group):
+        """
+        Rebuilds the roster of a group from its members' rows and returns it.
+        """
+        rosters = self.rounds.get((group.session.code, group.round_number))
+        if rosters is not None:
+            rosters.pop(group.id_in_subsession, None)
+        return self.get(group)
+
+    def forget(self, session):
+        """
+        Drops the rosters of every round of a session, after its players were regrouped.
+        """
+        for key in [key for key in self.rounds if key[0] == session.code]:
+            del self.rounds[key]
@@ -0,0 +1,49 @@
+"""
+Exact fixed-point arithmetic on integer milli-points.
+
+Settlement works on whole numbers of milli-points (1 point = 1000 milli-points)
+and multiplies by exact fractions, so no rounding error builds up over rounds.
+Amounts are only converted back to points when they are written to a
+CurrencyField or shown on a page.
+"""
+from fractions import Fraction
+
+SCALE = 1000
+
+
+def to_milli(value):
+    """
+    Converts an amount of points (int, float, Decimal or Currency) to milli-points.
+    """
+    return round(float(value) * SCALE)
+
+
+def from_milli(milli):
+    """
+    Converts milli-points back to points, for display and storage.
+    """
+    return milli / SCALE
+
+
+def ratio(value):
+    """
+    Returns a constant such as an efficiency factor (0.375) as an exact fraction (3/8).
+    """
+    return Fraction(str(value))
+
+
+def div_round(numerator, denominator):
+    """
+    Divides two integers, rounding halves away from zero.
+    """
+    quotient, remainder = divmod(abs(numerator), denominator)
+    if 2 * remainder >= denominator:
+        quotient += 1
+    return quotient if numerator >= 0 else -quotient
+
+
+def scale(milli, fraction):
+    """
+    Multiplies an amount of milli-points by an exact fraction, rounding to whole milli-points.
+    """
+    return div_round(milli * fraction.numerator, fraction.denominator)
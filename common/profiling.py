@@ -0,0 +1,211 @@
+"""
+Opt-in timing of page callbacks.
+
+Profiling is turned on with the PAGE_PROFILE environment variable, for example:
+
+    PAGE_PROFILE=1 otree test public_goods_game_new_1
+    PAGE_PROFILE=profile.json otree devserver
+
+Every app passes its page_sequence to ``instrument``. When profiling is on, the
+callbacks that a page class defines itself (see CALLBACKS) are replaced by
+wrappers that record, per app, page class, callback and round, the number of
+calls, the wall time and the number of database queries: the SQL statements
+executed while the callback runs, including the lazy loads and autoflushes it
+triggers.
+
+The callbacks that took the most time in total are reported when the process
+exits, every PAGE_PROFILE_INTERVAL seconds (300 by default; checked when a
+callback finishes) and when the process receives SIGUSR1, since server
+processes are rarely shut down cleanly. The report is printed to stderr. If
+PAGE_PROFILE is a file name ending in .json, all statistics are also written
+to that file, replacing the previous report, and
+
+    python -m common.profiling profile.json --top 30
+
+prints the report again.
+
+When profiling is off, ``instrument`` returns without touching the pages, so
+the callbacks run unwrapped. Like the rest of the package, this module does not
+import oTree; it only imports SQLAlchemy (which oTree uses) when profiling is on.
+"""
+import argparse
+import atexit
+import json
+import os
+import signal
+import sys
+import time
+from functools import wraps
+
+# The page and wait page callbacks that are timed
+CALLBACKS = (
+    "vars_for_template",
+    "js_vars",
+    "is_displayed",
+    "get_form_fields",
+    "get_timeout_seconds",
+    "error_message",
+    "before_next_page",
+    "app_after_this_page",
+    "live_method",
+    "after_all_players_arrive",
+)
+
+SETTING = os.environ.get("PAGE_PROFILE", "")
+ENABLED = SETTING not in ("", "0")
+INTERVAL = float(os.environ.get("PAGE_PROFILE_INTERVAL", 300))
+TOP = 20
+
+# Number of SQL statements executed so far, counted while profiling is on
+queries = 0
+# (app, page class, callback, round number): [calls, seconds, slowest call in seconds, queries]
+stats = {}
+started = False
+# perf_counter() time after which the next periodic report is due
+next_report = 0.0
+
+
+def count_query(*args):
+    global queries
+    queries += 1
+
+
+def start():
+    """
+    Starts counting queries and schedules the reports.
+    """
+    global started, next_report
+    if started:
+        return
+    started = True
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    event.listen(Engine, "before_cursor_execute", count_query)
+    atexit.register(report)
+    next_report = time.perf_counter() + INTERVAL
+    if hasattr(signal, "SIGUSR1"):
+        try:
+            signal.signal(signal.SIGUSR1, lambda signum, frame: report())
+        except ValueError:
+            # Signal handlers can only be installed from the main thread
+            pass
+
+
+def timed(function, app_name, page_name, callback):
+    """
+    Wraps a callback so that every call is recorded in ``stats``.
+
+    The first argument of a callback is the player, group or subsession, whose round_number is recorded;
+    oTree passes it by name to after_all_players_arrive.
+    """
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        queries_before = queries
+        started_at = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - started_at
+            target = args[0] if args else next(iter(kwargs.values()), None)
+            key = (app_name, page_name, callback, getattr(target, "round_number", None))
+            entry = stats.get(key)
+            if entry is None:
+                entry = stats[key] = [0, 0.0, 0.0, 0]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            entry[3] += queries - queries_before
+            if started_at + seconds >= next_report:
+                report()
+
+    return wrapper
+
+
+def instrument(app_name, page_sequence):
+    """
+    Times the callbacks of an app's pages, if profiling is on.
+
+    Args:
+        app_name (str): The app, as it is shown in the report.
+        page_sequence (list): The app's Page and WaitPage classes.
+    """
+    if not ENABLED:
+        return
+    start()
+    for page in page_sequence:
+        for callback in CALLBACKS:
+            # Only what the class defines itself; oTree's defaults and names of group methods are left alone
+            attribute = page.__dict__.get(callback)
+            if isinstance(attribute, staticmethod):
+                setattr(page, callback, staticmethod(timed(attribute.__func__, app_name, page.__name__, callback)))
+            elif callable(attribute):
+                setattr(page, callback, timed(attribute, app_name, page.__name__, callback))
+
+
+def report_rows(stats):
+    """
+    Returns the statistics as rows, the callbacks that took the most time in total first.
+    """
+    rows = [
+        dict(
+            app=app_name,
+            page=page_name,
+            callback=callback,
+            round=round_number,
+            calls=calls,
+            total_ms=seconds * 1000,
+            mean_ms=seconds * 1000 / calls,
+            max_ms=slowest * 1000,
+            queries=query_count,
+            queries_per_call=query_count / calls,
+        )
+        for (app_name, page_name, callback, round_number), (calls, seconds, slowest, query_count) in stats.items()
+    ]
+    rows.sort(key=lambda row: row["total_ms"], reverse=True)
+    return rows
+
+
+def format_report(rows, top=TOP):
+    header = ("page callback", "round", "calls", "total ms", "mean ms", "max ms", "queries/call")
+    lines = ["{:<72} {:>5} {:>7} {:>10} {:>9} {:>9} {:>12}".format(*header)]
+    for row in rows[:top]:
+        name = f"{row['app']}.{row['page']}.{row['callback']}"
+        lines.append(
+            f"{name:<72} {row['round'] if row['round'] is not None else '':>5} {row['calls']:>7} "
+            f"{row['total_ms']:>10.2f} {row['mean_ms']:>9.3f} {row['max_ms']:>9.3f} {row['queries_per_call']:>12.1f}"
+        )
+    if len(rows) > top:
+        lines.append(f"({len(rows) - top} more)")
+    return "\n".join(lines)
+
+
+def report():
+    """
+    Prints the top offenders and writes all statistics to the PAGE_PROFILE file, if it names one.
+    """
+    global next_report
+    next_report = time.perf_counter() + INTERVAL
+    if not stats:
+        return
+    rows = report_rows(stats)
+    if SETTING.endswith(".json"):
+        with open(SETTING, "w") as f:
+            json.dump(rows, f, indent=1)
+    print("Page callbacks by total time:", file=sys.stderr)
+    print(format_report(rows), file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prints the report of a page profile written by PAGE_PROFILE.")
+    parser.add_argument("path", help="The JSON file")
+    parser.add_argument("--top", type=int, default=TOP, help="Number of callbacks to show")
+    args = parser.parse_args()
+    with open(args.path) as f:
+        rows = json.load(f)
+    print(format_report(rows, args.top))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Packed storage of a player's outgoing punishment vector.
+
+The points a player sends to each group member are stored in one string field,
+one character per member ordered by ``id_in_group``. Points 0-9 are stored as
+their digit and 10 as ``"A"``, so ``"03A0"`` means 3 points to player 2 and 10
+points to player 3. A row only carries as many characters as the group has
+members.
+"""
+
+DIGITS = "0123456789A"
+
+
+def pack_points(points):
+    """
+    Packs a punishment vector into its stored form.
+
+    Args:
+        points (iterable): Points sent to each group member, ordered by id_in_group.
+
+    Returns:
+        str: The packed vector.
+    """
+    return "".join(DIGITS[int(value)] for value in points)
+
+
+def unpack_points(packed, group_size):
+    """
+    Unpacks a stored punishment vector.
+
+    Missing or unreadable entries (e.g. an empty value after a timeout) count as
+    zero points and entries beyond the group size are ignored.
+
+    Args:
+        packed (str): The packed vector.
+        group_size (int): The number of group members.
+
+    Returns:
+        list: Points sent to each group member, ordered by id_in_group.
+    """
+    values = [max(DIGITS.find(digit), 0) for digit in (packed or "")[:group_size]]
+    return values + [0] * (group_size - len(values))
+
+
+def points_error(packed, group_size, own_index, choices):
+    """
+    Validates a submitted punishment vector.
+
+    Args:
+        packed (str): The submitted, packed vector.
+        group_size (int): The number of group members.
+        own_index (int): Zero-based position of the sender, who cannot punish themselves.
+        choices (range): The allowed number of points per group member.
+
+    Returns:
+        str: A description of the problem, or None if the vector is valid.
+    """
+    packed = packed or ""
+    if len(packed) != group_size:
+        return f"expected {group_size} values, got {len(packed)}"
+    for index, digit in enumerate(packed):
+        if digit not in DIGITS or DIGITS.index(digit) not in choices:
+            return f"{digit!r} for player #{index + 1} is not a valid choice"
+    if packed[own_index] != DIGITS[0]:
+        return "players cannot punish themselves"
+    return None
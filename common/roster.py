@@ -0,0 +1,83 @@
+"""
+Lobby rosters for scheduled sessions.
+
+A roster maps participant labels to lobby IDs. It is read once when the session
+is created: participants get their label and lobby in bulk, and every lobby is
+split into complete groups up front, so those participants do not have to be
+matched on arrival.
+
+Supported formats:
+
+* CSV with a header row containing ``participant_label`` and ``lobby_id``
+* JSON, either an object ``{"label": "lobby", ...}`` or a list of objects with
+  ``participant_label`` and ``lobby_id`` keys
+"""
+import csv
+import json
+import os
+
+
+def load_roster(path):
+    """
+    Reads a roster file.
+
+    Args:
+        path (str): Path to a .csv or .json roster, relative to the project directory.
+
+    Returns:
+        list: (participant_label, lobby_id) pairs in file order.
+    """
+    if os.path.splitext(path)[1].lower() == ".json":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            rows = list(data.items())
+        else:
+            rows = [(row["participant_label"], row["lobby_id"]) for row in data]
+    else:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            rows = [(row["participant_label"], row["lobby_id"]) for row in csv.DictReader(f)]
+
+    labels = set()
+    for label, _ in rows:
+        if label in labels:
+            raise ValueError(f"Participant label {label!r} appears more than once in roster {path}")
+        labels.add(label)
+    return [(str(label), str(lobby_id)) for label, lobby_id in rows]
+
+
+def build_group_matrix(lobbies, group_size):
+    """
+    Splits players into groups by lobby.
+
+    Each lobby is cut into complete groups of ``group_size`` in roster order. Players without a
+    lobby and the remainder of lobbies that do not fill a last group are put in the trailing groups,
+    to be matched on arrival.
+
+    Args:
+        lobbies (list): The lobby of each player (None if unknown), in player order.
+        group_size (int): The number of players per group.
+
+    Returns:
+        tuple: The group matrix as lists of player positions, and the set of positions that were
+        placed in a complete lobby group.
+    """
+    members = {}
+    for position, lobby_id in enumerate(lobbies):
+        if lobby_id is not None:
+            members.setdefault(lobby_id, []).append(position)
+
+    matrix = []
+    pre_grouped = set()
+    leftover = [position for position, lobby_id in enumerate(lobbies) if lobby_id is None]
+    for positions in members.values():
+        complete = len(positions) - len(positions) % group_size
+        for start in range(0, complete, group_size):
+            matrix.append(positions[start:start + group_size])
+        pre_grouped.update(positions[:complete])
+        leftover.extend(positions[complete:])
+
+    leftover.sort()
+    for start in range(0, len(leftover), group_size):
+        matrix.append(leftover[start:start + group_size])
+    return matrix, pre_grouped
@@ -0,0 +1,169 @@
+"""
+Batched payoff settlement for the public goods games.
+
+The contributions of one or more groups are laid out in flat arrays, with an
+offsets array marking where each group starts. Every payoff component is then
+computed for all players at once, instead of one ORM object at a time.
+
+The punishment stage works the same way on a group's N x N punishment matrix.
+
+All amounts are integer milli-points (see common.points); rates such as the
+efficiency factor are exact fractions.
+"""
+from array import array
+from itertools import repeat
+from operator import add, sub
+
+from common.points import SCALE, div_round, scale
+
+
+class SettlementBatch:
+    """
+    The inputs of a settlement pass for any number of groups.
+
+    Group ``g`` occupies the slice ``offsets[g]:offsets[g + 1]`` of every
+    per-player array.
+    """
+
+    def __init__(self):
+        self.contributions = array("q")
+        self.endowments = array("q")
+        self.previous_accumulated = array("q")
+        self.offsets = array("l", [0])
+
+    def add_group(self, contributions, endowments, previous_accumulated):
+        """
+        Appends the members of one group to the batch.
+
+        Args:
+            contributions (iterable): Public investment of each member, in milli-points.
+            endowments (iterable): Endowment of each member, in milli-points.
+            previous_accumulated (iterable): Accumulated earnings of each member before this round, in milli-points.
+        """
+        self.contributions.extend(contributions)
+        self.endowments.extend(endowments)
+        self.previous_accumulated.extend(previous_accumulated)
+        self.offsets.append(len(self.contributions))
+
+    @property
+    def num_groups(self):
+        return len(self.offsets) - 1
+
+    @property
+    def num_players(self):
+        return len(self.contributions)
+
+    def group_sizes(self):
+        return [hi - lo for lo, hi in zip(self.offsets, self.offsets[1:])]
+
+
+class FirstStageResult:
+    """
+    The outputs of a settlement pass, in the same layout as the batch.
+    """
+
+    def __init__(self, group_totals, payoff_from_private, payoff_from_public, gross_profit, accumulated_earnings):
+        self.group_totals = group_totals
+        self.payoff_from_private = payoff_from_private
+        self.payoff_from_public = payoff_from_public
+        self.gross_profit = gross_profit
+        self.accumulated_earnings = accumulated_earnings
+
+
+def settle_first_stage(batch, efficiency_factor):
+    """
+    Computes the first stage payoffs of every player in the batch.
+
+    Args:
+        batch (SettlementBatch): The groups to settle.
+        efficiency_factor (Fraction): Share of the group investment paid to each member.
+
+    Returns:
+        FirstStageResult: Group totals and per-player private, public, gross and accumulated earnings.
+    """
+    contributions = batch.contributions
+    offsets = batch.offsets
+    group_totals = [sum(contributions[lo:hi]) for lo, hi in zip(offsets, offsets[1:])]
+
+    # Every member of a group receives the same public payoff; broadcast it over the group's slice.
+    payoff_from_public = array("q")
+    for total, size in zip(group_totals, batch.group_sizes()):
+        payoff_from_public.extend(repeat(scale(total, efficiency_factor), size))
+
+    payoff_from_private = list(map(sub, batch.endowments, contributions))
+    gross_profit = list(map(add, payoff_from_private, payoff_from_public))
+    accumulated_earnings = list(map(add, batch.previous_accumulated, gross_profit))
+
+    return FirstStageResult(
+        group_totals=group_totals,
+        payoff_from_private=payoff_from_private,
+        payoff_from_public=payoff_from_public,
+        gross_profit=gross_profit,
+        accumulated_earnings=accumulated_earnings,
+    )
+
+
+
+class PunishmentResult:
+    """
+    The outputs of a punishment settlement pass, one entry per group member.
+    """
+
+    def __init__(self, received_punishment, total_punishment_cost, payoff):
+        self.received_punishment = received_punishment
+        self.total_punishment_cost = total_punishment_cost
+        self.payoff = payoff
+
+
+def punishment_matrix(members, sent_points):
+    """
+    Builds the N x N punishment matrix of a group.
+
+    Args:
+        members (list): The group members, ordered by id_in_group.
+        sent_points (callable): ``sent_points(sender, receiver)`` returns the points the sender assigned.
+
+    Returns:
+        list: ``matrix[i][j]`` holds the points member ``i`` sent to member ``j``; the diagonal is zero.
+    """
+    return [
+        [0 if receiver is sender else int(sent_points(sender, receiver)) for receiver in members]
+        for sender in members
+    ]
+
+
+def settle_punishment(matrix, gross_profit, punishment_costs, full_reduction_points=10, deduct_cost=False):
+    """
+    Computes received punishment, punishment costs and final payoffs from a group's punishment matrix.
+
+    Received punishment is the column sum of the matrix and the cost of each sender is the row sum of
+    the punishment cost schedule, so the result does not depend on the order in which members are visited.
+    Each received point removes ``1 / full_reduction_points`` of the gross profit, up to all of it.
+
+    Args:
+        matrix (list): The punishment matrix, see punishment_matrix.
+        gross_profit (list): Gross profit of each member, in milli-points.
+        punishment_costs (list): Cost in points of sending 0, 1, 2, ... points.
+        full_reduction_points (int): Received points at which the whole gross profit is lost.
+        deduct_cost (bool): Whether to subtract the punishment cost from the payoff itself.
+
+    Returns:
+        PunishmentResult: Received punishment points, and total punishment cost and payoff of each
+        member in milli-points.
+    """
+    received_punishment = [sum(column) for column in zip(*matrix)]
+    total_punishment_cost = [SCALE * sum(punishment_costs[points] for points in row) for row in matrix]
+
+    payoff = [
+        div_round(gross * (full_reduction_points - min(received, full_reduction_points)), full_reduction_points)
+        for gross, received in zip(gross_profit, received_punishment)
+    ]
+    if deduct_cost:
+        payoff = list(map(sub, payoff, total_punishment_cost))
+    payoff = [max(0, value) for value in payoff]
+
+    return PunishmentResult(
+        received_punishment=received_punishment,
+        total_punishment_cost=total_punishment_cost,
+        payoff=payoff,
+    )
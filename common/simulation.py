@@ -0,0 +1,298 @@
+"""
+Monte Carlo simulation of the public_goods_game_new rules.
+
+The simulation settles rounds with the same functions the app's wait pages use
+(common.settlement, in exact milli-points), so simulated earnings match the
+earnings a real session would record for the same choices. Each round, the
+first stage of every group in the cohort that is still playing is settled in
+one batched pass.
+
+Rules reproduced from the app:
+
+* each member keeps ``endowment - contribution`` and receives
+  ``efficiency_factor`` times the group's total contribution;
+* in the punishment condition, every received point removes a tenth of the
+  gross profit (all of it from ``full_reduction_points`` points on), sending
+  points costs ``punishment_costs[points]`` and accumulated earnings cannot
+  drop below zero; a punishment the page would reject because its cost exceeds
+  the accumulated earnings is not sent;
+* a member who times out becomes a dropout for the rest of the game and
+  contributes and punishes nothing; like ``group_failed``, the dropouts of
+  earlier rounds count towards group failure too, and a group fails when fewer
+  than ``round(group_size * min_group_participation)`` members remain;
+* a failed group stops playing; the round it failed in is not settled.
+
+Timeouts are drawn once per member and round, at the contribution page, from a
+constant dropout hazard.
+
+Strategies are objects with ``contribute(view, rng)`` and ``punish(view, rng)``
+methods, see FreeRider, ConditionalCooperator and Punisher.
+"""
+from itertools import repeat
+
+from common.points import SCALE, ratio
+from common.settlement import SettlementBatch, settle_first_stage, settle_punishment
+
+
+class Rules:
+    """
+    The game parameters. The defaults are the values of public_goods_game_new.Constants.
+
+    Args:
+        endowment (int): Points every member can contribute each round.
+        efficiency_factor (float): Share of the group's total contribution paid to each member.
+        punishment_costs (list): Cost in points of sending 0, 1, 2, ... punishment points to one member.
+        full_reduction_points (int): Received points at which the whole gross profit is lost.
+        min_group_participation (float): Share of the group that has to stay active.
+        num_rounds (int): Number of rounds.
+        punishment_condition (bool): Whether the punishment stage is played.
+        dropout_hazard (float): Probability that an active member times out in a round.
+    """
+
+    def __init__(
+        self,
+        endowment=20,
+        efficiency_factor=0.375,
+        punishment_costs=(0, 1, 2, 4, 6, 9, 12, 16, 20, 25, 30),
+        full_reduction_points=10,
+        min_group_participation=0.63,
+        num_rounds=3,
+        punishment_condition=True,
+        dropout_hazard=0.0,
+    ):
+        self.endowment = endowment
+        self.efficiency_factor = efficiency_factor
+        self.punishment_costs = list(punishment_costs)
+        self.full_reduction_points = full_reduction_points
+        self.min_group_participation = min_group_participation
+        self.num_rounds = num_rounds
+        self.punishment_condition = punishment_condition
+        self.dropout_hazard = dropout_hazard
+
+    def min_active(self, group_size):
+        """
+        Returns the number of members a group needs to keep playing (the check in group_failed).
+        """
+        return round(group_size * self.min_group_participation)
+
+
+class PlayerView:
+    """
+    What a member knows when making a choice.
+
+    Attributes:
+        round_number (int): The current round.
+        rules (Rules): The game parameters.
+        index (int): The member's position in the group (id_in_group - 1).
+        group_size (int): The number of members, dropouts included.
+        accumulated (int): The member's accumulated earnings in milli-points.
+        previous_contributions (list): Every member's contribution in the previous round, or None in the first round.
+        contributions (list): Every member's contribution this round; only set in the punishment stage.
+    """
+
+    def __init__(self, round_number, rules, index, group_size, accumulated, previous_contributions, contributions=None):
+        self.round_number = round_number
+        self.rules = rules
+        self.index = index
+        self.group_size = group_size
+        self.accumulated = accumulated
+        self.previous_contributions = previous_contributions
+        self.contributions = contributions
+
+
+class FreeRider:
+    """
+    Never contributes and never punishes.
+    """
+
+    def contribute(self, view, rng):
+        return 0
+
+    def punish(self, view, rng):
+        return [0] * view.group_size
+
+
+class ConditionalCooperator:
+    """
+    Contributes ``first`` points in the first round (half the endowment by default), and afterwards
+    the rounded mean of what the others contributed in the previous round. Never punishes.
+    """
+
+    def __init__(self, first=None):
+        self.first = first
+
+    def contribute(self, view, rng):
+        if view.previous_contributions is None:
+            return view.rules.endowment // 2 if self.first is None else self.first
+        others = [c for index, c in enumerate(view.previous_contributions) if index != view.index]
+        return min(view.rules.endowment, round(sum(others) / len(others))) if others else 0
+
+    def punish(self, view, rng):
+        return [0] * view.group_size
+
+
+class Punisher:
+    """
+    Contributes ``contribution`` points (the whole endowment by default) and sends ``points``
+    punishment points to every member who contributed less this round.
+    """
+
+    def __init__(self, points=1, contribution=None):
+        self.points = points
+        self.contribution = contribution
+
+    def contribute(self, view, rng):
+        return view.rules.endowment if self.contribution is None else self.contribution
+
+    def punish(self, view, rng):
+        own = view.contributions[view.index]
+        return [
+            self.points if index != view.index and contribution < own else 0
+            for index, contribution in enumerate(view.contributions)
+        ]
+
+
+class CohortResult:
+    """
+    The outcome of a simulated cohort.
+
+    Attributes:
+        accumulated_earnings (list): Final accumulated earnings of every player in milli-points, groups one after another.
+        dropouts (list): Whether each player dropped out.
+        failed_round (list): Per group, the round in which it failed, or 0 if it played all rounds.
+        contributions (list): Per round, the total contribution of each group in points (None once a group failed).
+        received_punishment (list): Per round, the punishment points received by each player (0 without punishment).
+    """
+
+    def __init__(self, accumulated_earnings, dropouts, failed_round, contributions, received_punishment):
+        self.accumulated_earnings = accumulated_earnings
+        self.dropouts = dropouts
+        self.failed_round = failed_round
+        self.contributions = contributions
+        self.received_punishment = received_punishment
+
+
+def choose_punishment(strategy, view, rng, rules):
+    """
+    Returns the punishment points a member sends, checked like the punishment page checks them.
+
+    Raises:
+        ValueError: If the strategy returned a vector the page could never accept (wrong length,
+            unknown number of points, or punishing themselves).
+    """
+    points = [int(p) for p in strategy.punish(view, rng)]
+    if (
+        len(points) != view.group_size
+        or not all(0 <= p < len(rules.punishment_costs) for p in points)
+        or points[view.index]
+    ):
+        raise ValueError(f"{type(strategy).__name__} sent invalid punishment points {points}")
+    if sum(rules.punishment_costs[p] for p in points) * SCALE > view.accumulated:
+        return [0] * view.group_size
+    return points
+
+
+def simulate_cohort(rules, groups, rng):
+    """
+    Plays all rounds for a cohort of groups.
+
+    Args:
+        rules (Rules): The game parameters.
+        groups (list): One list of strategies per group, in id_in_group order. The same strategy object
+            may be shared by several members.
+        rng (random.Random): Source of randomness for dropouts and strategies.
+
+    Returns:
+        CohortResult: Earnings, dropouts and per-round outcomes.
+    """
+    efficiency_factor = ratio(rules.efficiency_factor)
+    spans = []
+    strategies = []
+    for members in groups:
+        spans.append((len(strategies), len(strategies) + len(members)))
+        strategies.extend(members)
+
+    accumulated = [0] * len(strategies)
+    dropped = [False] * len(strategies)
+    failed_round = [0] * len(groups)
+    previous = [None] * len(groups)
+    contributions_by_round = []
+    received_by_round = []
+
+    for round_number in range(1, rules.num_rounds + 1):
+        batch = SettlementBatch()
+        playing = []
+        round_contributions = [None] * len(groups)
+        for g, (lo, hi) in enumerate(spans):
+            if failed_round[g]:
+                continue
+            size = hi - lo
+            if rules.dropout_hazard:
+                for i in range(lo, hi):
+                    if not dropped[i] and rng.random() < rules.dropout_hazard:
+                        dropped[i] = True
+            inactive = sum(dropped[lo:hi])
+            if size - inactive < rules.min_active(size):
+                failed_round[g] = round_number
+                continue
+
+            contributions = []
+            for i in range(lo, hi):
+                if dropped[i]:
+                    contributions.append(0)
+                    continue
+                view = PlayerView(round_number, rules, i - lo, size, accumulated[i], previous[g])
+                contribution = strategies[i].contribute(view, rng)
+                if not 0 <= contribution <= rules.endowment:
+                    raise ValueError(f"{type(strategies[i]).__name__} contributed {contribution}")
+                contributions.append(int(contribution))
+            batch.add_group(
+                [c * SCALE for c in contributions],
+                repeat(rules.endowment * SCALE, size),
+                accumulated[lo:hi],
+            )
+            playing.append(g)
+            round_contributions[g] = contributions
+
+        result = settle_first_stage(batch, efficiency_factor)
+        received = [0] * len(strategies)
+        offset = 0
+        for g in playing:
+            lo, hi = spans[g]
+            size = hi - lo
+            gross = result.gross_profit[offset:offset + size]
+            first_stage = result.accumulated_earnings[offset:offset + size]
+            offset += size
+            contributions = round_contributions[g]
+            if not rules.punishment_condition:
+                accumulated[lo:hi] = first_stage
+            else:
+                matrix = [
+                    [0] * size if dropped[i] else choose_punishment(
+                        strategies[i],
+                        PlayerView(round_number, rules, i - lo, size, first_stage[i - lo], previous[g], contributions),
+                        rng,
+                        rules,
+                    )
+                    for i in range(lo, hi)
+                ]
+                punishment = settle_punishment(matrix, gross, rules.punishment_costs, rules.full_reduction_points)
+                for index in range(size):
+                    accumulated[lo + index] = max(
+                        0,
+                        first_stage[index] - gross[index] + punishment.payoff[index]
+                        - punishment.total_punishment_cost[index],
+                    )
+                received[lo:hi] = punishment.received_punishment
+            previous[g] = contributions
+
+        contributions_by_round.append([sum(c) if c is not None else None for c in round_contributions])
+        received_by_round.append(received)
+
+    return CohortResult(
+        accumulated_earnings=accumulated,
+        dropouts=dropped,
+        failed_round=failed_round,
+        contributions=contributions_by_round,
+        received_punishment=received_by_round,
+    )
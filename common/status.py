@@ -0,0 +1,80 @@
+"""
+Participant status shared by the apps.
+
+What happened to a participant is one participant field, ``status``, which
+moves through a small state machine:
+
+* ``active``: playing;
+* ``inactive``: timed out on a page and counts as a dropout;
+* ``returned``: came back after being inactive (public_goods_game's
+  TimeoutPlayerPage) and plays again;
+* ``failed``: the group has too few active members left, so the game ended
+  for them. Members who are inactive at that moment stay inactive.
+
+A page only changes the status of the participant who submitted it. Group
+counters, such as the number of inactive members and whether the group failed,
+are derived from the members' rows instead of being incremented on the group
+row by every timeout; so simultaneous timeouts in a group neither queue up on
+the same row nor overwrite each other's counts.
+"""
+
+ACTIVE = "active"
+INACTIVE = "inactive"
+RETURNED = "returned"
+FAILED = "failed"
+
+# status: the statuses it can change to
+TRANSITIONS = {
+    ACTIVE: (INACTIVE, FAILED),
+    INACTIVE: (RETURNED,),
+    RETURNED: (INACTIVE, FAILED),
+    FAILED: (),
+}
+
+
+def get_status(participant):
+    """
+    Returns the participant's status; participants who did not get one yet are active.
+    """
+    return participant.vars.get("status", ACTIVE)
+
+
+def set_status(participant, status):
+    """
+    Moves the participant to a new status.
+
+    Args:
+        participant (Participant): The participant.
+        status (str): The new status.
+
+    Returns:
+        bool: Whether the status changed; setting the current status again does nothing.
+
+    Raises:
+        ValueError: If the state machine does not allow the change.
+    """
+    current = get_status(participant)
+    if status == current:
+        return False
+    if status not in TRANSITIONS[current]:
+        raise ValueError(f"A participant's status cannot change from {current!r} to {status!r}")
+    participant.status = status
+    return True
+
+
+def reset_status(participant):
+    """
+    Makes the participant active, at the start of an app.
+    """
+    participant.status = ACTIVE
+
+
+def is_playing(participant):
+    """
+    Returns whether the participant still plays: active, or returned after a timeout.
+    """
+    return get_status(participant) in (ACTIVE, RETURNED)
+
+
+def is_inactive(participant):
+    return get_status(participant) == INACTIVE
@@ -0,0 +1,194 @@
+"""
+Parameter sweeps over the simulated public goods rules.
+
+A sweep spec (JSON) lists the values to try for the Rules parameters
+``efficiency_factor``, ``endowment``, ``punishment_costs``,
+``min_group_participation`` and ``num_rounds``, plus ``group_size``:
+
+    {
+        "mode": "grid",
+        "grid": {"efficiency_factor": [0.3, 0.375, 0.5], "group_size": [4, 30]},
+        "fixed": {"num_rounds": 10, "dropout_hazard": 0.02},
+        "groups_per_cell": 1000,
+        "strategies": {"FreeRider": 0.3, "ConditionalCooperator": 0.5, "Punisher": 0.2},
+        "seed": 0
+    }
+
+In ``grid`` mode every combination of the ``grid`` values is a cell. In
+``random`` mode, ``samples`` cells are drawn, each parameter uniformly from a
+``[low, high]`` range in ``ranges`` (integers for integer bounds) or from a
+list of choices in ``grid``.
+
+Cells are simulated in a process pool. Every cell gets its own random seed,
+derived from the sweep seed and the cell's index, so the results do not depend
+on the number of workers or the order in which cells finish. Each finished cell
+is appended to the output file as one JSON line. Running the same spec again
+with the same output file skips the cells that are already there, so an
+interrupted sweep can be resumed.
+
+Usage:
+    python -m common.sweep spec.json results.jsonl [--workers N]
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import random
+from multiprocessing import Pool
+
+from common.points import SCALE
+from common.simulation import ConditionalCooperator, FreeRider, Punisher, Rules, simulate_cohort
+
+SWEPT = ["efficiency_factor", "endowment", "punishment_costs", "min_group_participation", "group_size", "num_rounds"]
+STRATEGIES = {
+    "FreeRider": FreeRider,
+    "ConditionalCooperator": ConditionalCooperator,
+    "Punisher": Punisher,
+}
+DEFAULTS = dict(group_size=4, groups_per_cell=1000, strategies={"ConditionalCooperator": 1.0}, seed=0)
+
+
+def fingerprint(spec):
+    """
+    Returns a short hash of a spec, stored with every result so a resume with a different spec is noticed.
+    """
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def cells(spec):
+    """
+    Lists the parameter sets of a sweep, in a fixed order.
+
+    Returns:
+        list: One dict of parameter values per cell.
+    """
+    fixed = spec.get("fixed", {})
+    grid = spec.get("grid", {})
+    unknown = set(grid) | set(spec.get("ranges", {}))
+    unknown -= set(SWEPT)
+    if unknown:
+        raise ValueError(f"Cannot sweep {', '.join(sorted(unknown))}; choose from {', '.join(SWEPT)}")
+
+    if spec.get("mode", "grid") == "grid":
+        names = sorted(grid)
+        return [dict(fixed, **dict(zip(names, values))) for values in itertools.product(*(grid[name] for name in names))]
+
+    ranges = spec.get("ranges", {})
+    result = []
+    for index in range(spec["samples"]):
+        rng = random.Random(f"{spec.get('seed', 0)}/sample/{index}")
+        params = dict(fixed)
+        for name in sorted(grid):
+            params[name] = rng.choice(grid[name])
+        for name in sorted(ranges):
+            low, high = ranges[name]
+            params[name] = rng.randint(low, high) if isinstance(low, int) and isinstance(high, int) else rng.uniform(low, high)
+        result.append(params)
+    return result
+
+
+def make_groups(num_groups, group_size, strategies, rng):
+    names = sorted(strategies)
+    weights = [strategies[name] for name in names]
+    shared = {name: STRATEGIES[name]() for name in names}
+    return [[shared[name] for name in rng.choices(names, weights, k=group_size)] for _ in range(num_groups)]
+
+
+def run_cell(task):
+    """
+    Simulates one cell. Runs in a worker process.
+
+    Args:
+        task (tuple): The cell index, its parameters and the sweep spec.
+
+    Returns:
+        dict: The cell's parameters and summary statistics.
+    """
+    index, params, spec = task
+    rng = random.Random(f"{spec.get('seed', DEFAULTS['seed'])}/cell/{index}")
+    rule_params = {name: value for name, value in params.items() if name != "group_size"}
+    rules = Rules(**rule_params)
+    group_size = params.get("group_size", DEFAULTS["group_size"])
+    groups = make_groups(
+        spec.get("groups_per_cell", DEFAULTS["groups_per_cell"]),
+        group_size,
+        spec.get("strategies", DEFAULTS["strategies"]),
+        rng,
+    )
+    result = simulate_cohort(rules, groups, rng)
+
+    num_players = len(result.accumulated_earnings)
+    played = [total for round_totals in result.contributions for total in round_totals if total is not None]
+    received = [points for round_points in result.received_punishment for points in round_points]
+    return dict(
+        cell=index,
+        params=params,
+        mean_earnings=sum(result.accumulated_earnings) / num_players / SCALE,
+        mean_contribution_share=sum(played) / (len(played) * group_size * rules.endowment) if played else 0.0,
+        failure_rate=sum(1 for round_number in result.failed_round if round_number) / len(groups),
+        dropout_rate=sum(result.dropouts) / num_players,
+        mean_received_punishment=sum(received) / len(received) if received else 0.0,
+    )
+
+
+def completed_cells(path, spec_fingerprint):
+    """
+    Returns the indexes of the cells already in an output file.
+
+    A line cut off by an interruption is removed from the file.
+
+    Raises:
+        ValueError: If the file holds results of a different spec.
+    """
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    valid = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if record["spec"] != spec_fingerprint:
+                raise ValueError(f"{path} holds the results of another sweep spec")
+            done.add(record["cell"])
+            valid.append(line if line.endswith("\n") else line + "\n")
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(valid)
+    return done
+
+
+def run_sweep(spec, path, workers=None):
+    """
+    Runs the cells of a sweep that are not in the output file yet, appending results as they finish.
+
+    Returns:
+        int: The number of cells simulated in this run.
+    """
+    spec_fingerprint = fingerprint(spec)
+    done = completed_cells(path, spec_fingerprint)
+    tasks = [(index, params, spec) for index, params in enumerate(cells(spec)) if index not in done]
+    with Pool(workers) as pool, open(path, "a", encoding="utf-8") as out:
+        for record in pool.imap_unordered(run_cell, tasks):
+            record["spec"] = spec_fingerprint
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+    return len(tasks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a parameter sweep over the simulated public goods rules.")
+    parser.add_argument("spec", help="Sweep spec (JSON)")
+    parser.add_argument("output", help="Results file (JSON lines), appended to when resuming")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    args = parser.parse_args()
+    with open(args.spec, encoding="utf-8") as f:
+        spec = json.load(f)
+    simulated = run_sweep(spec, args.output, args.workers)
+    print(f"{simulated} cells simulated, results in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,16 @@
+from itertools import repeat
+
 from otree.api import *
 
+from common.export import export_rows
+from common.history import append_round, history_key, read_history
+from common.ledger import open_ledger, read_ledger, record_earnings
+from common.membership import GroupRoster, RosterCache
+from common.points import SCALE, from_milli, ratio, to_milli
+from common.profiling import instrument
+from common.settlement import SettlementBatch, punishment_matrix, settle_first_stage, settle_punishment
+from common.status import FAILED, INACTIVE, RETURNED, is_inactive, is_playing, reset_status, set_status
+
 
 class Constants(BaseConstants):
     name_in_url = "public_goods_punishment"
@@ -23,7 +34,8 @@ def creating_session(subsession):
     if subsession.round_number == 1:
         players = subsession.get_players()
         for player in players:
-            player.participant.is_dropout = False
+            reset_status(player.participant)
+            open_ledger(player.participant, Constants.name_in_url)
 
 
 class Group(BaseGroup):
@@ -34,14 +46,66 @@ class Group(BaseGroup):
     failed = models.BooleanField(initial=False)
 
     def set_first_stage_earnings(self):
+        # All amounts are settled in exact milli-points and only rounded when written to the player fields.
         players = self.get_players()
-        self.total_group_investment = sum([p.public_investment for p in players])
-
-        for p in players:
-            p.payoff_from_private = p.endowment - p.public_investment
+        batch = SettlementBatch()
+        batch.add_group(
+            [to_milli(p.public_investment) for p in players],
+            [to_milli(p.endowment) for p in players],
+            repeat(0, len(players)),
+        )
+        result = settle_first_stage(batch, ratio(Constants.efficiency_factor))
+
+        self.total_group_investment = from_milli(result.group_totals[0])
+        for p, private, public, gross in zip(
+            players, result.payoff_from_private, result.payoff_from_public, result.gross_profit
+        ):
+            p.payoff_from_private = from_milli(private)
+            p.payoff_from_public = from_milli(public)
+            p.gross_profit = from_milli(gross)
+            record_earnings(p.participant, Constants.name_in_url, gross=gross)
+
+        # Snapshot of the settled first stage, rendered by the observation and punishment pages.
+        rows = [
+            [to_milli(p.public_investment), private, gross]
+            for p, private, gross in zip(players, result.payoff_from_private, result.gross_profit)
+        ]
+        append_round(self.session, history_key(Constants.name_in_url, self), self.round_number, rows)
 
-            p.payoff_from_public = Constants.efficiency_factor * self.total_group_investment
-            p.gross_profit = p.payoff_from_private + p.payoff_from_public
+    def set_punishment_and_final_payoffs(self):
+        # Build the punishment matrix once: received punishment is a column sum, the cost of the
+        # punishment given a row sum, so the result does not depend on the order of the players.
+        players = self.get_players()
+        matrix = punishment_matrix(
+            players,
+            lambda sender, receiver: getattr(sender, f"punishment_sent_to_player_{receiver.id_in_group}"),
+        )
+        result = settle_punishment(
+            matrix,
+            [read_ledger(p.participant, Constants.name_in_url)["round_gross"] for p in players],
+            Constants.punishment_costs,
+            deduct_cost=True,
+        )
+        for p, received, cost, payoff in zip(
+            players, result.received_punishment, result.total_punishment_cost, result.payoff
+        ):
+            p.received_punishment = received
+            p.total_punishment_cost = from_milli(cost)
+            p.payoff = from_milli(payoff)
+            record_earnings(p.participant, Constants.name_in_url, net=payoff, punishment_cost=cost)
+
+
+def history_table(player):
+    # Compute the first round to display (cannot be less than 1)
+    first_round_to_display = max(1, player.round_number - Constants.num_recent_rounds_to_display + 1)
+    history = read_history(player.session, history_key(Constants.name_in_url, player.group), first_round_to_display)
+    return [
+        (
+            round_number,
+            [[cu(from_milli(public)), cu(from_milli(private)), cu(from_milli(payoff))] for public, private, payoff in rows],
+        )
+        for round_number, rows in history
+    ]
 
 
 class Player(BasePlayer):
@@ -62,24 +126,9 @@ class Player(BasePlayer):
 
     received_punishment = models.CurrencyField(initial=0)
     total_punishment_cost = models.CurrencyField(initial=0)
-
-    def set_punishment_and_final_payoffs(self):
-        # Iterate over each group member once, assigning punishment and calculating costs
-        for other_player in self.get_others_in_group():
-            # Assign punishment points from this player to the other player
-            punishment_points = int(getattr(self, f"punishment_sent_to_player_{other_player.id_in_group}"))
-            other_player.received_punishment += punishment_points
-
-            # Add up the cost incurred for the punishment given
-            self.total_punishment_cost += Constants.punishment_costs[punishment_points]
-
-        punishment_reduction_proportion = min(1, self.received_punishment / 10)
-
-        final_earnings = self.gross_profit * (1 - punishment_reduction_proportion)
-
-        final_earnings -= self.total_punishment_cost
-
-        self.payoff = max(0, final_earnings)
+    inactive = models.BooleanField(initial=False)  # timed out in this round
+    # The page the player left after their group failed, see timeout_check
+    leaving_page = models.StringField(initial="")
 
 
 for i in range(1, Constants.players_per_group + 1):
@@ -95,21 +144,79 @@ for i in range(1, Constants.players_per_group + 1):
     )
 
 
-def timeout_check(player, timeout_happened):
+def custom_export(players):
+    # Long format: one row per player field and round, and one row per non-zero punishment (see common.export)
+    return export_rows(
+        players,
+        [
+            "public_investment",
+            "payoff_from_private",
+            "payoff_from_public",
+            "gross_profit",
+            "received_punishment",
+            "total_punishment_cost",
+            "payoff",
+            "inactive",
+        ],
+        lambda p: (
+            (i, p.field_maybe_none(f"punishment_sent_to_player_{i}"))
+            for i in range(1, Constants.players_per_group + 1)
+            if i != p.id_in_group
+        ),
+        group_fields=["total_group_investment", "inactive_players", "failed"],
+    )
+
+
+def load_roster(group):
+    # The members who timed out this round are the inactive ones (see common.membership)
+    members = group.get_players()
+    return GroupRoster([p.id for p in members], [p.id_in_group for p in members if p.inactive])
+
+
+rosters = RosterCache(load_roster)
+
+
+def timeout_check(player, timeout_happened, page_name=None):
     participant = player.participant
 
-    if timeout_happened and not participant.is_dropout:
-        player.group.inactive_players += 1
-        participant.is_dropout = True
+    if timeout_happened and is_playing(participant):
+        player.inactive = True
+        set_status(participant, INACTIVE)
+        rosters.get(player.group).mark_inactive(player.id_in_group)
+        update_group_status(player.group)
+    # oTree only calls app_after_this_page of a page that is still displayed after before_next_page, so the page
+    # a member of a failed group is leaving stays displayed (see still_playing)
+    if page_name is not None and player.group.failed:
+        player.leaving_page = page_name
 
-    if player.group.inactive_players == Constants.players_per_group - Constants.min_players_per_group:
-        player.group.failed = True
+
+def still_playing(player, page_name):
+    return player.leaving_page == page_name or (not player.group.failed and is_playing(player.participant))
+
+
+def update_group_status(group):
+    # The counters are derived from the group's roster instead of being incremented by every timeout, so a timeout
+    # only writes the rows of the player who timed out (see common.status). The wait pages reload the roster from
+    # the members' rows before settling the round.
+    group.inactive_players = rosters.get(group).inactive_count
+    if not group.failed and group.inactive_players >= Constants.players_per_group - Constants.min_players_per_group:
+        group.failed = True
+        for member in group.get_players():
+            if is_playing(member.participant):
+                set_status(member.participant, FAILED)
+
+
+def leave_game(player, upcoming_apps):
+    # Members of a failed group skip the remaining rounds: they go to the last app in the session if there is one,
+    # otherwise FailedGamePage is shown right away (it has no next button).
+    if upcoming_apps and player.group.failed:
+        return upcoming_apps[-1]
 
 
 def timeout_time(player, timeout_seconds):
     participant = player.participant
 
-    if participant.is_dropout or player.group.failed:
+    if not is_playing(participant) or player.group.failed:
         return 1  # instant timeout, 1 second
     else:
         return timeout_seconds
@@ -131,6 +238,9 @@ class IntroductionPage(Page):
     def before_next_page(player, timeout_happened):
         timeout_check(player, timeout_happened)
 
+    def app_after_this_page(player, upcoming_apps):
+        return leave_game(player, upcoming_apps)
+
 
 class Contribution(Page):
     form_model = "player"
@@ -150,18 +260,23 @@ class Contribution(Page):
         return timeout_time(player, Constants.other_pages_timeout_seconds)
 
     def before_next_page(player, timeout_happened):
-        timeout_check(player, timeout_happened)
+        timeout_check(player, timeout_happened, "Contribution")
+
+    def app_after_this_page(player, upcoming_apps):
+        return leave_game(player, upcoming_apps)
 
     def is_displayed(player):
-        return not player.group.failed and not player.participant.is_dropout
+        return still_playing(player, "Contribution")
 
 
 class GroupWaitPage(WaitPage):
     def after_all_players_arrive(group):
+        rosters.reload(group)
+        update_group_status(group)
         group.set_first_stage_earnings()
 
     def is_displayed(player):
-        return not player.group.failed and not player.participant.is_dropout
+        return not player.group.failed and is_playing(player.participant)
 
 
 class FirstStageResults(Page):
@@ -175,30 +290,20 @@ class FirstStageResults(Page):
         return timeout_time(player, Constants.other_pages_timeout_seconds)
 
     def before_next_page(player, timeout_happened):
-        timeout_check(player, timeout_happened)
+        timeout_check(player, timeout_happened, "FirstStageResults")
+
+    def app_after_this_page(player, upcoming_apps):
+        return leave_game(player, upcoming_apps)
 
     def is_displayed(player):
-        return not player.group.failed and not player.participant.is_dropout
+        return still_playing(player, "FirstStageResults")
 
 
 class ObservationPage(Page):
 
     def vars_for_template(player):
-        players_in_all_rounds = [players.in_all_rounds() for players in player.group.get_players()]
         current_round = player.round_number
-
-        # Compute the first round to display (cannot be less than 1)
-        first_round_to_display = max(1, current_round - Constants.num_recent_rounds_to_display + 1)
-        # Construct the data structure for the table
-        table_data = []
-        for round_number in range(first_round_to_display, current_round + 1):
-            round_data = []
-            for players in players_in_all_rounds:
-                public_investment = players[round_number - 1].public_investment
-                private_investment = players[round_number - 1].payoff_from_private
-                payoff = players[round_number - 1].gross_profit
-                round_data.append([public_investment, private_investment, payoff])
-            table_data.append((round_number, round_data))
+        table_data = history_table(player)
 
         return dict(
             round_number=current_round,
@@ -209,42 +314,31 @@ class ObservationPage(Page):
     def is_displayed(player):
         return (
             not player.session.config.get("punishment_condition")
-            and not player.group.failed
-            and not player.participant.is_dropout
+            and still_playing(player, "ObservationPage")
         )
 
     def get_timeout_seconds(player):
         return timeout_time(player, Constants.other_pages_timeout_seconds)
 
     def before_next_page(player, timeout_happened):
-        timeout_check(player, timeout_happened)
+        timeout_check(player, timeout_happened, "ObservationPage")
+
+    def app_after_this_page(player, upcoming_apps):
+        return leave_game(player, upcoming_apps)
 
 
 class PunishmentPage(Page):
     form_model = "player"
 
     def get_form_fields(player):
-        other_players = [f"punishment_sent_to_player_{i.id_in_group}" for i in player.get_others_in_group()]
+        other_players = [f"punishment_sent_to_player_{i}" for i in rosters.get(player.group).others(player.id_in_group)]
 
         return other_players
 
     def vars_for_template(player):
-        players_in_all_rounds = [player.in_all_rounds() for player in player.group.get_players()]
         current_round = player.round_number
-
-        # Compute the first round to display (cannot be less than 1)
-        first_round_to_display = max(1, current_round - Constants.num_recent_rounds_to_display + 1)
-        # Construct the data structure for the table
-        table_data = []
-        for round_number in range(first_round_to_display, current_round + 1):
-            round_data = []
-            for players in players_in_all_rounds:
-                public_investment = players[round_number - 1].public_investment
-                private_investment = players[round_number - 1].payoff_from_private
-                payoff = players[round_number - 1].gross_profit
-                round_data.append([public_investment, private_investment, payoff])
-            table_data.append((round_number, round_data))
-        other_players = [f"punishment_sent_to_player_{i.id_in_group}" for i in player.get_others_in_group()]
+        table_data = history_table(player)
+        other_players = [f"punishment_sent_to_player_{i}" for i in rosters.get(player.group).others(player.id_in_group)]
         return dict(
             round_number=current_round,
             table_data=table_data,
@@ -256,33 +350,36 @@ class PunishmentPage(Page):
     def is_displayed(player):
         return (
             player.session.config.get("punishment_condition")
-            and not player.group.failed
-            and not player.participant.is_dropout
+            and still_playing(player, "PunishmentPage")
         )
 
     def error_message(player, values):
         cost = sum([Constants.punishment_costs[int(value)] for value in values.values()])
 
-        if cost > player.gross_profit:  # gross_profit
+        if cost * SCALE > read_ledger(player.participant, Constants.name_in_url)["round_gross"]:  # gross_profit
             return "The total punishment cost cannot exceed your earnings."
 
     def get_timeout_seconds(player):
         return timeout_time(player, Constants.other_pages_timeout_seconds)
 
     def before_next_page(player, timeout_happened):
-        timeout_check(player, timeout_happened)
+        timeout_check(player, timeout_happened, "PunishmentPage")
+
+    def app_after_this_page(player, upcoming_apps):
+        return leave_game(player, upcoming_apps)
 
 
 class PunishmentWaitPage(WaitPage):
     def after_all_players_arrive(group):
-        for player in group.get_players():
-            player.set_punishment_and_final_payoffs()
+        rosters.reload(group)
+        update_group_status(group)
+        group.set_punishment_and_final_payoffs()
 
     def is_displayed(player):
         return (
             player.session.config.get("punishment_condition")
             and not player.group.failed
-            and not player.participant.is_dropout
+            and is_playing(player.participant)
         )
 
 
@@ -291,12 +388,11 @@ class FinalRoundResults(Page):
     def is_displayed(player):
         return (
             player.session.config.get("punishment_condition")
-            and not player.group.failed
-            and not player.participant.is_dropout
+            and still_playing(player, "FinalRoundResults")
         )
 
     def vars_for_template(player):
-        accumulated_payoff = sum(players.payoff for players in player.in_all_rounds())
+        accumulated_payoff = cu(from_milli(read_ledger(player.participant, Constants.name_in_url)["net"]))
         return dict(
             punishment_reduction_percentage=min(1, int(player.received_punishment) / 10) * 100,
             round_number=player.round_number,
@@ -307,7 +403,10 @@ class FinalRoundResults(Page):
         return timeout_time(player, Constants.other_pages_timeout_seconds)
 
     def before_next_page(player, timeout_happened):
-        timeout_check(player, timeout_happened)
+        timeout_check(player, timeout_happened, "FinalRoundResults")
+
+    def app_after_this_page(player, upcoming_apps):
+        return leave_game(player, upcoming_apps)
 
 
 class FinalGameResults(Page):
@@ -315,13 +414,13 @@ class FinalGameResults(Page):
         return (
             player.round_number == Constants.num_rounds
             and not player.group.failed
-            and not player.participant.is_dropout
+            and is_playing(player.participant)
         )
 
     def vars_for_template(player):
-        player_accumulated_payoff = sum(
-            (players.payoff if player.session.config.get("punishment_condition") else players.gross_profit)
-            for players in player.in_all_rounds()
+        ledger = read_ledger(player.participant, Constants.name_in_url)
+        player_accumulated_payoff = cu(
+            from_milli(ledger["net"] if player.session.config.get("punishment_condition") else ledger["gross"])
         )
         return dict(player_accumulated_payoff=player_accumulated_payoff)
 
@@ -329,22 +428,31 @@ class FinalGameResults(Page):
 class TimeoutPlayerPage(Page):
 
     def is_displayed(player):
-        return player.participant.is_dropout and not player.group.failed
+        return player.leaving_page == "TimeoutPlayerPage" or (is_inactive(player.participant) and not player.group.failed)
 
     def before_next_page(player, timeout_happened):
         if not timeout_happened:
-            player.participant.is_dropout = False
+            set_status(player.participant, RETURNED)
+        # The group can fail while the dropout is on this page
+        timeout_check(player, False, "TimeoutPlayerPage")
 
     def get_timeout_seconds(player):
         return Constants.return_from_timeout_seconds
 
+    def app_after_this_page(player, upcoming_apps):
+        # A dropout who did not come back is done with the game, instead of getting this page again every round.
+        if upcoming_apps and (is_inactive(player.participant) or player.group.failed):
+            return upcoming_apps[-1]
+
 
 class FailedGamePage(Page):
     def vars_for_template(player):
-        return dict(one_dropout=player.participant.is_dropout and player.round_number == Constants.num_rounds)
+        return dict(one_dropout=is_inactive(player.participant))
 
     def is_displayed(player):
-        return player.group.failed or (player.participant.is_dropout and player.round_number == Constants.num_rounds)
+        # Shown in the round the group fails. A dropout who lets TimeoutPlayerPage expire only gets it in the
+        # last round: the wait pages of later rounds wait for them, so they cannot stop in an earlier one.
+        return player.group.failed or (is_inactive(player.participant) and player.round_number == Constants.num_rounds)
 
 
 page_sequence = [
@@ -360,3 +468,6 @@ page_sequence = [
     TimeoutPlayerPage,
     FailedGamePage,
 ]
+
+# Opt-in timing of the page callbacks, see common.profiling
+instrument(__name__, page_sequence)
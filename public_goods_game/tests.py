@@ -0,0 +1,73 @@
+from otree.api import Currency as c, currency_range, expect, Bot, Submission, SubmissionMustFail
+
+from common.status import FAILED, INACTIVE, RETURNED, get_status
+from . import *
+
+
+class PlayerBot(Bot):
+    # all_active: everyone contributes 10 and punishes the next player in the group
+    # dropout_returns: player 1 times out on the contribution page of round 1 and comes back on TimeoutPlayerPage
+    # dropout_leaves: player 1 times out and lets TimeoutPlayerPage expire as well, which ends the game for them
+    # group_fails: players 1 and 2 time out on the contribution page of round 1, which fails the group
+    cases = ["all_active", "dropout_returns", "dropout_leaves", "group_fails"]
+
+    def play_round(self):
+        punishment_condition = self.session.config.get("punishment_condition")
+        times_out = self.round_number == 1 and (
+            (self.case in ["dropout_returns", "dropout_leaves"] and self.player.id_in_group == 1)
+            or (self.case == "group_fails" and self.player.id_in_group <= 2)
+        )
+
+        if self.case == "group_fails" and self.round_number > 1:
+            # Everyone stays on FailedGamePage
+            return
+        if self.case == "dropout_leaves" and self.player.id_in_group == 1 and self.round_number > 1:
+            return
+
+        if self.round_number == 1:
+            yield IntroductionPage
+
+        if times_out:
+            yield Submission(Contribution, timeout_happened=True)
+            expect(get_status(self.participant), INACTIVE)
+        else:
+            # The slider script creates the public_investment input, so it is not in the HTML the bot checks
+            yield SubmissionMustFail(Contribution, dict(public_investment=Constants.endowment + 1), check_html=False)
+            yield Submission(Contribution, dict(public_investment=10), check_html=False)
+
+        if self.case == "group_fails":
+            if self.player.id_in_group == 1:
+                # Player 1 timed out before the group failed, so they got TimeoutPlayerPage
+                yield Submission(TimeoutPlayerPage, timeout_happened=True)
+            elif self.player.id_in_group == 2:
+                expect(self.group.failed, True)
+                expect(self.group.inactive_players, 2)
+            elif not times_out:
+                expect(get_status(self.participant), FAILED)
+            return
+
+        if times_out:
+            if self.case == "dropout_returns":
+                yield TimeoutPlayerPage
+                expect(get_status(self.participant), RETURNED)
+            else:
+                yield Submission(TimeoutPlayerPage, timeout_happened=True)
+                expect(get_status(self.participant), INACTIVE)
+            return
+
+        yield FirstStageResults
+        if self.case == "all_active":
+            expect(self.player.gross_profit, c(Constants.endowment - 10 + 10 * Constants.players_per_group * Constants.efficiency_factor))
+
+        next_player = self.player.id_in_group % Constants.players_per_group + 1
+        if punishment_condition:
+            others = [f"punishment_sent_to_player_{p.id_in_group}" for p in self.player.get_others_in_group()]
+            yield SubmissionMustFail(PunishmentPage, {field: 10 for field in others})
+            yield PunishmentPage, {field: 5 if field.endswith(f"_{next_player}") else 0 for field in others}
+            if self.case == "all_active":
+                expect(self.player.received_punishment, 5)
+            yield FinalRoundResults
+        else:
+            yield ObservationPage
+
+        # FinalGameResults has no next button, so the bot stops there
@@ -1,5 +1,18 @@
+from decimal import Decimal
+from itertools import repeat
+
 from otree.api import *
 
+from common.export import export_rows
+from common.history import append_round, history_key, read_history
+from common.ledger import open_ledger, read_ledger, record_earnings
+from common.membership import GroupRoster, RosterCache
+from common.points import SCALE, from_milli, ratio, to_milli
+from common.profiling import instrument
+from common.punishment import points_error, unpack_points
+from common.settlement import SettlementBatch, punishment_matrix, settle_first_stage, settle_punishment
+from common.status import FAILED, INACTIVE, is_inactive, is_playing, reset_status, set_status
+
 class Constants(BaseConstants):
     """
     This class defines the constants used in the game.
@@ -9,6 +22,8 @@ class Constants(BaseConstants):
     players_per_group = None
     num_rounds = 3
     num_recent_rounds_to_display = num_rounds
+    # Rounds of history sent with the observation and punishment pages; older ones are fetched in batches of this size
+    history_window_rounds = 3
     endowment = 20
     min_payout = 5
     efficiency_factor = 0.375
@@ -27,53 +42,243 @@ class Subsession(BaseSubsession):
 def creating_session(subsession):
     """
     This function is called when creating a new session.
-    It sets the 'is_dropout' attribute of each participant to False.
+    It copies the session's punishment condition to every group, so the pages do not have to look it up in the
+    session config, makes every participant active (see common.status) and opens their earnings ledger.
     """
+    punishment_condition = bool(subsession.session.config.get("punishment_condition"))
+    for group in subsession.get_groups():
+        group.punishment_condition = punishment_condition
     if subsession.round_number == 1:
         players = subsession.get_players()
         for player in players:
-            player.participant.is_dropout = False
+            reset_status(player.participant)
+            open_ledger(player.participant, Constants.name_in_url)
 
 class Group(BaseGroup):
     total_group_investment = models.CurrencyField(initial=0)
     punishment_condition = models.BooleanField()
+    # Recorded by the wait pages (see update_group_status); the pages read group_failed
     inactive_players = models.IntegerField(initial=0)
     failed = models.BooleanField(initial=False)
 
     def set_first_stage_earnings(self):
         """
         This function calculates the first stage earnings for each player in the group.
-        It calculates the total group investment and assigns the payoff from private and public accounts to each player.
+        It calculates the total group investment, assigns the payoff from private and public accounts to each player,
+        and adds the (gross) payoff of the current round to the players' accumulated earnings.
         """
-        players = self.get_players()
-        self.total_group_investment = sum([p.public_investment for p in players])
-        for p in players:
-            p.payoff_from_private = p.endowment - p.public_investment
-            p.payoff_from_public = Constants.efficiency_factor * self.total_group_investment
-            p.gross_profit = p.payoff_from_private + p.payoff_from_public
+        settle_first_stage_earnings([self])
 
-    def update_accumulated_earnings(self):
+    def set_punishment_and_final_payoffs(self):
         """
-        This function updates players' accumulated earnings after first stage earnings are calculated.
-        It retrieves the accumulated earnings of the previous round, and then adds the (gross) payoff
-        of the current round.
+        This function calculates the final payoffs of every player in the group this round.
+        It builds the group's punishment matrix once; the punishment points each player received are its column sums
+        and the cost of giving punishments its row sums (via the punishment_costs schedule).
+        Final (net) earnings are the gross payoff reduced by 10% per received punishment point,
+        ensuring that the result is non-negative. Accumulated earnings are updated accordingly.
+        All amounts are computed in exact milli-points from the earnings ledger.
         """
         players = self.get_players()
-        for player in players:
-            # Check if it's not the first round
-            if player.round_number > 1:
-                previous_round = player.in_round(player.round_number - 1)
-                previous_accumulation = previous_round.accumulated_earnings
-            # If it's the first round, start with zero
-            else:
-                previous_accumulation = 0
-            player.accumulated_earnings = previous_accumulation + player.gross_profit
+        ledgers = [read_ledger(p.participant, Constants.name_in_url) for p in players]
+        sent = {p.id_in_group: unpack_points(p.punishment_sent, len(players)) for p in players}
+        matrix = punishment_matrix(
+            players,
+            lambda sender, receiver: sent[sender.id_in_group][receiver.id_in_group - 1],
+        )
+        result = settle_punishment(
+            matrix,
+            [ledger["round_gross"] for ledger in ledgers],
+            Constants.punishment_costs,
+        )
+        for p, ledger, received, cost, payoff in zip(
+            players, ledgers, result.received_punishment, result.total_punishment_cost, result.payoff
+        ):
+            # Accumulated earnings count the net instead of the gross payoff, minus the cost of punishing,
+            # and cannot be negative.
+            accumulated = max(0, ledger["accumulated"] - ledger["round_gross"] + payoff - cost)
+            p.received_punishment = received
+            p.total_punishment_cost = from_milli(cost)
+            p.payoff = from_milli(payoff)
+            p.accumulated_earnings = from_milli(accumulated)
+            record_earnings(
+                p.participant, Constants.name_in_url, net=payoff, punishment_cost=cost, accumulated=accumulated
+            )
+
+def settle_first_stage_earnings(groups):
+    """
+    This function settles the first stage of the current round for any number of groups in one batched pass.
+    The contributions of all groups are loaded into flat arrays, every payoff component is computed at once,
+    and the results are written back to the players and groups.
+
+    Args:
+        groups (list): The groups (Group) to settle.
+    """
+    batch = SettlementBatch()
+    players = []
+    members_by_group = []
+    for group in groups:
+        members = group.get_players()
+        players.extend(members)
+        members_by_group.append(members)
+        batch.add_group(
+            [to_milli(p.public_investment) for p in members],
+            repeat(Constants.endowment * SCALE, len(members)),
+            [previous_accumulated_earnings(p) for p in members],
+        )
+
+    result = settle_first_stage(batch, ratio(Constants.efficiency_factor))
+
+    for group, total in zip(groups, result.group_totals):
+        group.total_group_investment = from_milli(total)
+    for p, private, public, gross, accumulated in zip(
+        players,
+        result.payoff_from_private,
+        result.payoff_from_public,
+        result.gross_profit,
+        result.accumulated_earnings,
+    ):
+        p.payoff_from_private = from_milli(private)
+        p.payoff_from_public = from_milli(public)
+        p.gross_profit = from_milli(gross)
+        p.accumulated_earnings = from_milli(accumulated)
+        record_earnings(p.participant, Constants.name_in_url, gross=gross, accumulated=accumulated)
+
+    offset = 0
+    for group, members in zip(groups, members_by_group):
+        record_round_history(group, members, result, offset)
+        offset += len(members)
+
+def record_round_history(group, members, result, offset):
+    """
+    This function appends the settled first stage of the current round to the group's history snapshot,
+    which the observation and punishment pages render from. Amounts are stored in exact milli-points.
+
+    Args:
+        group (Group): The settled group.
+        members (list): The group's players, ordered by id_in_group.
+        result (FirstStageResult): The settlement result the group is part of.
+        offset (int): Position of the group's first member in the result.
+    """
+    rows = [
+        [
+            to_milli(p.public_investment),
+            result.payoff_from_private[offset + index],
+            result.gross_profit[offset + index],
+            is_inactive(p.participant),
+        ]
+        for index, p in enumerate(members)
+    ]
+    append_round(group.session, history_key(Constants.name_in_url, group), group.round_number, rows)
+
+def first_history_round(player):
+    """
+    This function returns the earliest round whose data the player may see (cannot be less than 1).
+    """
+    return max(1, player.round_number - Constants.num_recent_rounds_to_display + 1)
+
+def history_payload(player, first_round, last_round):
+    """
+    This function builds the compact history payload from which the observation and punishment pages
+    render the table of previous rounds in the browser. Amounts stay in exact milli-points from the
+    group's history snapshot, so building it does not create a currency value per table cell.
+
+    Args:
+        player (Player): The player for whom to build the payload.
+        first_round (int): The first round to include.
+        last_round (int): The last round to include.
+
+    Returns:
+        dict: ``rounds`` in ascending order, the ``group_size``, and flat lists ordered by round and then
+        id_in_group: ``values`` holds the public investment, private investment and payoff of each member
+        (three numbers per member) and ``dropouts`` their dropout status as 0 or 1. The dropout status of the
+        current round is read from the group's roster, because members can still drop out after the round was
+        settled, e.g. on FirstStageResults.
+    """
+    history = read_history(
+        player.session, history_key(Constants.name_in_url, player.group), first_round, last_round
+    )
+    roster = rosters.get(player.group)
+    return dict(
+        rounds=[round_number for round_number, rows in history],
+        group_size=len(history[0][1]) if history else 0,
+        values=[amount for round_number, rows in history for row in rows for amount in row[:3]],
+        dropouts=[
+            int(not roster.is_active(id_in_group)) if round_number == player.round_number else int(row[3])
+            for round_number, rows in history
+            for id_in_group, row in enumerate(rows, start=1)
+        ],
+    )
+
+def points_format():
+    """
+    This function describes how oTree writes an amount of points, so the page script can write the
+    amounts of the history payload the same way.
+
+    Returns:
+        dict: The number of decimal places, and the texts for one and for several points,
+        with {} in place of the number.
+    """
+    one, two = cu(1), cu(2)
+    return dict(
+        places=cu.get_num_decimal_places(),
+        one=str(one).replace(f"{Decimal(one):n}", "{}", 1),
+        many=str(two).replace(f"{Decimal(two):n}", "{}", 1),
+    )
+
+def history_js_vars(player):
+    """
+    This function returns the variables the history table renderer of the observation and punishment pages needs.
+    Only the most recent rounds are sent with the page (see Constants.history_window_rounds), so the page
+    does not grow with the number of rounds; older rounds are fetched through history_live_method.
+
+    Args:
+        player (Player): The player for whom to provide the variables.
+
+    Returns:
+        dict: The history payload of the most recent rounds, the earliest round the player may see,
+        the points format and the player's id_in_group.
+    """
+    first_round = max(first_history_round(player), player.round_number - Constants.history_window_rounds + 1)
+    return dict(
+        history=history_payload(player, first_round, player.round_number),
+        first_round=first_history_round(player),
+        points_format=points_format(),
+        player_id=player.id_in_group,
+    )
+
+def history_live_method(player, data):
+    """
+    This function sends a batch of older rounds to the observation or punishment page, when the player
+    asks for rounds before the ones the page shows.
+
+    Args:
+        player (Player): The player who asked.
+        data (dict): ``before``, the earliest round the page shows.
+
+    Returns:
+        dict: The history payload of at most Constants.history_window_rounds rounds before ``before``,
+        for the player who asked; nothing if the request is not valid.
+    """
+    before = data.get("before") if isinstance(data, dict) else None
+    if not isinstance(before, int) or isinstance(before, bool):
+        return
+    last_round = min(before, player.round_number + 1) - 1
+    first_round = max(first_history_round(player), last_round - Constants.history_window_rounds + 1)
+    if last_round < first_round:
+        return
+    return {player.id_in_group: dict(history=history_payload(player, first_round, last_round))}
+
+def previous_accumulated_earnings(player):
+    """
+    This function returns the accumulated earnings of the player at the end of the previous round,
+    read from the participant's earnings ledger (zero in the first round).
+    """
+    return read_ledger(player.participant, Constants.name_in_url)["accumulated"]
 
 class Player(BasePlayer):
     accumulated_earnings = models.CurrencyField(initial=0)
     payoff_from_private = models.CurrencyField()
     payoff_from_public = models.CurrencyField()
-    endowment = models.CurrencyField(initial=Constants.endowment)
     gross_profit = models.CurrencyField(initial=0)
     public_investment = models.CurrencyField(
         min=0,
@@ -83,70 +288,213 @@ class Player(BasePlayer):
         widget=widgets.RadioSelect,
         choices=[i for i in range(0, Constants.endowment + 1)],
     )
+    # Punishment points sent to each group member, one character per member ordered by id_in_group (see common.punishment)
+    punishment_sent = models.StringField(initial="", blank=True)
     received_punishment = models.CurrencyField(initial=0)
     total_punishment_cost = models.CurrencyField(initial=0)
     inactive = models.BooleanField(initial=False)
 
-    def set_punishment_and_final_payoffs(self):
-        """
-        This function calculates the final payoffs for the player (self) this round.
-        It retrieves all punishment points received, computes the total cost of giving punishments, and
-        calculates the proportion of gross payoff reduction due to incurred punishment.
-        Final (net) earnings are determined by subtracting the punishment reduction proportion from the gross payoff,
-        ensuring that the result is non-negative.
-        """
-        self.received_punishment = sum(
-            getattr(other_player, f"punishment_sent_to_player_{self.id_in_group}", 0)
-            for other_player in self.get_others_in_group()
-        )
-        for other_player in self.get_others_in_group():
-            punishment_points = getattr(self, f"punishment_sent_to_player_{other_player.id_in_group}")
-            self.total_punishment_cost += Constants.punishment_costs[int(punishment_points)]
-        punishment_reduction_proportion = min(1, int(str(self.received_punishment).split()[0]) / 10)
-        final_earnings = self.gross_profit * (1 - punishment_reduction_proportion)
-        self.payoff = max(0, final_earnings)
-
-    def update_accumulated_earnings_after_punishment_expenses(self):
-        """
-        This function updates the player's accumulated earnings considering the net earnings
-        (i.e., gross profit minus incurred punishment) and punishment given. Again, accumulated earnings
-        cannot be negative.
-        """
-        self.accumulated_earnings -= self.gross_profit
-        self.accumulated_earnings += self.payoff
-        self.accumulated_earnings -= self.total_punishment_cost
-        self.accumulated_earnings = max(0, self.accumulated_earnings)
-
-# Setting punishment_fields in the Player class.
-max_group_size = 30 # Adjust such that it matches the group size of the large group condition
-for i in range(1, max_group_size + 1):
-    setattr(
-        Player,
-        f"punishment_sent_to_player_{i}",
-        models.CurrencyField(
-            initial=0,
-            verbose_name=f"Kies een straf voor speler #{i}:",
-            choices=[(value, f"{value} strafpunten") for value in range(11)],
-        ),
+def punishment_sent_error_message(player, value):
+    """
+    This function validates the packed punishment vector submitted on the punishment page.
+    It checks that there is one value per group member, that every value is one of the allowed
+    punishment choices, and that the player does not punish themselves.
+
+    Args:
+        player (Player): The player who submitted the vector.
+        value (str): The packed punishment vector.
+
+    Returns:
+        str: The error message, or None if the vector is valid.
+    """
+    problem = points_error(
+        value,
+        rosters.get(player.group).size,
+        player.id_in_group - 1,
+        range(len(Constants.punishment_costs)),
     )
+    if problem:
+        return f"Ongeldige strafpunten ({problem})."
+
+def custom_export(players):
+    """
+    This function streams the app's data in long format: one row per exported player field and round,
+    followed by one row per punishment point edge (sender to receiver) with a non-zero number of points.
+    The packed punishment vectors are decoded per player, so the export does not need a column per group member.
+
+    Args:
+        players (list): All players of the app, as passed by oTree.
+
+    Returns:
+        generator: The header row followed by the data rows.
+    """
+    return export_rows(
+        players,
+        [
+            "public_investment",
+            "payoff_from_private",
+            "payoff_from_public",
+            "gross_profit",
+            "received_punishment",
+            "total_punishment_cost",
+            "payoff",
+            "accumulated_earnings",
+            "inactive",
+        ],
+        lambda p: enumerate(unpack_points(p.punishment_sent, len(p.punishment_sent)), start=1),
+        group_fields=["total_group_investment", "inactive_players", "failed"],
+    )
+
+def load_roster(group):
+    """
+    This function loads the roster of a group (see common.membership): its members, and the members who dropped out
+    as the inactive ones. They are read from the participants' status, which is stored, so a roster that is not in
+    this process' cache is the same as the one the timeouts were recorded on.
+
+    Args:
+        group (Group): The group whose roster to load.
+
+    Returns:
+        GroupRoster: The roster.
+    """
+    members = group.get_players()
+    return GroupRoster([p.id for p in members], [p.id_in_group for p in members if is_inactive(p.participant)])
 
-def timeout_check(player, timeout_happened):
+# The rosters of the groups, which the pages use instead of loading the group's players
+rosters = RosterCache(load_roster)
+
+def timeout_check(player, timeout_happened, page_name=None):
     """
     This function checks if a timeout has occurred for a player.
-    If a timeout has occurred and the participant is not a dropout, it marks the player as inactive and sets the
-    participant as a dropout. If the number of inactive players reaches the minimum required number
-    (i.e., proportion of group size), it marks the group as failed.
+    If a timeout has occurred and the participant still plays, it marks the player as inactive in this round,
+    makes the participant inactive (a dropout) and records it on the group's roster. A member who still plays
+    when the group has failed becomes failed. Only the player's own rows are written; the group's status is
+    read with group_failed and recorded at the wait pages (see update_group_status).
+    oTree only calls app_after_this_page of a page that is still displayed after before_next_page, so when the
+    game is over for the player, the page they are leaving is kept in their page plan; the pages after it are
+    resolved again.
+
+    Args:
+        player (Player): The player who is leaving the page.
+        timeout_happened (bool): True if the page timed out.
+        page_name (str): The name of the page the player is leaving.
     """
     participant = player.participant
-    groupsize = len(player.get_others_in_group()) + 1
-
-    if timeout_happened and not participant.is_dropout:
-        player.group.inactive_players += 1
+    if timeout_happened and is_playing(participant):
         player.inactive = True # in order to check the status of players over rounds
-        participant.is_dropout = True
+        set_status(participant, INACTIVE)
+        participant.page_plan = None
+        rosters.get(player.group).mark_inactive(player.id_in_group)
+    elif is_playing(participant) and group_failed(player.group):
+        set_status(participant, FAILED)
+    if page_name is not None and game_over(player):
+        plan = page_plan(player)
+        if page_name not in plan:
+            plan.append(page_name)
+
+def group_failed(group):
+    """
+    This function returns True if too few members of the group are left, i.e. fewer than the minimum proportion
+    of the group size. It is derived from the group's roster on every read, so a timeout does not write the group.
+
+    Args:
+        group (Group): The group to check.
 
-    if groupsize - player.group.inactive_players < round(groupsize * Constants.min_group_participation):
-        player.group.failed = True
+    Returns:
+        bool: True if the group has failed.
+    """
+    roster = rosters.get(group)
+    return roster.size - roster.inactive_count < round(roster.size * Constants.min_group_participation)
+
+def update_group_status(group):
+    """
+    This function records the group's status in the group's fields, for the results pages and the export: the number
+    of members who dropped out and whether the group failed (see group_failed). The members who still play in a
+    failed group become failed. It is only called after all players arrived on a wait page, which reloads the
+    roster from the members' rows first, so simultaneous timeouts in a group never write the group's row.
+
+    Args:
+        group (Group): The group to update.
+    """
+    group.inactive_players = rosters.get(group).inactive_count
+    group.failed = group_failed(group)
+    if group.failed:
+        for member in group.get_players():
+            if is_playing(member.participant):
+                set_status(member.participant, FAILED)
+
+def resolve_page_plan(player):
+    """
+    This function works out which pages of page_sequence the player will see this round.
+
+    Args:
+        player (Player): The player for whom to resolve the page plan.
+
+    Returns:
+        list: The names of the pages that are displayed, in page_sequence order.
+    """
+    group = player.group
+    dropout = is_inactive(player.participant)
+    failed = group_failed(group)
+    playing = not failed and is_playing(player.participant)
+    punishment = playing and group.punishment_condition
+    last_round = player.round_number == Constants.num_rounds
+    displayed = dict(
+        IntroductionPage=player.round_number == 1,
+        Contribution=playing,
+        GroupWaitPage=playing,
+        FirstStageResults=playing,
+        ObservationPage=playing and not group.punishment_condition,
+        PunishmentPage=punishment,
+        PunishmentWaitPage=punishment,
+        FinalRoundResults=punishment,
+        FinalGameResults=playing and last_round,
+        FailedGamePage=failed or (dropout and last_round),
+    )
+    return [name for name, shown in displayed.items() if shown]
+
+def page_plan(player):
+    """
+    This function returns the names of the pages the player sees this round, which every is_displayed looks up.
+    The plan is resolved once per round and kept in the participant's page_plan field, together with whether the
+    group had failed. timeout_check clears it when the player drops out, and it is resolved again once the group
+    has failed.
+
+    Args:
+        player (Player): The player for whom to return the page plan.
+
+    Returns:
+        list: The names of the pages that are displayed, see resolve_page_plan.
+    """
+    participant = player.participant
+    plan = participant.vars.get("page_plan")
+    failed = group_failed(player.group)
+    if not plan or plan[0] != player.round_number or plan[1] != failed:
+        plan = [player.round_number, failed, resolve_page_plan(player)]
+        participant.page_plan = plan
+    return plan[2]
+
+def game_over(player):
+    """
+    This function returns True if the game has ended for the player, because they dropped out or their group failed.
+    """
+    return not is_playing(player.participant) or group_failed(player.group)
+
+def leave_game(player, upcoming_apps):
+    """
+    This function routes a player for whom the game has ended out of the remaining rounds.
+    If there is an app after this one, the player goes straight to the last app in the session.
+    Otherwise the player stays in this app and ends on FailedGamePage, which has no next button (see its is_displayed).
+
+    Args:
+        player (Player): The player who is leaving a page.
+        upcoming_apps (list): The apps after this one in the app sequence.
+
+    Returns:
+        str: The name of the app to go to, or None to continue in this app.
+    """
+    if upcoming_apps and game_over(player):
+        return upcoming_apps[-1]
 
 def timeout_time(player, timeout_seconds):
     """
@@ -162,7 +510,7 @@ def timeout_time(player, timeout_seconds):
         int: The calculated timeout time in seconds.
     """
     participant = player.participant
-    if participant.is_dropout or player.group.failed:
+    if not is_playing(participant) or group_failed(player.group):
         return 1  # instant timeout, 1 second
     else:
         return timeout_seconds
@@ -183,14 +531,14 @@ class IntroductionPage(Page):
             dict: The template variables.
         """
         return dict(
-            punishment_condition=player.session.config.get("punishment_condition"),
+            punishment_condition=player.group.punishment_condition,
             groupsize=player.session.config.get("num_demo_participants")
         )
 
     def is_displayed(player):
         """
         This function determines whether the introduction page should be displayed.
-        It returns True if it is the first round, False otherwise.
+        It is shown in the first round only, see resolve_page_plan.
 
         Args:
             player (Player): The player for whom to determine the display status.
@@ -198,8 +546,7 @@ class IntroductionPage(Page):
         Returns:
             bool: True if the page should be displayed, False otherwise.
         """
-        # Show this page only on the first round
-        return player.round_number == 1
+        return "IntroductionPage" in page_plan(player)
 
     def get_timeout_seconds(player):
         """
@@ -224,7 +571,20 @@ class IntroductionPage(Page):
             player (Player): The player for whom to perform the before_next_page actions.
             timeout_happened (bool): True if a timeout has occurred, False otherwise.
         """
-        timeout_check(player, timeout_happened)
+        timeout_check(player, timeout_happened, "IntroductionPage")
+
+    def app_after_this_page(player, upcoming_apps):
+        """
+        Sends the player to the last app in the session if they dropped out or their group failed.
+
+        Args:
+            player (Player): The player who is leaving the page.
+            upcoming_apps (list): The apps after this one in the app sequence.
+
+        Returns:
+            str: The name of the app to go to, or None to continue in this app.
+        """
+        return leave_game(player, upcoming_apps)
 
 class Contribution(Page):
     """
@@ -287,12 +647,25 @@ class Contribution(Page):
             player (Player): The player for whom to perform the before_next_page actions.
             timeout_happened (bool): True if a timeout has occurred, False otherwise.
         """
-        timeout_check(player, timeout_happened)
+        timeout_check(player, timeout_happened, "Contribution")
+
+    def app_after_this_page(player, upcoming_apps):
+        """
+        Sends the player to the last app in the session if they dropped out or their group failed.
+
+        Args:
+            player (Player): The player who is leaving the page.
+            upcoming_apps (list): The apps after this one in the app sequence.
+
+        Returns:
+            str: The name of the app to go to, or None to continue in this app.
+        """
+        return leave_game(player, upcoming_apps)
 
     def is_displayed(player):
         """
         This function determines whether the contribution page should be displayed.
-        It returns True if the group has not failed and the participant is not a dropout, False otherwise.
+        It is shown while the group has not failed and the participant is not a dropout, see resolve_page_plan.
 
         Args:
             player (Player): The player for whom to determine the display status.
@@ -300,25 +673,26 @@ class Contribution(Page):
         Returns:
             bool: True if the page should be displayed, False otherwise.
         """
-        return not player.group.failed and not player.participant.is_dropout
+        return "Contribution" in page_plan(player)
 
 class GroupWaitPage(WaitPage):
     def after_all_players_arrive(group):
         """
         This function is called after all players in the group have arrived.
-        It sets the first stage earnings for the group.
-        And it updates players' accumulated earnings.
+        It reloads the group's roster, updates the group's status from its members and sets the first stage
+        earnings for the group, which also updates players' accumulated earnings.
 
         Args:
             group (Group): The group for which to call the functions.
         """
+        rosters.reload(group)
+        update_group_status(group)
         group.set_first_stage_earnings()
-        group.update_accumulated_earnings()
 
     def is_displayed(player):
         """
         This function determines whether the group wait page should be displayed.
-        It returns True if the group has not failed and the participant is not a dropout, False otherwise.
+        It is shown while the group has not failed and the participant is not a dropout, see resolve_page_plan.
 
         Args:
             player (Player): The player for whom to determine the display status.
@@ -326,7 +700,7 @@ class GroupWaitPage(WaitPage):
         Returns:
             bool: True if the page should be displayed, False otherwise.
         """
-        return not player.group.failed and not player.participant.is_dropout
+        return "GroupWaitPage" in page_plan(player)
 
 class FirstStageResults(Page):
     """
@@ -369,12 +743,25 @@ class FirstStageResults(Page):
             player (Player): The player for whom to perform the before_next_page actions.
             timeout_happened (bool): True if a timeout has occurred, False otherwise.
         """
-        timeout_check(player, timeout_happened)
+        timeout_check(player, timeout_happened, "FirstStageResults")
+
+    def app_after_this_page(player, upcoming_apps):
+        """
+        Sends the player to the last app in the session if they dropped out or their group failed.
+
+        Args:
+            player (Player): The player who is leaving the page.
+            upcoming_apps (list): The apps after this one in the app sequence.
+
+        Returns:
+            str: The name of the app to go to, or None to continue in this app.
+        """
+        return leave_game(player, upcoming_apps)
 
     def is_displayed(player):
         """
         This function determines whether the first stage results page should be displayed.
-        It returns True if the group has not failed and the participant is not a dropout, False otherwise.
+        It is shown while the group has not failed and the participant is not a dropout, see resolve_page_plan.
 
         Args:
             player (Player): The player for whom to determine the display status.
@@ -382,7 +769,7 @@ class FirstStageResults(Page):
         Returns:
             bool: True if the page should be displayed, False otherwise.
         """
-        return not player.group.failed and not player.participant.is_dropout
+        return "FirstStageResults" in page_plan(player)
 
 class ObservationPage(Page):
     """
@@ -398,32 +785,32 @@ class ObservationPage(Page):
         Returns:
             dict: A dictionary containing the variables needed for rendering the template.
         """
-        players_in_all_rounds = [players.in_all_rounds() for players in player.group.get_players()]
-        current_round = player.round_number
-
-        # Compute the first round to display (cannot be less than 1)
-        first_round_to_display = max(1, current_round - Constants.num_recent_rounds_to_display + 1)
-        # Construct the data structure for the table
-        table_data = []
-        for round_number in range(first_round_to_display, current_round + 1):
-            round_data = []
-            for players in players_in_all_rounds:
-                public_investment = players[round_number - 1].public_investment
-                private_investment = players[round_number - 1].payoff_from_private
-                payoff = players[round_number - 1].gross_profit
-                dropout = players[round_number - 1].participant.is_dropout
-                round_data.append([public_investment, private_investment, payoff, dropout])
-            table_data.append((round_number, round_data))
-
-            # Also in descending order; for the table generator script on the observation/punishment page template
-            reversed_table_data = list(reversed(table_data))
+        return dict(round_number=player.round_number)
 
-        return dict(
-            round_number=current_round,
-            table_data=table_data,
-            reversed_table_data=reversed_table_data,
-            player_id=player.id_in_group,
-        )
+    def js_vars(player):
+        """
+        This function passes the history of previous rounds to the page script, which renders the tables.
+
+        Args:
+            player (Player): The player for whom to provide the variables.
+
+        Returns:
+            dict: The variables for the page script.
+        """
+        return history_js_vars(player)
+
+    def live_method(player, data):
+        """
+        This function sends the page older rounds of history when the player asks for them.
+
+        Args:
+            player (Player): The player who asked.
+            data (dict): The request sent by the page script.
+
+        Returns:
+            dict: The rounds for the page script, see history_live_method.
+        """
+        return history_live_method(player, data)
 
     def is_displayed(player):
         """
@@ -435,11 +822,7 @@ class ObservationPage(Page):
         Returns:
             bool: True if the page should be displayed, False otherwise.
         """
-        return (
-            not player.session.config.get("punishment_condition")
-            and not player.group.failed
-            and not player.participant.is_dropout
-        )
+        return "ObservationPage" in page_plan(player)
 
     def get_timeout_seconds(player):
         """
@@ -462,32 +845,32 @@ class ObservationPage(Page):
             player (Player): The player for whom to perform the before_next_page actions.
             timeout_happened (bool): True if a timeout has occurred, False otherwise.
         """
-        timeout_check(player, timeout_happened)
-
-class PunishmentPage(Page):
-    """
-    This class represents the punishment page of the game.
-    """
-    form_model = "player"
+        timeout_check(player, timeout_happened, "ObservationPage")
 
-    def get_form_fields(player):
+    def app_after_this_page(player, upcoming_apps):
         """
-        This function returns the form fields for the punishment page.
-        It dynamically generates the form fields based on the number of other players in the group.
+        Sends the player to the last app in the session if they dropped out or their group failed.
 
         Args:
-            player (Player): The player for whom to generate the form fields.
+            player (Player): The player who is leaving the page.
+            upcoming_apps (list): The apps after this one in the app sequence.
 
         Returns:
-            list: The list of form fields for the punishment page.
+            str: The name of the app to go to, or None to continue in this app.
         """
-        other_players = [f"punishment_sent_to_player_{i.id_in_group}" for i in player.get_others_in_group()]
-        return other_players
+        return leave_game(player, upcoming_apps)
+
+class PunishmentPage(Page):
+    """
+    This class represents the punishment page of the game.
+    """
+    form_model = "player"
+    form_fields = ["punishment_sent"]
 
     def vars_for_template(player):
         """
         This function returns the variables for the punishment page template.
-        It computes the data structure for the table displaying previous rounds' data.
+        The tables of previous rounds are rendered by the page script, see js_vars.
 
         Args:
             player (Player): The player for whom to compute the variables.
@@ -495,40 +878,43 @@ class PunishmentPage(Page):
         Returns:
             dict: The variables for the punishment page template.
         """
-        players_in_all_rounds = [player.in_all_rounds() for player in player.group.get_players()]
-        current_round = player.round_number
-
-        # Compute the first round to display (cannot be less than 1)
-        first_round_to_display = max(1, current_round - Constants.num_recent_rounds_to_display + 1)
-        # Construct the data structure for the table
-        table_data = []
-        for round_number in range(first_round_to_display, current_round + 1):
-            round_data = []
-            for players in players_in_all_rounds:
-                public_investment = players[round_number - 1].public_investment
-                private_investment = players[round_number - 1].payoff_from_private
-                payoff = players[round_number - 1].gross_profit
-                dropout = players[round_number - 1].participant.is_dropout
-                round_data.append([public_investment, private_investment, payoff, dropout])
-            table_data.append((round_number, round_data))
-
-        other_players = [f"punishment_sent_to_player_{i.id_in_group}" for i in player.get_others_in_group()]
-        most_recent_round = table_data[-1][0] if table_data else None #punishment column for most recent round
-
-        other_rounds = [data for data in table_data if data[0] != most_recent_round]
-        other_rounds.reverse() # Order of previous rounds in descending order.
-
         return dict(
-            round_number=current_round,
-            table_data=table_data,
-            player_id=player.id_in_group,
-            players=other_players,
-            punishment_costs=Constants.punishment_costs,
-            most_recent_round=most_recent_round,
-            other_rounds=other_rounds,
+            round_number=player.round_number,
             accumulated_earnings=player.accumulated_earnings,
         )
 
+    def js_vars(player):
+        """
+        This function passes the history of previous rounds to the page script, which renders the tables
+        (with the punishment choices in the most recent round) and packs the punishment choices
+        into the punishment_sent field.
+
+        Args:
+            player (Player): The player for whom to provide the variables.
+
+        Returns:
+            dict: The variables for the page script.
+        """
+        variables = history_js_vars(player)
+        variables.update(
+            group_size=rosters.get(player.group).size,
+            max_punishment_points=len(Constants.punishment_costs) - 1,
+        )
+        return variables
+
+    def live_method(player, data):
+        """
+        This function sends the page older rounds of history when the player asks for them.
+
+        Args:
+            player (Player): The player who asked.
+            data (dict): The request sent by the page script.
+
+        Returns:
+            dict: The rounds for the page script, see history_live_method.
+        """
+        return history_live_method(player, data)
+
     def is_displayed(player):
         """
         This function determines whether the punishment page should be displayed for a player.
@@ -539,11 +925,7 @@ class PunishmentPage(Page):
         Returns:
             bool: True if the punishment page should be displayed, False otherwise.
         """
-        return (
-            player.session.config.get("punishment_condition")
-            and not player.group.failed
-            and not player.participant.is_dropout
-        )
+        return "PunishmentPage" in page_plan(player)
 
     def error_message(player, values):
         """
@@ -557,9 +939,10 @@ class PunishmentPage(Page):
         Returns:
             str: The error message if the punishment cost exceeds the earnings, None otherwise.
         """
-        cost = sum([Constants.punishment_costs[int(value)] for value in values.values()])
+        group_size = rosters.get(player.group).size
+        cost = sum([Constants.punishment_costs[points] for points in unpack_points(values["punishment_sent"], group_size)])
 
-        if cost > player.accumulated_earnings:
+        if cost * SCALE > read_ledger(player.participant, Constants.name_in_url)["accumulated"]:
             return "De totale kosten voor het geven van strafpunten kunnen niet hoger zijn dan je opgebouwde winst."
 
     def get_timeout_seconds(player):
@@ -583,17 +966,31 @@ class PunishmentPage(Page):
             player (Player): The player for whom to perform the before_next_page actions.
             timeout_happened (bool): True if a timeout has occurred, False otherwise.
         """
-        timeout_check(player, timeout_happened)
+        timeout_check(player, timeout_happened, "PunishmentPage")
+
+    def app_after_this_page(player, upcoming_apps):
+        """
+        Sends the player to the last app in the session if they dropped out or their group failed.
+
+        Args:
+            player (Player): The player who is leaving the page.
+            upcoming_apps (list): The apps after this one in the app sequence.
+
+        Returns:
+            str: The name of the app to go to, or None to continue in this app.
+        """
+        return leave_game(player, upcoming_apps)
 
 class PunishmentWaitPage(WaitPage):
     def after_all_players_arrive(group):
         """
         This function is called after all players in the group have arrived.
-        It sets the punishment and final payoffs for each player in the group.
+        It reloads the group's roster, updates the group's status from its members and sets the punishment and
+        final payoffs for the whole group, including each player's accumulated earnings.
         """
-        for player in group.get_players():
-            player.set_punishment_and_final_payoffs()
-            player.update_accumulated_earnings_after_punishment_expenses()
+        rosters.reload(group)
+        update_group_status(group)
+        group.set_punishment_and_final_payoffs()
 
     def is_displayed(player):
         """
@@ -605,11 +1002,7 @@ class PunishmentWaitPage(WaitPage):
         Returns:
             bool: True if the punishment wait page should be displayed, False otherwise.
         """
-        return (
-                player.session.config.get("punishment_condition")
-                and not player.group.failed
-                and not player.participant.is_dropout
-        )
+        return "PunishmentWaitPage" in page_plan(player)
 
 class FinalRoundResults(Page):
     """
@@ -625,11 +1018,7 @@ class FinalRoundResults(Page):
         Returns:
             bool: True if the final round results page should be displayed, False otherwise.
         """
-        return (
-                player.session.config.get("punishment_condition")
-                and not player.group.failed
-                and not player.participant.is_dropout
-        )
+        return "FinalRoundResults" in page_plan(player)
 
     def vars_for_template(player):
         """
@@ -668,7 +1057,20 @@ class FinalRoundResults(Page):
             player (Player): The player for whom to perform the before_next_page actions.
             timeout_happened (bool): True if a timeout has occurred, False otherwise.
         """
-        timeout_check(player, timeout_happened)
+        timeout_check(player, timeout_happened, "FinalRoundResults")
+
+    def app_after_this_page(player, upcoming_apps):
+        """
+        Sends the player to the last app in the session if they dropped out or their group failed.
+
+        Args:
+            player (Player): The player who is leaving the page.
+            upcoming_apps (list): The apps after this one in the app sequence.
+
+        Returns:
+            str: The name of the app to go to, or None to continue in this app.
+        """
+        return leave_game(player, upcoming_apps)
 
 class FinalGameResults(Page):
     """
@@ -684,11 +1086,7 @@ class FinalGameResults(Page):
         Returns:
             bool: True if the final game results page should be displayed, False otherwise.
         """
-        return (
-            player.round_number == Constants.num_rounds
-            and not player.group.failed
-            and not player.participant.is_dropout
-        )
+        return "FinalGameResults" in page_plan(player)
 
     def vars_for_template(player):
         """
@@ -718,11 +1116,15 @@ class FailedGamePage(Page):
         Returns:
             dict: The variables for the template.
         """
-        return dict(one_dropout=player.participant.is_dropout and player.round_number == Constants.num_rounds)
+        return dict(one_dropout=is_inactive(player.participant))
 
     def is_displayed(player):
         """
         Determines whether the failed game page should be displayed for a player.
+        It is shown as soon as the group fails, so that its members do not go through the pages of the remaining rounds.
+        A dropout in a group that continues only gets it in the last round: the wait pages of later rounds wait
+        for every member of the group, so a dropout cannot stop in an earlier round. The other pages are hidden
+        from them, so they still pass the remaining rounds in a single request.
 
         Args:
             player (Player): The player for whom to determine the display status.
@@ -730,7 +1132,7 @@ class FailedGamePage(Page):
         Returns:
             bool: True if the failed game page should be displayed, False otherwise.
         """
-        return player.group.failed or (player.participant.is_dropout and player.round_number == Constants.num_rounds)
+        return "FailedGamePage" in page_plan(player)
 
 # Page sequence
 page_sequence = [
@@ -744,4 +1146,7 @@ page_sequence = [
     FinalRoundResults,
     FinalGameResults,
     FailedGamePage,
-]
\ No newline at end of file
+]
+
+# Opt-in timing of the page callbacks, see common.profiling
+instrument(__name__, page_sequence)
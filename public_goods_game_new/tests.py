@@ -0,0 +1,130 @@
+import random
+
+from otree.api import Currency as c, currency_range, expect, Bot, Submission, SubmissionMustFail
+
+from common.ledger import read_ledger
+from common.punishment import pack_points
+from common.simulation import Rules, simulate_cohort
+from common.status import FAILED, INACTIVE, get_status, is_inactive
+from . import *
+
+
+class PlayerBot(Bot):
+    # all_active: everyone contributes 10 and gives 1 punishment point to the next player in the group
+    # one_dropout: player 1 times out on the contribution page of round 1; the rest of the group keeps playing, and
+    # the pages are hidden from player 1 until FailedGamePage in the last round, or they are sent on to the next app
+    # if the session has one (see EndGame/tests.py)
+    # group_fails: players 1 and 2 time out on the contribution page of round 1, which fails the group
+    # late_dropout: player 1 times out on FirstStageResults of round 1, after the round was settled
+    cases = ["all_active", "one_dropout", "group_fails", "late_dropout"]
+
+    def play_round(self):
+        punishment_condition = self.session.config.get("punishment_condition")
+        group_size = len(self.player.get_others_in_group()) + 1
+        times_out = self.round_number == 1 and (
+            (self.case == "one_dropout" and self.player.id_in_group == 1)
+            or (self.case == "group_fails" and self.player.id_in_group <= 2)
+        )
+
+        # Dropouts and members of a failed group end on FailedGamePage, which has no next button, or in the next app;
+        # they have no pages to submit after the round in which they timed out
+        if self.round_number > 1 and (is_inactive(self.participant) or self.case == "group_fails"):
+            return
+
+        if self.round_number == 1:
+            yield IntroductionPage
+
+        if times_out:
+            yield Submission(Contribution, timeout_happened=True)
+            expect(get_status(self.participant), INACTIVE)
+            if self.case == "group_fails" and self.player.id_in_group == 2:
+                expect(group_failed(self.group), True)
+                # The timeouts only wrote the players' own rows; the group's fields are recorded at the wait pages
+                expect(self.group.failed, False)
+                # A roster that is not cached, e.g. in another server process, is rebuilt from the participants' status
+                rosters.forget(self.session)
+                expect(rosters.get(self.group).inactive_count, 2)
+                expect(group_failed(self.group), True)
+            return
+
+        # The slider script creates the public_investment input, so it is not in the HTML the bot checks
+        yield SubmissionMustFail(Contribution, dict(public_investment=Constants.endowment + 1), check_html=False)
+        yield Submission(Contribution, dict(public_investment=10), check_html=False)
+        if self.case == "group_fails":
+            expect(get_status(self.participant), FAILED)
+            return
+
+        if self.case == "late_dropout" and self.round_number == 1 and self.player.id_in_group == 1:
+            yield Submission(FirstStageResults, timeout_happened=True)
+            expect(get_status(self.participant), INACTIVE)
+            return
+        yield FirstStageResults
+        if self.case == "all_active":
+            expect(self.player.gross_profit, c(Constants.endowment - 10 + 10 * group_size * Constants.efficiency_factor))
+        # Recorded when everyone arrived on GroupWaitPage; a dropout still counts in later rounds
+        dropped_out = self.case == "one_dropout" or (self.case == "late_dropout" and self.round_number > 1)
+        expect(self.group.inactive_players, 1 if dropped_out else 0)
+        expect(self.group.failed, False)
+        if self.case == "late_dropout" and self.round_number == 1:
+            # Player 1 dropped out after the history of this round was recorded
+            expect(history_payload(self.player, 1, 1)["dropouts"], [1] + [0] * (group_size - 1))
+
+        if punishment_condition:
+            own_index = self.player.id_in_group - 1
+            points = [0] * group_size
+            yield SubmissionMustFail(PunishmentPage, dict(punishment_sent=pack_points(points[1:])))
+            points[own_index] = 1
+            yield SubmissionMustFail(PunishmentPage, dict(punishment_sent=pack_points(points)))
+            points = [0 if index == own_index else len(Constants.punishment_costs) - 1 for index in range(group_size)]
+            yield SubmissionMustFail(PunishmentPage, dict(punishment_sent=pack_points(points)))
+
+            points = [0] * group_size
+            points[(own_index + 1) % group_size] = 1
+            yield PunishmentPage, dict(punishment_sent=pack_points(points))
+            if self.case == "all_active":
+                expect(self.player.received_punishment, 1)
+            yield FinalRoundResults
+        else:
+            yield ObservationPage
+        if self.case == "all_active" and self.round_number == Constants.num_rounds and self.player.id_in_group == 1:
+            self.check_simulation(punishment_condition, group_size)
+
+        # FinalGameResults has no next button, so the bot stops there
+
+    def check_simulation(self, punishment_condition, group_size):
+        # The simulation settles the choices of the all_active bots to the same milli-points as the wait pages
+        rules = Rules(
+            endowment=Constants.endowment,
+            efficiency_factor=Constants.efficiency_factor,
+            punishment_costs=Constants.punishment_costs,
+            min_group_participation=Constants.min_group_participation,
+            num_rounds=Constants.num_rounds,
+            punishment_condition=bool(punishment_condition),
+        )
+        result = simulate_cohort(rules, [[AllActiveStrategy()] * group_size], random.Random(0))
+        players = self.group.get_players()
+        expect(result.accumulated_earnings, [read_ledger(p.participant, Constants.name_in_url)["accumulated"] for p in players])
+        expect(result.received_punishment[-1], [p.received_punishment or 0 for p in players])
+
+
+class AllActiveStrategy:
+    # The choices of the all_active bots, as a strategy of common.simulation
+    def contribute(self, view, rng):
+        return 10
+
+    def punish(self, view, rng):
+        points = [0] * view.group_size
+        points[(view.index + 1) % view.group_size] = 1
+        return points
+
+
+def call_live_method(method, round_number, **kwargs):
+    # The history pages fetch the rounds before the ones they show in batches of Constants.history_window_rounds
+    payload = method(1, dict(before=round_number))
+    if round_number == 1:
+        expect(payload, None)
+    else:
+        history = payload[1]["history"]
+        expect(history["rounds"], list(range(max(1, round_number - Constants.history_window_rounds), round_number)))
+        expect(len(history["values"]), 3 * len(history["rounds"]) * history["group_size"])
+    expect(method(1, dict(before=str(round_number))), None)
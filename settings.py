@@ -17,11 +17,50 @@ SESSION_CONFIGS = [
         num_rounds=2,
         punishment_condition=False,
     ),
+    dict(
+        name="public_goods_game_new_1",
+        display_name="Public goods game (new): with punishment condition",
+        num_demo_participants=4,
+        app_sequence=["public_goods_game_new"],
+        punishment_condition=True,
+    ),
+    dict(
+        name="public_goods_game_new_2",
+        display_name="Public goods game (new): without punishment condition",
+        num_demo_participants=4,
+        app_sequence=["public_goods_game_new"],
+        punishment_condition=False,
+    ),
+    dict(
+        name="public_goods_game_1_end",
+        display_name="Public goods game: with punishment condition, dropouts and failed groups end in EndGame",
+        num_demo_participants=4,
+        app_sequence=["public_goods_game", "EndGame"],
+        num_rounds=2,
+        punishment_condition=True,
+    ),
+    dict(
+        name="public_goods_game_new_1_end",
+        display_name="Public goods game (new): with punishment condition, dropouts and failed groups end in EndGame",
+        num_demo_participants=4,
+        app_sequence=["public_goods_game_new", "EndGame"],
+        punishment_condition=True,
+    ),
     dict(
         name='DropOutTest', 
         num_demo_participants=3, 
-        app_sequence=['Game', 'EndGame']
-        )
+        app_sequence=['Game', 'EndGame'],
+        # Optional CSV/JSON file of participant labels to lobby IDs, see common/roster.py
+        lobby_roster=None,
+        ),
+    dict(
+        name='DropOutTest_roster',
+        display_name='DropOutTest, grouped from a lobby roster',
+        # The first three participants are grouped from the roster, the other three on arrival
+        num_demo_participants=6,
+        app_sequence=['Game', 'EndGame'],
+        lobby_roster='Game/example_roster.csv',
+        ),
 ]
 
 SESSION_CONFIG_DEFAULTS = dict(
@@ -30,7 +69,7 @@ SESSION_CONFIG_DEFAULTS = dict(
     doc="",
 )
 
-PARTICIPANT_FIELDS = ["is_dropout", 'has_dropped_out', 'too_many_inactive_in_group', 'guesses', 'choices', 'lobby_id']
+PARTICIPANT_FIELDS = ['status', 'guesses', 'choices', 'lobby_id', 'pre_grouped', 'earnings_ledger', 'page_plan']
 
 # ISO-639 code
 # for example: de, fr, ja, ko, zh-hans